@@ -7,13 +7,21 @@ import logging
 import re
 from typing import Dict, Any, List
 from .base import (
+    COMBINED_ANALYSIS_PROMPT,
+    COMBINED_VISION_PROMPT,
+    ImageInput,
     TextProvider,
     VisionProvider,
     TextProcessingRequest,
     TextProcessingResponse,
     VisionProcessingRequest,
     VisionProcessingResponse,
+    image_media_type,
+    image_to_base64,
+    is_combined_result,
 )
+from .rate_limiter import estimate_tokens, rate_limiter
+from .resilience import resilience
 import os
 import json
 import asyncio
@@ -21,14 +29,35 @@ import asyncio
 logger = logging.getLogger(__name__)
 
 
-class AnthropicTextProvider(TextProvider):
-    """Anthropic text processing provider."""
+class _AnthropicClientMixin:
+    """Messages API helper shared by the Anthropic providers."""
 
-    def __init__(self, model: str | None = None):
-        self.client = anthropic.AsyncAnthropic(
-            api_key=os.environ.get("ANTHROPIC_API_KEY")
+    client: anthropic.AsyncAnthropic
+    model: str
+
+    async def _messages(self, **kwargs: Any) -> Any:
+        """Create a message with retries, circuit breaking and rate limits."""
+        return await resilience.call(
+            f"anthropic:{self.model}", lambda: self._messages_once(**kwargs)
         )
-        self.model = model or os.environ.get("TEXT_MODEL", "claude-3-sonnet-20240229")
+
+    async def _messages_once(self, **kwargs: Any) -> Any:
+        governor = rate_limiter.get("anthropic", self.model)
+        estimate = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens", 0))
+        await governor.acquire(estimate)
+        actual = None
+        try:
+            timeout = resilience.policy.timeout
+            response = await asyncio.wait_for(
+                self.client.messages.create(**kwargs, timeout=timeout),
+                timeout=timeout,
+            )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                actual = usage.input_tokens + usage.output_tokens
+            return response
+        finally:
+            governor.release(estimate, actual)
 
     def _parse_json(self, text: str) -> Any:
         """Safely parse JSON returned by the API. Returns an empty dict on failure."""
@@ -58,7 +87,25 @@ class AnthropicTextProvider(TextProvider):
                     pass
             logger.warning("Failed to parse JSON from AI response")
             return {}
-    
+
+
+class AnthropicTextProvider(_AnthropicClientMixin, TextProvider):
+    """Anthropic text processing provider."""
+
+    def __init__(self, model: str | None = None):
+        # Retries are left to ``resilience`` so every HTTP request goes
+        # through the circuit breaker and the rate limiter.
+        self.client = anthropic.AsyncAnthropic(
+            api_key=os.environ.get("ANTHROPIC_API_KEY"),
+            max_retries=0,
+            timeout=resilience.policy.timeout,
+        )
+        self.model = model or os.environ.get("TEXT_MODEL", "claude-3-sonnet-20240229")
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
+
     async def classify_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
         """Classify document type and extract basic metadata."""
         start_time = time.time()
@@ -82,7 +129,7 @@ class AnthropicTextProvider(TextProvider):
         """
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=500,
                 temperature=0.1,
@@ -143,7 +190,7 @@ class AnthropicTextProvider(TextProvider):
         """
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=2000,
                 temperature=0.1,
@@ -198,7 +245,7 @@ class AnthropicTextProvider(TextProvider):
         """
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=1500,
                 temperature=0.1,
@@ -238,7 +285,7 @@ class AnthropicTextProvider(TextProvider):
         """
 
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=1500,
                 temperature=0.1,
@@ -264,22 +311,68 @@ class AnthropicTextProvider(TextProvider):
                 model_used=self.model
             )
 
+    async def analyze_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        """Classify, extract and rewrite in a single message."""
+        start_time = time.time()
+        prompt = COMBINED_ANALYSIS_PROMPT.format(text=request.text)
 
-class AnthropicVisionProvider(VisionProvider):
+        try:
+            response = await self._messages(
+                model=self.model,
+                max_tokens=4000,
+                temperature=0.1,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            result = self._parse_json(response.content[0].text)
+        except Exception as e:
+            # Only a malformed answer is worth retrying as separate calls; an
+            # open circuit or exhausted retries would fail those too.
+            return TextProcessingResponse(
+                result={"error": str(e)},
+                confidence=0.0,
+                processing_time=time.time() - start_time,
+                provider="anthropic",
+                model_used=self.model
+            )
+
+        if not is_combined_result(result):
+            logger.warning("Combined analysis response incomplete, using separate calls")
+            return await super().analyze_document(request)
+
+        return TextProcessingResponse(
+            result=result,
+            confidence=result["classification"].get("confidence", 0.0),
+            processing_time=time.time() - start_time,
+            provider="anthropic",
+            model_used=self.model
+        )
+
+
+class AnthropicVisionProvider(_AnthropicClientMixin, VisionProvider):
     """Anthropic vision processing provider."""
 
     def __init__(self, model: str | None = None):
+        # Retries are left to ``resilience`` so every HTTP request goes
+        # through the circuit breaker and the rate limiter.
         self.client = anthropic.AsyncAnthropic(
-            api_key=os.environ.get("ANTHROPIC_API_KEY")
+            api_key=os.environ.get("ANTHROPIC_API_KEY"),
+            max_retries=0,
+            timeout=resilience.policy.timeout,
         )
         self.model = model or os.environ.get("VISION_MODEL", "claude-3-sonnet-20240229")
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
     
     async def generate_caption(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
         """Generate caption for image."""
         start_time = time.time()
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=200,
                 temperature=0.1,
@@ -295,7 +388,7 @@ class AnthropicVisionProvider(VisionProvider):
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/jpeg",
+                                    "media_type": image_media_type(request.image_data),
                                     "data": request.image_data
                                 }
                             }
@@ -328,7 +421,7 @@ class AnthropicVisionProvider(VisionProvider):
         start_time = time.time()
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=300,
                 temperature=0.1,
@@ -344,7 +437,7 @@ class AnthropicVisionProvider(VisionProvider):
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/jpeg",
+                                    "media_type": image_media_type(request.image_data),
                                     "data": request.image_data
                                 }
                             }
@@ -384,7 +477,7 @@ class AnthropicVisionProvider(VisionProvider):
         start_time = time.time()
         
         try:
-            response = await self.client.messages.create(
+            response = await self._messages(
                 model=self.model,
                 max_tokens=500,
                 temperature=0.1,
@@ -400,7 +493,7 @@ class AnthropicVisionProvider(VisionProvider):
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/jpeg",
+                                    "media_type": image_media_type(request.image_data),
                                     "data": request.image_data
                                 }
                             }
@@ -433,4 +526,63 @@ class AnthropicVisionProvider(VisionProvider):
                 processing_time=time.time() - start_time,
                 provider="anthropic",
                 model_used=self.model
-            )
\ No newline at end of file
+            )
+
+    async def analyze_image(
+        self, image: ImageInput, context: Dict[str, Any] | None = None
+    ) -> VisionProcessingResponse:
+        """Caption, objects and hotspots in a single message."""
+        start_time = time.time()
+        image_data = image_to_base64(image)
+
+        try:
+            response = await self._messages(
+                model=self.model,
+                max_tokens=1000,
+                temperature=0.1,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": COMBINED_VISION_PROMPT
+                            },
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": image_media_type(image_data),
+                                    "data": image_data
+                                }
+                            }
+                        ]
+                    }
+                ]
+            )
+            result = self._parse_json(response.content[0].text)
+        except Exception as e:
+            # As for text, only a malformed answer falls back to separate calls.
+            return VisionProcessingResponse(
+                caption=f"Error analyzing image: {str(e)}",
+                confidence=0.0,
+                processing_time=time.time() - start_time,
+                provider="anthropic",
+                model_used=self.model
+            )
+
+        if not isinstance(result, dict) or not result.get("caption"):
+            logger.warning("Combined image analysis response incomplete, using separate calls")
+            return await super().analyze_image(image_data, context)
+
+        objects = result.get("objects")
+        hotspots = result.get("hotspots")
+        return VisionProcessingResponse(
+            caption=str(result["caption"]),
+            objects=objects if isinstance(objects, list) else [],
+            hotspots=hotspots if isinstance(hotspots, list) else [],
+            confidence=0.85,
+            processing_time=time.time() - start_time,
+            provider="anthropic",
+            model_used=self.model
+        )
@@ -1,14 +1,24 @@
 """Base AI provider interfaces."""
 
+import asyncio
+import base64
+import io
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Union
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Raw image bytes, base64 encoded bytes, or an already decoded PIL image
+ImageInput = Union[bytes, str, "Image.Image"]
+
 
 class TextProcessingRequest(BaseModel):
     """Text processing request model."""
     text: str
-    task_type: str  # "classify", "extract", "rewrite"
+    task_type: str  # "classify", "extract", "rewrite", "combined"
     context: Dict[str, Any] = {}
 
 
@@ -19,6 +29,8 @@ class TextProcessingResponse(BaseModel):
     processing_time: float = 0.0
     provider: str = ""
     model_used: str = ""
+    prompt_hash: str = ""  # Response cache key, when the cache is enabled
+    response_hash: str = ""  # Hash of the cached response, if it was cached
 
 
 class VisionProcessingRequest(BaseModel):
@@ -37,6 +49,127 @@ class VisionProcessingResponse(BaseModel):
     processing_time: float = 0.0
     provider: str = ""
     model_used: str = ""
+    prompt_hash: str = ""  # Response cache key, when the cache is enabled
+    response_hash: str = ""  # Hash of the cached response, if it was cached
+
+
+COMBINED_ANALYSIS_PROMPT = """
+        Analyze this technical text for S1000D data module creation. In one
+        response, classify it, extract its structure and rewrite it to comply
+        with ASD-STE100 (Simplified Technical English): approved words only,
+        at most 20 words per sentence, active voice, simple present tense.
+
+        Text: {text}
+
+        Respond in JSON format:
+        {{
+            "classification": {{
+                "dm_type": "PROC|DESC|IPD|CIR|SNS|WIR|GEN",
+                "title": "extracted title",
+                "confidence": 0.95,
+                "metadata": {{
+                    "language": "en-US",
+                    "technical_domain": "aviation|electronics|mechanical|general",
+                    "complexity": "basic|intermediate|advanced"
+                }}
+            }},
+            "extraction": {{
+                "sections": [
+                    {{"type": "paragraph|list|table|figure", "title": "section title", "content": "extracted content", "level": 1}}
+                ],
+                "references": [
+                    {{"type": "figure|table|dm", "reference": "Figure 1|Table 1|DMC-XXX", "title": "reference title"}}
+                ],
+                "warnings": ["safety warning"],
+                "cautions": ["caution"],
+                "notes": ["note"]
+            }},
+            "rewrite": {{
+                "rewritten_text": "STE compliant text",
+                "ste_score": 0.92,
+                "improvements": ["improvement"],
+                "warnings": ["warning if any"]
+            }}
+        }}
+        """
+
+
+def is_combined_result(result: Any) -> bool:
+    """Check that a combined analysis response has all three parts."""
+    return (
+        isinstance(result, dict)
+        and isinstance(result.get("classification"), dict)
+        and "dm_type" in result["classification"]
+        and isinstance(result.get("extraction"), dict)
+        and isinstance(result.get("rewrite"), dict)
+        and "rewritten_text" in result["rewrite"]
+    )
+
+
+COMBINED_VISION_PROMPT = (
+    "Analyze this technical image for S1000D documentation. Respond in JSON "
+    'format: {"caption": "technical caption", "objects": ["component name"], '
+    '"hotspots": [{"x": 100, "y": 150, "width": 50, "height": 30, '
+    '"description": "component name"}]}. Hotspots are pixel boxes around the '
+    "key components that should be interactive; objects lists every technical "
+    "object, component and part visible."
+)
+
+
+def image_to_bytes(image: ImageInput) -> bytes:
+    """Return encoded image bytes for any supported image input."""
+    if isinstance(image, bytes):
+        return image
+    if isinstance(image, str):
+        return base64.b64decode(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Leading bytes of the image formats the vision APIs accept.
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def image_media_type(image: ImageInput) -> str:
+    """Return the MIME type of an image input from its leading bytes.
+
+    PIL images are encoded as PNG by :func:`image_to_bytes`; unrecognised
+    data is assumed to be JPEG.
+    """
+    if isinstance(image, str):
+        head = base64.b64decode(image[:24])
+    elif isinstance(image, bytes):
+        head = image[:16]
+    else:
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return "image/jpeg"
+
+
+def image_to_base64(image: ImageInput) -> str:
+    """Return the base64 encoding of any supported image input."""
+    if isinstance(image, str):
+        return image
+    return base64.b64encode(image_to_bytes(image)).decode("utf-8")
+
+
+def image_to_pil(image: ImageInput) -> "Image.Image":
+    """Return a decoded RGB PIL image for any supported image input."""
+    from PIL import Image
+
+    if not isinstance(image, (bytes, str)):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    return Image.open(io.BytesIO(image_to_bytes(image))).convert("RGB")
 
 
 class TextProvider(ABC):
@@ -62,6 +195,36 @@ class TextProvider(ABC):
         """Review text for grammar, STE compliance and logical consistency."""
         pass
 
+    async def analyze_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        """Classify, extract and rewrite text in one operation.
+
+        The result holds ``classification``, ``extraction`` and ``rewrite``
+        entries shaped like the results of the individual tasks. This default
+        implementation issues the three calls concurrently; providers that can
+        answer in a single round trip override it.
+        """
+        start_time = time.time()
+        classify_res, extract_res, rewrite_res = await asyncio.gather(
+            self.classify_document(request.copy(update={"task_type": "classify"})),
+            self.extract_structured_data(request.copy(update={"task_type": "extract"})),
+            self.rewrite_to_ste(request.copy(update={"task_type": "rewrite"})),
+        )
+        return TextProcessingResponse(
+            result={
+                "classification": classify_res.result,
+                "extraction": extract_res.result,
+                "rewrite": rewrite_res.result,
+            },
+            confidence=classify_res.confidence,
+            processing_time=time.time() - start_time,
+            provider=classify_res.provider,
+            model_used=classify_res.model_used,
+        )
+
+    async def aclose(self) -> None:
+        """Release clients or models held by the provider."""
+        return None
+
 
 class VisionProvider(ABC):
     """Abstract base class for vision processing providers."""
@@ -79,4 +242,39 @@ class VisionProvider(ABC):
     @abstractmethod
     async def generate_hotspots(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
         """Generate hotspot suggestions."""
-        pass
\ No newline at end of file
+        pass
+
+    async def analyze_image(
+        self, image: ImageInput, context: Dict[str, Any] | None = None
+    ) -> VisionProcessingResponse:
+        """Caption the image and derive objects and hotspots in one operation.
+
+        ``image`` may be raw bytes, a base64 string or a PIL image. This
+        default implementation issues the three individual calls
+        concurrently; providers that can share work override it.
+        """
+        start_time = time.time()
+        image_data = image_to_base64(image)
+        caption_res, objects_res, hotspots_res = await asyncio.gather(
+            *(
+                call(VisionProcessingRequest(image_data=image_data, task_type=task, context=context or {}))
+                for call, task in (
+                    (self.generate_caption, "caption"),
+                    (self.detect_objects, "objects"),
+                    (self.generate_hotspots, "hotspots"),
+                )
+            )
+        )
+        return VisionProcessingResponse(
+            caption=caption_res.caption,
+            objects=objects_res.objects,
+            hotspots=hotspots_res.hotspots,
+            confidence=caption_res.confidence,
+            processing_time=time.time() - start_time,
+            provider=caption_res.provider,
+            model_used=caption_res.model_used,
+        )
+
+    async def aclose(self) -> None:
+        """Release clients or models held by the provider."""
+        return None
@@ -0,0 +1,145 @@
+"""Provider wrappers that serve repeated requests from the response cache."""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from .base import (
+    ImageInput,
+    TextProcessingRequest,
+    TextProcessingResponse,
+    TextProvider,
+    VisionProcessingRequest,
+    VisionProcessingResponse,
+    VisionProvider,
+    image_to_bytes,
+)
+from .response_cache import ResponseCache, make_cache_key, response_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _has_error(result: Any) -> bool:
+    if not isinstance(result, dict):
+        return False
+    return "error" in result or any(
+        isinstance(v, dict) and "error" in v for v in result.values()
+    )
+
+
+def _is_success(response: TextProcessingResponse) -> bool:
+    # Text providers report failures as an ``error`` entry, an empty result
+    # (a reply that did not parse as JSON) or zero confidence.
+    return bool(response.result) and response.confidence > 0.0 and not _has_error(response.result)
+
+
+def _model_of(provider: Any) -> str:
+    return getattr(provider, "model", None) or getattr(provider, "model_name", "") or ""
+
+
+class _CachedProvider:
+    """Shared lookup/store logic for the cached text and vision wrappers."""
+
+    def __init__(self, inner: Any, provider: str, cache: ResponseCache):
+        self.inner = inner
+        self.provider = provider
+        self.model = _model_of(inner)
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    async def _lookup(self, key: str) -> Any:
+        try:
+            return await self.cache.get(key)
+        except Exception as e:  # pragma: no cover - cache failures are non fatal
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+
+    async def _store(self, key: str, value: dict) -> str:
+        try:
+            return await self.cache.set(key, value)
+        except Exception as e:  # pragma: no cover - cache failures are non fatal
+            logger.warning(f"Response cache store failed: {e}")
+            return ""
+
+    @staticmethod
+    def _trace(response: Any, key: str, digest: str) -> Any:
+        """Tag ``response`` with its cache entry so processing records can refer to it."""
+        response.prompt_hash = key
+        response.response_hash = digest
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class CachedTextProvider(_CachedProvider, TextProvider):
+    """Text provider that caches successful responses by prompt hash."""
+
+    async def _cached(
+        self,
+        task_type: str,
+        request: TextProcessingRequest,
+        call: Callable[[TextProcessingRequest], Awaitable[TextProcessingResponse]],
+    ) -> TextProcessingResponse:
+        key = make_cache_key(self.provider, self.model, task_type, request.text, request.context)
+        hit = await self._lookup(key)
+        if hit is not None:
+            return self._trace(TextProcessingResponse(**hit), key, response_hash(hit))
+        response = await call(request)
+        digest = await self._store(key, response.dict()) if _is_success(response) else ""
+        return self._trace(response, key, digest)
+
+    async def classify_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        return await self._cached("classify", request, self.inner.classify_document)
+
+    async def extract_structured_data(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        return await self._cached("extract", request, self.inner.extract_structured_data)
+
+    async def rewrite_to_ste(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        return await self._cached("rewrite", request, self.inner.rewrite_to_ste)
+
+    async def review_module(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        return await self._cached("review", request, self.inner.review_module)
+
+    async def analyze_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
+        return await self._cached("combined", request, self.inner.analyze_document)
+
+
+class CachedVisionProvider(_CachedProvider, VisionProvider):
+    """Vision provider that caches successful responses by image hash."""
+
+    async def _cached(
+        self,
+        task_type: str,
+        request: VisionProcessingRequest,
+        call: Callable[[VisionProcessingRequest], Awaitable[VisionProcessingResponse]],
+    ) -> VisionProcessingResponse:
+        key = make_cache_key(self.provider, self.model, task_type, request.image_data, request.context)
+        hit = await self._lookup(key)
+        if hit is not None:
+            return self._trace(VisionProcessingResponse(**hit), key, response_hash(hit))
+        response = await call(request)
+        # Vision providers report failures with zero confidence.
+        digest = await self._store(key, response.dict()) if response.confidence > 0.0 else ""
+        return self._trace(response, key, digest)
+
+    async def generate_caption(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
+        return await self._cached("caption", request, self.inner.generate_caption)
+
+    async def detect_objects(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
+        return await self._cached("objects", request, self.inner.detect_objects)
+
+    async def generate_hotspots(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
+        return await self._cached("hotspots", request, self.inner.generate_hotspots)
+
+    async def analyze_image(
+        self, image: ImageInput, context: Dict[str, Any] | None = None
+    ) -> VisionProcessingResponse:
+        key = make_cache_key(self.provider, self.model, "analyze", image_to_bytes(image), context)
+        hit = await self._lookup(key)
+        if hit is not None:
+            return self._trace(VisionProcessingResponse(**hit), key, response_hash(hit))
+        response = await self.inner.analyze_image(image, context)
+        digest = await self._store(key, response.dict()) if response.confidence > 0.0 else ""
+        return self._trace(response, key, digest)
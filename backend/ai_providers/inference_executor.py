@@ -0,0 +1,112 @@
+"""Dedicated executor that keeps local model inference off the event loop."""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the inference queue is at capacity."""
+
+
+class InferenceExecutor:
+    """Bounded thread pool for blocking local model calls.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a worker; further submissions fail fast with
+    :class:`InferenceQueueFullError`. Torch releases the GIL during tensor
+    ops, so worker threads run inference while the event loop keeps serving
+    requests. Cancelling the awaiting coroutine drops a job that has not
+    started yet; a running job finishes and its result is discarded.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 32):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.counters = {"completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        return cls(
+            max_workers=int(os.environ.get("LOCAL_INFERENCE_WORKERS", 1)),
+            max_queue=int(os.environ.get("LOCAL_INFERENCE_QUEUE", 32)),
+        )
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="local-inference"
+                )
+            return self._executor
+
+    def _invoke(self, func: Callable[..., T], args: tuple, kwargs: Dict[str, Any]) -> T:
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``func(*args, **kwargs)`` on a worker thread and await its result."""
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.counters["rejected"] += 1
+                raise InferenceQueueFullError(
+                    f"Local inference queue full ({self.pending} pending)"
+                )
+            self.pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._pool(), self._invoke, func, args, kwargs)
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        self.counters["completed"] += 1
+        return result
+
+    def configure(self, max_workers: int | None = None, max_queue: int | None = None) -> None:
+        """Resize the executor. Running jobs finish on the old worker threads."""
+        if max_workers is not None:
+            self.max_workers = max(1, int(max_workers))
+        if max_queue is not None:
+            self.max_queue = max(0, int(max_queue))
+        self.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads. A later :meth:`run` starts a fresh pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queued": max(0, self.pending - self.running),
+            "running": self.running,
+            **self.counters,
+        }
+
+
+inference_executor = InferenceExecutor.from_env()
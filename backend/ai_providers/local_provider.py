@@ -2,9 +2,8 @@
 
 import os
 import time
-import base64
-import io
 import json
+from functools import partial
 from typing import Dict, Any, List
 
 from PIL import Image
@@ -13,13 +12,16 @@ from torchvision import models, transforms
 from transformers import pipeline
 
 from .base import (
+    ImageInput,
     TextProvider,
     VisionProvider,
     TextProcessingRequest,
     TextProcessingResponse,
     VisionProcessingRequest,
     VisionProcessingResponse,
+    image_to_pil,
 )
+from .micro_batcher import MicroBatcher
 
 
 class LocalTextProvider(TextProvider):
@@ -34,7 +36,33 @@ class LocalTextProvider(TextProvider):
         self.generator = pipeline(
             "text-generation", model=self.model_name, tokenizer=self.model_name, device=device
         )
+        tokenizer = self.generator.tokenizer
+        if tokenizer is not None:
+            # Batched generation pads prompts to a common length. Decoder-only
+            # models continue from the last position, so the padding must
+            # go on the left.
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token_id is None:
+                tokenizer.pad_token_id = tokenizer.eos_token_id
         self.dm_types = ["PROC", "DESC", "IPD", "CIR", "SNS", "WIR", "GEN"]
+        self._batchers: Dict[int, MicroBatcher[str, str]] = {}
+
+    def _generate_many(self, prompts: List[str], max_new_tokens: int) -> List[str]:
+        outputs = self.generator(
+            prompts, max_new_tokens=max_new_tokens, do_sample=False, batch_size=len(prompts)
+        )
+        return [output[0]["generated_text"] for output in outputs]
+
+    async def _generate(self, prompt: str, max_new_tokens: int) -> str:
+        """Generate text, batched with concurrent prompts of the same length budget."""
+        batcher = self._batchers.get(max_new_tokens)
+        if batcher is None:
+            batcher = MicroBatcher(
+                partial(self._generate_many, max_new_tokens=max_new_tokens),
+                name=f"local-text-{max_new_tokens}",
+            )
+            self._batchers[max_new_tokens] = batcher
+        return await batcher.submit(prompt)
 
     async def classify_document(self, request: TextProcessingRequest) -> TextProcessingResponse:
         """Classify document type using the local language model."""
@@ -45,7 +73,7 @@ class LocalTextProvider(TextProvider):
             " Respond with JSON like {\"dm_type\":..., \"title\":..., \"confidence\":0.9, \"metadata\":{\"language\":\"en-US\"}}.\nText:\n"
             + request.text[:1000]
         )
-        output = self.generator(prompt, max_new_tokens=200, do_sample=False)[0]["generated_text"]
+        output = await self._generate(prompt, max_new_tokens=200)
         json_start = output.find("{")
         json_end = output.rfind("}") + 1
         try:
@@ -124,7 +152,7 @@ class LocalTextProvider(TextProvider):
             " Respond in JSON with fields rewritten_text, ste_score, improvements, warnings.\nText:\n"
             + request.text
         )
-        output = self.generator(prompt, max_new_tokens=300, do_sample=False)[0]["generated_text"]
+        output = await self._generate(prompt, max_new_tokens=300)
         json_start = output.find("{")
         json_end = output.rfind("}") + 1
         try:
@@ -173,23 +201,92 @@ class LocalVisionProvider(VisionProvider):
         device = 0 if torch.cuda.is_available() else -1
         self.captioner = pipeline("image-to-text", model=self.model_name, device=device)
 
-    def _predict(self, image: Image.Image):
-        tensor = self.transform(image)
+        self._caption_batcher = MicroBatcher(self._caption_many, name="local-caption")
+        self._detect_batcher = MicroBatcher(self._detect_many, name="local-detect")
+        self._analyze_batcher = MicroBatcher(self._analyze_many, name="local-analyze")
+
+    def _predict(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        """Run the detector on all images in one forward pass."""
+        tensors = [self.transform(image) for image in images]
         with torch.no_grad():
-            output = self.detector([tensor])[0]
-        return output
+            return self.detector(tensors)
+
+    def _caption(self, images: List[Image.Image]) -> List[tuple[str, float]]:
+        try:
+            outputs = self.captioner(images, batch_size=len(images))
+        except Exception as e:
+            return [(f"Error: {e}", 0.0)] * len(images)
+        return [(output[0]["generated_text"].strip(), 0.9) for output in outputs]
+
+    def _detections(self, output) -> tuple[List[str], List[Dict[str, Any]], float]:
+        """Derive object labels, hotspot boxes and top score from one detector pass."""
+        categories = self.weights.meta['categories']
+        labels = [categories[int(i)] for i in output['labels']]
+        hotspots = []
+        for box, label in zip(output['boxes'], labels):
+            x1, y1, x2, y2 = [int(v) for v in box.tolist()]
+            hotspots.append({
+                "x": x1,
+                "y": y1,
+                "width": x2 - x1,
+                "height": y2 - y1,
+                "description": label,
+            })
+        confidence = float(output['scores'].max().item()) if len(output['scores']) > 0 else 0.0
+        return labels, hotspots, confidence
+
+    @staticmethod
+    def _decode(images: List[ImageInput]) -> tuple[List[Image.Image], Dict[int, str]]:
+        """Decode each image on its own so a corrupt one only fails itself.
+
+        Returns the decoded images and the error for each position that
+        could not be decoded.
+        """
+        decoded: List[Image.Image] = []
+        errors: Dict[int, str] = {}
+        for i, image in enumerate(images):
+            try:
+                decoded.append(image_to_pil(image))
+            except Exception as e:
+                errors[i] = f"Error: {e}"
+        return decoded, errors
+
+    @staticmethod
+    def _merge(results: List[Any], errors: Dict[int, str], failed) -> List[Any]:
+        """Put ``failed(error)`` back at the positions that did not decode."""
+        remaining = iter(results)
+        total = len(results) + len(errors)
+        return [failed(errors[i]) if i in errors else next(remaining) for i in range(total)]
+
+    def _caption_many(self, images: List[ImageInput]) -> List[tuple[str, float]]:
+        decoded, errors = self._decode(images)
+        captions = self._caption(decoded) if decoded else []
+        return self._merge(captions, errors, lambda error: (error, 0.0))
+
+    def _detect_many(self, images: List[ImageInput]) -> List[tuple[List[str], List[Dict[str, Any]], float]]:
+        decoded, errors = self._decode(images)
+        outputs = self._predict(decoded) if decoded else []
+        detections = [self._detections(output) for output in outputs]
+        return self._merge(detections, errors, lambda error: ([], [], 0.0))
+
+    def _analyze_many(
+        self, images: List[ImageInput]
+    ) -> List[tuple[str, float, List[str], List[Dict[str, Any]]]]:
+        decoded, errors = self._decode(images)
+        results = []
+        if decoded:
+            captions = self._caption(decoded)
+            detections = [self._detections(output) for output in self._predict(decoded)]
+            results = [
+                (caption, confidence, labels, hotspots)
+                for (caption, confidence), (labels, hotspots, _) in zip(captions, detections)
+            ]
+        return self._merge(results, errors, lambda error: (error, 0.0, [], []))
 
     async def generate_caption(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
         """Generate caption using a local vision-language model."""
         start_time = time.time()
-        image_data = base64.b64decode(request.image_data)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        try:
-            caption = self.captioner(image)[0]["generated_text"].strip()
-            confidence = 0.9
-        except Exception as e:
-            caption = f"Error: {e}"
-            confidence = 0.0
+        caption, confidence = await self._caption_batcher.submit(request.image_data)
         return VisionProcessingResponse(
             caption=caption,
             confidence=confidence,
@@ -200,13 +297,10 @@ class LocalVisionProvider(VisionProvider):
 
     async def detect_objects(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
         start_time = time.time()
-        image_data = base64.b64decode(request.image_data)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        output = self._predict(image)
-        labels = [self.weights.meta['categories'][int(i)] for i in output['labels']]
+        labels, _, confidence = await self._detect_batcher.submit(request.image_data)
         return VisionProcessingResponse(
             objects=labels,
-            confidence=float(output['scores'].max().item()) if len(output['scores']) > 0 else 0.0,
+            confidence=confidence,
             processing_time=time.time() - start_time,
             provider="local",
             model_used=self.model_name,
@@ -214,22 +308,26 @@ class LocalVisionProvider(VisionProvider):
 
     async def generate_hotspots(self, request: VisionProcessingRequest) -> VisionProcessingResponse:
         start_time = time.time()
-        image_data = base64.b64decode(request.image_data)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        output = self._predict(image)
-        hotspots = []
-        for box, label in zip(output['boxes'], output['labels']):
-            x1, y1, x2, y2 = [int(v) for v in box.tolist()]
-            hotspots.append({
-                "x": x1,
-                "y": y1,
-                "width": x2 - x1,
-                "height": y2 - y1,
-                "description": self.weights.meta['categories'][int(label)],
-            })
+        _, hotspots, confidence = await self._detect_batcher.submit(request.image_data)
         return VisionProcessingResponse(
             hotspots=hotspots,
-            confidence=float(output['scores'].max().item()) if len(output['scores']) > 0 else 0.0,
+            confidence=confidence,
+            processing_time=time.time() - start_time,
+            provider="local",
+            model_used=self.model_name,
+        )
+
+    async def analyze_image(
+        self, image: ImageInput, context: Dict[str, Any] | None = None
+    ) -> VisionProcessingResponse:
+        """Caption the image and run the detector once for objects and hotspots."""
+        start_time = time.time()
+        caption, confidence, labels, hotspots = await self._analyze_batcher.submit(image)
+        return VisionProcessingResponse(
+            caption=caption,
+            objects=labels,
+            hotspots=hotspots,
+            confidence=confidence,
             processing_time=time.time() - start_time,
             provider="local",
             model_used=self.model_name,
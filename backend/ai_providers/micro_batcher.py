@@ -0,0 +1,121 @@
+"""Dynamic micro-batching of local model calls."""
+
+import asyncio
+import logging
+import os
+import weakref
+from typing import Any, Callable, Dict, Generic, List, Set, Tuple, TypeVar
+
+from .inference_executor import InferenceExecutor, inference_executor
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_batchers: "weakref.WeakSet[MicroBatcher]" = weakref.WeakSet()
+
+
+def batch_size_from_env() -> int:
+    return int(os.environ.get("LOCAL_BATCH_SIZE", 8))
+
+
+def batch_latency_from_env() -> float:
+    return float(os.environ.get("LOCAL_BATCH_LATENCY_MS", 10)) / 1000
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collect concurrent single-item calls into batched model calls.
+
+    Items submitted within ``max_latency`` seconds of the first waiting item,
+    up to ``max_batch_size`` of them, are passed together to ``func`` which
+    must return one result per item in order. ``func`` runs on the
+    inference executor so batches never block the event loop. Pending items
+    are bound to the event loop that submitted them.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[List[T]], List[R]],
+        max_batch_size: int | None = None,
+        max_latency: float | None = None,
+        executor: InferenceExecutor | None = None,
+        name: str = "",
+    ):
+        self.func = func
+        self.max_batch_size = max(1, max_batch_size or batch_size_from_env())
+        self.max_latency = batch_latency_from_env() if max_latency is None else max_latency
+        self.executor = executor or inference_executor
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pending: List[Tuple[T, "asyncio.Future[R]"]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+        _batchers.add(self)
+
+    async def submit(self, item: T) -> R:
+        """Queue ``item`` for the next batch and await its result."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+            self._tasks = set()
+        future: asyncio.Future[R] = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [(i, f) for i, f in self._pending[: self.max_batch_size] if not f.done()]
+        self._pending = self._pending[self.max_batch_size :]
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._pending:
+            self._timer = self._loop.call_later(self.max_latency, self._flush)
+
+    async def _run(self, batch: List[Tuple[T, "asyncio.Future[R]"]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        self.max_seen = max(self.max_seen, len(batch))
+        try:
+            results = await self.executor.run(self.func, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name or 'batch'} returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_latency": self.max_latency,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+        }
+
+
+def batch_stats() -> List[Dict[str, Any]]:
+    """Stats for every live batcher."""
+    return [b.stats() for b in list(_batchers)]
@@ -14,13 +14,21 @@ import openai
 from dotenv import load_dotenv
 
 from .base import (
+    COMBINED_ANALYSIS_PROMPT,
+    COMBINED_VISION_PROMPT,
+    ImageInput,
     TextProcessingRequest,
     TextProcessingResponse,
     TextProvider,
     VisionProcessingRequest,
     VisionProcessingResponse,
     VisionProvider,
+    image_media_type,
+    image_to_base64,
+    is_combined_result,
 )
+from .rate_limiter import estimate_tokens, rate_limiter
+from .resilience import resilience
 
 # Ensure environment variables are loaded even if the server did not call
 # ``load_dotenv`` for some reason. We use ``override=True`` so that values in
@@ -31,18 +39,33 @@ load_dotenv(Path(__file__).resolve().parents[1] / ".env", override=True)
 logger = logging.getLogger(__name__)
 
 
-class OpenAITextProvider(TextProvider):
-    """OpenAI text processing provider."""
+class _OpenAIClientMixin:
+    """Chat completion helper shared by the OpenAI providers."""
 
-    def __init__(self, model: str | None = None):
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError(
-                "OPENAI_API_KEY environment variable not set. "
-                "Ensure it is defined in backend/.env or the execution environment."
+    client: openai.AsyncOpenAI
+    model: str
+
+    async def _chat(self, **kwargs: Any) -> Any:
+        """Create a chat completion with retries, circuit breaking and rate limits."""
+        return await resilience.call(
+            f"openai:{self.model}", lambda: self._chat_once(**kwargs)
+        )
+
+    async def _chat_once(self, **kwargs: Any) -> Any:
+        governor = rate_limiter.get("openai", self.model)
+        estimate = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens", 0))
+        await governor.acquire(estimate)
+        actual = None
+        try:
+            timeout = resilience.policy.timeout
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(**kwargs, timeout=timeout),
+                timeout=timeout,
             )
-        self.client = openai.AsyncOpenAI(api_key=api_key)
-        self.model = model or os.environ.get("TEXT_MODEL", "gpt-4o-mini")
+            actual = getattr(getattr(response, "usage", None), "total_tokens", None)
+            return response
+        finally:
+            governor.release(estimate, actual)
 
     def _parse_json(self, text: str) -> Any:
         """Parse JSON content from LLM responses that may include code fences.
@@ -81,6 +104,28 @@ class OpenAITextProvider(TextProvider):
             logger.warning("Failed to parse JSON from AI response")
             return {}
 
+
+class OpenAITextProvider(_OpenAIClientMixin, TextProvider):
+    """OpenAI text processing provider."""
+
+    def __init__(self, model: str | None = None):
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "OPENAI_API_KEY environment variable not set. "
+                "Ensure it is defined in backend/.env or the execution environment."
+            )
+        # Retries are left to ``resilience`` so every HTTP request goes
+        # through the circuit breaker and the rate limiter.
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key, max_retries=0, timeout=resilience.policy.timeout
+        )
+        self.model = model or os.environ.get("TEXT_MODEL", "gpt-4o-mini")
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
+
     async def classify_document(
         self, request: TextProcessingRequest
     ) -> TextProcessingResponse:
@@ -106,7 +151,7 @@ class OpenAITextProvider(TextProvider):
         """
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
@@ -167,7 +212,7 @@ class OpenAITextProvider(TextProvider):
         """
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
@@ -222,7 +267,7 @@ class OpenAITextProvider(TextProvider):
         """
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
@@ -262,7 +307,7 @@ class OpenAITextProvider(TextProvider):
         """
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
@@ -288,8 +333,47 @@ class OpenAITextProvider(TextProvider):
                 model_used=self.model,
             )
 
+    async def analyze_document(
+        self, request: TextProcessingRequest
+    ) -> TextProcessingResponse:
+        """Classify, extract and rewrite in a single chat completion."""
+        start_time = time.time()
+        prompt = COMBINED_ANALYSIS_PROMPT.format(text=request.text)
+
+        try:
+            response = await self._chat(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=4000,
+                response_format={"type": "json_object"},
+            )
+            result = self._parse_json(response.choices[0].message.content)
+        except Exception as e:
+            # Only a malformed answer is worth retrying as separate calls; an
+            # open circuit or exhausted retries would fail those too.
+            return TextProcessingResponse(
+                result={"error": str(e)},
+                confidence=0.0,
+                processing_time=time.time() - start_time,
+                provider="openai",
+                model_used=self.model,
+            )
+
+        if not is_combined_result(result):
+            logger.warning("Combined analysis response incomplete, using separate calls")
+            return await super().analyze_document(request)
 
-class OpenAIVisionProvider(VisionProvider):
+        return TextProcessingResponse(
+            result=result,
+            confidence=result["classification"].get("confidence", 0.0),
+            processing_time=time.time() - start_time,
+            provider="openai",
+            model_used=self.model,
+        )
+
+
+class OpenAIVisionProvider(_OpenAIClientMixin, VisionProvider):
     """OpenAI vision processing provider."""
 
     def __init__(self, model: str | None = None):
@@ -299,9 +383,17 @@ class OpenAIVisionProvider(VisionProvider):
                 "OPENAI_API_KEY environment variable not set. "
                 "Ensure it is defined in backend/.env or the execution environment."
             )
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        # Retries are left to ``resilience`` so every HTTP request goes
+        # through the circuit breaker and the rate limiter.
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key, max_retries=0, timeout=resilience.policy.timeout
+        )
         self.model = model or os.environ.get("VISION_MODEL", "gpt-4o-mini")
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
+
     async def generate_caption(
         self, request: VisionProcessingRequest
     ) -> VisionProcessingResponse:
@@ -309,7 +401,7 @@ class OpenAIVisionProvider(VisionProvider):
         start_time = time.time()
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[
                     {
@@ -322,7 +414,7 @@ class OpenAIVisionProvider(VisionProvider):
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{request.image_data}"
+                                    "url": f"data:{image_media_type(request.image_data)};base64,{request.image_data}"
                                 },
                             },
                         ],
@@ -358,7 +450,7 @@ class OpenAIVisionProvider(VisionProvider):
         start_time = time.time()
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[
                     {
@@ -371,7 +463,7 @@ class OpenAIVisionProvider(VisionProvider):
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{request.image_data}"
+                                    "url": f"data:{image_media_type(request.image_data)};base64,{request.image_data}"
                                 },
                             },
                         ],
@@ -414,7 +506,7 @@ class OpenAIVisionProvider(VisionProvider):
         start_time = time.time()
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat(
                 model=self.model,
                 messages=[
                     {
@@ -427,7 +519,7 @@ class OpenAIVisionProvider(VisionProvider):
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{request.image_data}"
+                                    "url": f"data:{image_media_type(request.image_data)};base64,{request.image_data}"
                                 },
                             },
                         ],
@@ -462,3 +554,58 @@ class OpenAIVisionProvider(VisionProvider):
                 provider="openai",
                 model_used=self.model,
             )
+
+    async def analyze_image(
+        self, image: ImageInput, context: Dict[str, Any] | None = None
+    ) -> VisionProcessingResponse:
+        """Caption, objects and hotspots in a single chat completion."""
+        start_time = time.time()
+        image_data = image_to_base64(image)
+
+        try:
+            response = await self._chat(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": COMBINED_VISION_PROMPT},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{image_media_type(image_data)};base64,{image_data}"
+                                },
+                            },
+                        ],
+                    }
+                ],
+                temperature=0.1,
+                max_tokens=1000,
+                response_format={"type": "json_object"},
+            )
+            result = self._parse_json(response.choices[0].message.content)
+        except Exception as e:
+            # As for text, only a malformed answer falls back to separate calls.
+            return VisionProcessingResponse(
+                caption=f"Error analyzing image: {str(e)}",
+                confidence=0.0,
+                processing_time=time.time() - start_time,
+                provider="openai",
+                model_used=self.model,
+            )
+
+        if not isinstance(result, dict) or not result.get("caption"):
+            logger.warning("Combined image analysis response incomplete, using separate calls")
+            return await super().analyze_image(image_data, context)
+
+        objects = result.get("objects")
+        hotspots = result.get("hotspots")
+        return VisionProcessingResponse(
+            caption=str(result["caption"]),
+            objects=objects if isinstance(objects, list) else [],
+            hotspots=hotspots if isinstance(hotspots, list) else [],
+            confidence=0.85,
+            processing_time=time.time() - start_time,
+            provider="openai",
+            model_used=self.model,
+        )
@@ -1,50 +1,126 @@
 """AI Provider Factory for creating text and vision providers."""
 
+import importlib
+import logging
 import os
-from typing import Tuple
+from functools import lru_cache
+from typing import Dict, Tuple, Type
 from .base import TextProvider, VisionProvider
-from .openai_provider import OpenAITextProvider, OpenAIVisionProvider
-from .anthropic_provider import AnthropicTextProvider, AnthropicVisionProvider
-from .local_provider import LocalTextProvider, LocalVisionProvider
+from .provider_pool import provider_pool
+from .cached_provider import CachedTextProvider, CachedVisionProvider
+from .response_cache import cache_enabled, response_cache
+from .inference_executor import inference_executor
+
+logger = logging.getLogger(__name__)
+
+# Provider classes by (kind, name) as "module:Class". Modules are imported on
+# first use so the API process never loads an SDK, torch or transformers for
+# a provider it does not select.
+PROVIDER_REGISTRY: Dict[Tuple[str, str], str] = {
+    ("text", "openai"): "openai_provider:OpenAITextProvider",
+    ("text", "anthropic"): "anthropic_provider:AnthropicTextProvider",
+    ("text", "local"): "local_provider:LocalTextProvider",
+    ("vision", "openai"): "openai_provider:OpenAIVisionProvider",
+    ("vision", "anthropic"): "anthropic_provider:AnthropicVisionProvider",
+    ("vision", "local"): "local_provider:LocalVisionProvider",
+}
+
+
+@lru_cache(maxsize=None)
+def load_provider_class(kind: str, provider_type: str) -> Type:
+    """Import and return the provider class registered for ``kind``."""
+    target = PROVIDER_REGISTRY.get((kind, provider_type))
+    if target is None:
+        raise ValueError(f"Unknown {kind} provider: {provider_type}")
+    module_name, class_name = target.split(":")
+    module = importlib.import_module(f".{module_name}", __package__)
+    return getattr(module, class_name)
 
 
 class ProviderFactory:
-    """Factory for creating AI providers based on configuration."""
-    
+    """Factory for creating AI providers based on configuration.
+
+    ``create_*`` methods return shared instances from :data:`provider_pool`;
+    ``acquire_*`` methods do the same but keep the instance open until
+    :meth:`release_provider`, even if the selection changes meanwhile;
+    ``build_*`` methods always construct a new provider.
+    """
+
     @staticmethod
-    def create_text_provider(provider_type: str = None, model: str | None = None) -> TextProvider:
-        """Create text provider based on configuration."""
+    def _resolve(kind: str, provider_type: str | None, model: str | None) -> Tuple[str, str | None]:
+        prefix = kind.upper()
         if provider_type is None:
-            provider_type = os.environ.get("TEXT_PROVIDER", "openai").lower()
+            provider_type = os.environ.get(f"{prefix}_PROVIDER", "openai")
         if model is None:
-            model = os.environ.get("TEXT_MODEL")
-
-        if provider_type == "openai":
-            return OpenAITextProvider(model=model)
-        elif provider_type == "anthropic":
-            return AnthropicTextProvider(model=model)
-        elif provider_type == "local":
-            return LocalTextProvider(model=model)
-        else:
-            raise ValueError(f"Unknown text provider: {provider_type}")
-    
+            model = os.environ.get(f"{prefix}_MODEL")
+        return provider_type.lower(), model
+
+    @staticmethod
+    def current_selection(kind: str) -> Tuple[str, str | None]:
+        """Return the (provider, model) currently configured for ``kind``."""
+        return ProviderFactory._resolve(kind, None, None)
+
+    @staticmethod
+    def build_text_provider(provider_type: str, model: str | None = None) -> TextProvider:
+        """Construct a new text provider instance."""
+        return load_provider_class("text", provider_type)(model=model)
+
+    @staticmethod
+    def build_vision_provider(provider_type: str, model: str | None = None) -> VisionProvider:
+        """Construct a new vision provider instance."""
+        return load_provider_class("vision", provider_type)(model=model)
+
+    @staticmethod
+    def _build_pooled_text_provider(provider_type: str, model: str | None) -> TextProvider:
+        provider = ProviderFactory.build_text_provider(provider_type, model)
+        if cache_enabled():
+            provider = CachedTextProvider(provider, provider_type, response_cache)
+        return provider
+
+    @staticmethod
+    def _build_pooled_vision_provider(provider_type: str, model: str | None) -> VisionProvider:
+        provider = ProviderFactory.build_vision_provider(provider_type, model)
+        if cache_enabled():
+            provider = CachedVisionProvider(provider, provider_type, response_cache)
+        return provider
+
+    @staticmethod
+    def create_text_provider(provider_type: str = None, model: str | None = None) -> TextProvider:
+        """Return the pooled text provider for the configuration."""
+        provider_type, model = ProviderFactory._resolve("text", provider_type, model)
+        return provider_pool.get(
+            "text", provider_type, model, ProviderFactory._build_pooled_text_provider
+        )
+
     @staticmethod
     def create_vision_provider(provider_type: str = None, model: str | None = None) -> VisionProvider:
-        """Create vision provider based on configuration."""
-        if provider_type is None:
-            provider_type = os.environ.get("VISION_PROVIDER", "openai").lower()
-        if model is None:
-            model = os.environ.get("VISION_MODEL")
-
-        if provider_type == "openai":
-            return OpenAIVisionProvider(model=model)
-        elif provider_type == "anthropic":
-            return AnthropicVisionProvider(model=model)
-        elif provider_type == "local":
-            return LocalVisionProvider(model=model)
-        else:
-            raise ValueError(f"Unknown vision provider: {provider_type}")
-    
+        """Return the pooled vision provider for the configuration."""
+        provider_type, model = ProviderFactory._resolve("vision", provider_type, model)
+        return provider_pool.get(
+            "vision", provider_type, model, ProviderFactory._build_pooled_vision_provider
+        )
+
+    @staticmethod
+    async def acquire_text_provider(provider_type: str = None, model: str | None = None) -> TextProvider:
+        """Return the pooled text provider, held open until :meth:`release_provider`."""
+        provider_type, model = ProviderFactory._resolve("text", provider_type, model)
+        return await provider_pool.acquire(
+            "text", provider_type, model, ProviderFactory._build_pooled_text_provider
+        )
+
+    @staticmethod
+    async def acquire_vision_provider(provider_type: str = None, model: str | None = None) -> VisionProvider:
+        """Return the pooled vision provider, held open until :meth:`release_provider`."""
+        provider_type, model = ProviderFactory._resolve("vision", provider_type, model)
+        return await provider_pool.acquire(
+            "vision", provider_type, model, ProviderFactory._build_pooled_vision_provider
+        )
+
+    @staticmethod
+    async def release_provider(provider: TextProvider | VisionProvider) -> None:
+        """Release a provider taken with one of the ``acquire_*`` methods."""
+        await provider_pool.release(provider)
+
     @staticmethod
     def create_providers(text_provider: str = None, vision_provider: str = None,
                          text_model: str | None = None, vision_model: str | None = None) -> Tuple[TextProvider, VisionProvider]:
@@ -52,13 +128,59 @@ class ProviderFactory:
         text_prov = ProviderFactory.create_text_provider(text_provider, text_model)
         vision_prov = ProviderFactory.create_vision_provider(vision_provider, vision_model)
         return text_prov, vision_prov
-    
+
+    @staticmethod
+    def warm_up() -> Dict[str, str | None]:
+        """Construct the currently selected providers ahead of the first request.
+
+        Local providers are skipped: building them imports torch and
+        transformers and loads model weights, which would undo the lazy
+        imports that keep startup fast. They are built on first use instead.
+        Construction errors (for example a missing API key) are logged and
+        reported rather than raised so that startup is never blocked.
+        """
+        errors: Dict[str, str | None] = {}
+        for kind, create in (
+            ("text", ProviderFactory.create_text_provider),
+            ("vision", ProviderFactory.create_vision_provider),
+        ):
+            if ProviderFactory.current_selection(kind)[0] == "local":
+                logger.info(f"Not warming up local {kind} provider; it is built on first use")
+                errors[kind] = None
+                continue
+            try:
+                create()
+                errors[kind] = None
+            except Exception as e:
+                logger.warning(f"Could not warm up {kind} provider: {e}")
+                errors[kind] = str(e)
+        return errors
+
+    @staticmethod
+    async def invalidate(kind: str | None = None) -> int:
+        """Drop pooled providers that no longer match the current selection."""
+        removed = 0
+        for k in ("text", "vision"):
+            if kind is not None and k != kind:
+                continue
+            provider_type, model = ProviderFactory.current_selection(k)
+            keep = provider_pool.make_key(k, provider_type, model)
+            removed += await provider_pool.invalidate(k, keep=keep)
+        return removed
+
+    @staticmethod
+    async def shutdown() -> None:
+        """Close pooled providers, the response cache and inference workers."""
+        await provider_pool.aclose()
+        response_cache.close()
+        inference_executor.shutdown(wait=False)
+
     @staticmethod
     def get_available_providers() -> dict:
         """Get list of available providers."""
         return {
-            "text": ["openai", "anthropic", "local"],
-            "vision": ["openai", "anthropic", "local"]
+            kind: [name for k, name in PROVIDER_REGISTRY if k == kind]
+            for kind in ("text", "vision")
         }
     
     @staticmethod
@@ -0,0 +1,166 @@
+"""Process-wide registry of constructed AI providers."""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str, str]
+
+
+class ProviderPool:
+    """Cache provider instances keyed by ``(kind, provider, model)``.
+
+    Providers are built lazily on first use and then shared by every caller so
+    that local model weights and API client connection pools are only created
+    once per process.
+
+    Callers on the event loop take a provider with :meth:`acquire`, which
+    builds it in a worker thread so loading local model weights never stalls
+    other requests, and hand it back with :meth:`release`. A provider dropped
+    by :meth:`invalidate` while still held is retired instead of closed, and
+    the last :meth:`release` closes it.
+    """
+
+    def __init__(self):
+        self._providers: Dict[PoolKey, Any] = {}
+        self._users: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self._build_locks: Dict[PoolKey, threading.Lock] = {}
+        self._builds: Dict[PoolKey, "asyncio.Future[Any]"] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, provider_type: str, model: str | None) -> PoolKey:
+        return (kind, provider_type.lower(), model or "")
+
+    def get(
+        self,
+        kind: str,
+        provider_type: str,
+        model: str | None,
+        builder: Callable[[str, str | None], Any],
+    ) -> Any:
+        """Return the pooled provider, constructing it with ``builder`` if needed.
+
+        Construction blocks the calling thread; on the event loop use
+        :meth:`acquire` instead.
+        """
+        key = self.make_key(kind, provider_type, model)
+        provider = self._providers.get(key)
+        if provider is not None:
+            return provider
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        # Builds of different providers may run at the same time; builds of
+        # the same one are serialised and only the first does any work.
+        with build_lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                logger.info(f"Constructing {kind} provider {key[1]} ({key[2] or 'default'})")
+                provider = builder(provider_type, model)
+                with self._lock:
+                    self._providers[key] = provider
+        return provider
+
+    async def acquire(
+        self,
+        kind: str,
+        provider_type: str,
+        model: str | None,
+        builder: Callable[[str, str | None], Any],
+    ) -> Any:
+        """Like :meth:`get`, but keep the provider open until :meth:`release`.
+
+        A missing provider is built in a worker thread; concurrent callers
+        for the same key wait on the same build.
+        """
+        key = self.make_key(kind, provider_type, model)
+        provider = self._providers.get(key)
+        if provider is None:
+            build = self._builds.get(key)
+            if build is None:
+                build = asyncio.ensure_future(
+                    asyncio.to_thread(self.get, kind, provider_type, model, builder)
+                )
+                self._builds[key] = build
+                build.add_done_callback(lambda _: self._builds.pop(key, None))
+            provider = await asyncio.shield(build)
+        with self._lock:
+            self._users[id(provider)] = self._users.get(id(provider), 0) + 1
+        return provider
+
+    async def release(self, provider: Any) -> None:
+        """Give back a provider from :meth:`acquire`, closing it if retired."""
+        with self._lock:
+            users = self._users.get(id(provider), 0) - 1
+            if users > 0:
+                self._users[id(provider)] = users
+                return
+            self._users.pop(id(provider), None)
+            retired = self._retired.pop(id(provider), None)
+        if retired is not None:
+            await _close_provider(retired)
+
+    async def invalidate(
+        self,
+        kind: str | None = None,
+        keep: PoolKey | None = None,
+    ) -> int:
+        """Drop pooled providers of ``kind`` (all kinds if ``None``) except ``keep``.
+
+        Dropped providers have their clients closed, or are retired until
+        their last user releases them. Returns the number of providers removed.
+        """
+        with self._lock:
+            keys = [
+                k for k in self._providers
+                if (kind is None or k[0] == kind) and k != keep
+            ]
+            removed = [self._providers.pop(k) for k in keys]
+            idle = []
+            for provider in removed:
+                if self._users.get(id(provider)):
+                    self._retired[id(provider)] = provider
+                else:
+                    idle.append(provider)
+        for provider in idle:
+            await _close_provider(provider)
+        return len(removed)
+
+    async def aclose(self) -> None:
+        """Close every pooled and retired provider and empty the pool."""
+        await self.invalidate()
+        with self._lock:
+            retired = list(self._retired.values())
+            self._retired.clear()
+            self._users.clear()
+        for provider in retired:
+            await _close_provider(provider)
+
+    def keys(self) -> List[PoolKey]:
+        return list(self._providers.keys())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._providers),
+            "retired": len(self._retired),
+            "providers": [
+                {"kind": k[0], "provider": k[1], "model": k[2]} for k in self.keys()
+            ],
+        }
+
+
+async def _close_provider(provider: Any) -> None:
+    close = getattr(provider, "aclose", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception as e:  # pragma: no cover - best effort cleanup
+        logger.warning(f"Error closing provider {provider!r}: {e}")
+
+
+provider_pool = ProviderPool()
@@ -0,0 +1,195 @@
+"""Per-provider request/token rate limiting and concurrency governance."""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Rough token cost charged for each image sent to a vision model.
+IMAGE_TOKEN_ESTIMATE = 1000
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def estimate_tokens(messages: Iterable[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """Estimate the tokens a chat request will consume (about 4 chars per token)."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                chars += len(part.get("text", ""))
+            elif part.get("type") in {"image", "image_url"}:
+                images += 1
+    return chars // 4 + images * IMAGE_TOKEN_ESTIMATE + max_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute.
+
+    A ``per_minute`` of ``None`` means unlimited.
+    """
+
+    def __init__(self, per_minute: float | None):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute) if per_minute else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.per_minute:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60
+            )
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available."""
+        if not self.per_minute:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.per_minute
+
+    def consume(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Return (positive) or charge (negative) tokens after the fact."""
+        if self.per_minute:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class ProviderGovernor:
+    """Concurrency and rate governor for one provider/model pair.
+
+    Callers wait in FIFO order: first for a concurrency slot, then for the
+    request and token buckets, so no caller is starved by later arrivals.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.key = key
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._bucket_lock: asyncio.Lock | None = None
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _primitives(self) -> tuple[asyncio.Semaphore, asyncio.Lock]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket_lock = asyncio.Lock()
+        return self._semaphore, self._bucket_lock
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait for a slot and rate budget. Returns the seconds spent waiting."""
+        semaphore, bucket_lock = self._primitives()
+        start = time.monotonic()
+        self.queue_depth += 1
+        try:
+            await semaphore.acquire()
+            try:
+                async with bucket_lock:
+                    while True:
+                        delay = max(self.requests.delay(1), self.tokens.delay(tokens))
+                        if delay <= 0:
+                            break
+                        await asyncio.sleep(delay)
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+            except BaseException:
+                semaphore.release()
+                raise
+        finally:
+            self.queue_depth -= 1
+        waited = time.monotonic() - start
+        self.in_flight += 1
+        self.total_requests += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: int | None = None) -> None:
+        """Free the slot and reconcile the token estimate with real usage."""
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "rpm": self.requests.per_minute,
+            "tpm": self.tokens.per_minute,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "avg_wait": self.total_wait / self.total_requests if self.total_requests else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class RateLimiterRegistry:
+    """Governors keyed by ``provider:model`` configured from settings.
+
+    ``limits`` maps ``"provider:model"`` or ``"provider"`` to a dict with
+    optional ``rpm``, ``tpm`` and ``max_concurrency`` entries. The most
+    specific entry wins.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, Any]] | None = None):
+        self.limits: Dict[str, Dict[str, Any]] = dict(limits or {})
+        self._governors: Dict[str, ProviderGovernor] = {}
+
+    def configure(self, limits: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the configured limits. New governors are built lazily."""
+        self.limits = dict(limits or {})
+        self._governors = {}
+
+    def get(self, provider: str, model: str | None) -> ProviderGovernor:
+        key = f"{provider}:{model or ''}"
+        governor = self._governors.get(key)
+        if governor is None:
+            cfg = {**self.limits.get(provider, {}), **self.limits.get(key, {})}
+            governor = ProviderGovernor(
+                key,
+                rpm=cfg.get("rpm"),
+                tpm=cfg.get("tpm"),
+                max_concurrency=cfg.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+            )
+            self._governors[key] = governor
+        return governor
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [g.stats() for g in self._governors.values()]
+
+
+rate_limiter = RateLimiterRegistry()
@@ -0,0 +1,198 @@
+"""Retry with backoff and per-provider circuit breakers for AI API calls."""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the provider's circuit is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Classify an exception raised by a provider SDK as transient or fatal."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return int(status) in RETRYABLE_STATUS
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Return the server's retry-after hint in seconds, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped at ``max_delay`` seconds."""
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    timeout: float = 60.0
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+    def backoff(self, attempt: int, hint: float | None = None) -> float:
+        """Delay before retry number ``attempt`` (1-based)."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """Fail fast while a provider is unhealthy.
+
+    After ``failure_threshold`` consecutive transient failures the circuit
+    opens and calls are rejected for ``reset_timeout`` seconds. It then
+    half-opens and lets a single probe through; success closes it again and
+    failure re-opens it.
+    """
+
+    def __init__(self, key: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.key = key
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> None:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit open for {self.key}")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit half-open for {self.key}, probe in flight")
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Opening circuit for {self.key} after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Forget an in-flight probe that ended without a verdict."""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class ResilienceRegistry:
+    """Retry policy plus one circuit breaker per ``provider:model`` key."""
+
+    def __init__(self, policy: RetryPolicy | None = None):
+        self.policy = policy or RetryPolicy()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+
+    def configure(self, policy: Dict[str, Any]) -> None:
+        self.policy = RetryPolicy(**{**asdict(RetryPolicy()), **(policy or {})})
+        self._breakers = {}
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                key, self.policy.failure_threshold, self.policy.reset_timeout
+            )
+            self._breakers[key] = breaker
+        return breaker
+
+    async def call(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Run ``func`` with retries and the circuit breaker for ``key``.
+
+        ``func`` is called once per attempt and should apply
+        ``policy.timeout`` to the network call itself, so time spent queued
+        for rate limits does not count as a timeout.
+        """
+        policy = self.policy
+        breaker = self.breaker(key)
+        attempt = 1
+        while True:
+            breaker.allow()
+            try:
+                result = await func()
+            except Exception as exc:
+                if not is_retryable(exc):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt >= policy.max_attempts or breaker.state == "open":
+                    raise
+                delay = policy.backoff(attempt, retry_after(exc))
+                logger.info(f"Retrying {key} in {delay:.2f}s after {type(exc).__name__}: {exc}")
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": asdict(self.policy),
+            "retries": self.retries,
+            "circuits": [b.stats() for b in self._breakers.values()],
+        }
+
+
+resilience = ResilienceRegistry()
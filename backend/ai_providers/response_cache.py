@@ -0,0 +1,230 @@
+"""Content-addressed cache for AI provider responses."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: str | bytes) -> str:
+    """Return the SHA-256 hex digest of text or binary content."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _serialize(value: Dict[str, Any]) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def response_hash(value: Dict[str, Any]) -> str:
+    """Return the hash a cached ``value`` is stored under as its response hash."""
+    return content_hash(_serialize(value))
+
+
+def make_cache_key(
+    provider: str,
+    model: str,
+    task_type: str,
+    payload: str | bytes,
+    context: Dict[str, Any] | None = None,
+) -> str:
+    """Build the prompt hash identifying a provider request."""
+    parts = [
+        provider,
+        model or "",
+        task_type,
+        content_hash(payload),
+        json.dumps(context or {}, sort_keys=True, default=str),
+    ]
+    return content_hash("\x1f".join(parts))
+
+
+class ResponseCache:
+    """Two tier (memory LRU + SQLite) cache of provider responses.
+
+    Entries expire after ``ttl`` seconds. The memory tier holds at most
+    ``max_memory_entries`` entries and the SQLite tier at most
+    ``max_disk_entries``; the least recently used entries are evicted first.
+    Set ``db_path`` to ``None`` to disable the persistent tier.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        ttl: float = 7 * 24 * 3600,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 100_000,
+    ):
+        self.db_path = Path(db_path) if db_path else None
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        path = os.environ.get("AI_CACHE_PATH", "/tmp/aquila_uploads/ai_cache.sqlite3")
+        return cls(
+            db_path=path or None,
+            ttl=float(os.environ.get("AI_CACHE_TTL", 7 * 24 * 3600)),
+            max_memory_entries=int(os.environ.get("AI_CACHE_MEMORY_ENTRIES", 1024)),
+            max_disk_entries=int(os.environ.get("AI_CACHE_DISK_ENTRIES", 100_000)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    prompt_hash TEXT PRIMARY KEY,
+                    response_hash TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get_sync(self, key: str) -> Dict[str, Any] | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self.counters["evictions"] += 1
+
+            if self.db_path is not None:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT data, expires_at FROM responses WHERE prompt_hash=?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        conn.execute(
+                            "UPDATE responses SET accessed_at=? WHERE prompt_hash=?",
+                            (now, key),
+                        )
+                        conn.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.counters["disk_hits"] += 1
+                        return value
+                    conn.execute("DELETE FROM responses WHERE prompt_hash=?", (key,))
+                    conn.commit()
+                    self.counters["evictions"] += 1
+
+            self.counters["misses"] += 1
+            return None
+
+    def set_sync(self, key: str, value: Dict[str, Any]) -> str:
+        """Store ``value`` and return its response hash."""
+        now = time.time()
+        expires_at = now + self.ttl
+        data = _serialize(value)
+        digest = content_hash(data)
+        with self._lock:
+            self._remember(key, expires_at, json.loads(data))
+            self.counters["stores"] += 1
+            if self.db_path is not None:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, digest, data, expires_at, now),
+                )
+                if self.counters["stores"] % 100 == 1:
+                    self._prune(conn, now)
+                conn.commit()
+        return digest
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        cur = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self.counters["evictions"] += cur.rowcount
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            cur = conn.execute(
+                "DELETE FROM responses WHERE prompt_hash IN ("
+                "SELECT prompt_hash FROM responses ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.counters["evictions"] += cur.rowcount
+
+    async def get(self, key: str) -> Dict[str, Any] | None:
+        if self.db_path is None:
+            return self.get_sync(key)
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> str:
+        if self.db_path is None:
+            return self.set_sync(key, value)
+        return await asyncio.to_thread(self.set_sync, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self.db_path is not None:
+                conn = self._connect()
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_entries": len(self._memory),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "persistent": self.db_path is not None,
+        }
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("AI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+response_cache = ResponseCache.from_env()
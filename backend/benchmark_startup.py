@@ -0,0 +1,88 @@
+"""Measure cold-start import time and memory of the API process.
+
+Each run imports the target module in a fresh interpreter and reports the
+wall time, peak RSS and which heavy libraries were loaded as a side effect.
+
+Usage::
+
+    python -m backend.benchmark_startup [--runs 5] [--module backend.server]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Libraries that should only be imported once a request needs them.
+HEAVY_MODULES = [
+    "torch",
+    "torchvision",
+    "transformers",
+    "openai",
+    "anthropic",
+    "reportlab",
+    "pdf2image",
+    "pytesseract",
+    "xmlschema",
+    "openpyxl",
+    "pptx",
+    "docx",
+    "PyPDF2",
+    "PIL.Image",
+]
+
+_CHILD = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": rss_kb / 1024,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import ``module`` in a new interpreter and return its measurements."""
+    root = Path(__file__).resolve().parent.parent
+    env = {**os.environ, "PYTHONPATH": str(root)}
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "aquila_benchmark")
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="backend.server")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    report = {
+        "module": args.module,
+        "runs": len(runs),
+        "median_seconds": statistics.median(r["seconds"] for r in runs),
+        "max_seconds": max(r["seconds"] for r in runs),
+        "median_max_rss_mb": statistics.median(r["max_rss_mb"] for r in runs),
+        "heavy_modules_loaded": runs[-1]["loaded"],
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -2,32 +2,248 @@
 
 from __future__ import annotations
 
-from typing import Dict, List
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
 
 from lxml import etree
 
+from backend.services.validation_artifacts import validation_artifacts
+
+# ``//name[...]`` or ``//name/...``: the rule can only match where ``name`` occurs.
+_ANCHOR_RE = re.compile(r"^//([A-Za-z_][\w.-]*)(?=$|[\[/])")
+# ``//*[@name ...`` or ``//*[attribute::name ...``: only where the attribute occurs.
+_ATTRIBUTE_ANCHOR_RE = re.compile(r"^//\*\[\s*(?:@|attribute::)([A-Za-z_][\w.-]*)")
+
+# Constraint texts of the S1000D rule set, mapped to how they are checked.
+FORBIDDEN_CONSTRAINTS = {"not allowed", "prohibited", "forbidden"}
+REQUIRED_CONSTRAINTS = {"required", "mandatory", "must exist"}
+
+
+@dataclass
+class BrexRule:
+    """One compiled BREX rule.
+
+    ``mode`` is ``forbid`` (any context match is a violation), ``require``
+    (no match is a violation), ``enum`` (matched values must be in
+    ``allowed``) or ``manual`` (not machine checkable; counted only).
+    """
+
+    id: str
+    rule_type: str
+    message: str
+    context: str
+    mode: str
+    xpath: Any = None
+    anchor: str | None = None
+    allowed: frozenset = frozenset()
+
+    @classmethod
+    def from_dict(cls, rule: Dict[str, Any]) -> "BrexRule":
+        rule_id = rule.get("id", "BREX")
+        if rule.get("xpath"):
+            # Legacy form: the expression selects violating nodes
+            context, mode = rule["xpath"], "forbid"
+        else:
+            context = rule.get("contextXPath") or ""
+            mode = _constraint_mode(rule)
+        allowed = _enum_values(rule.get("enumTable"))
+        if allowed and mode != "forbid":
+            mode = "enum"
+        match = _ANCHOR_RE.match(context)
+        attribute = _ATTRIBUTE_ANCHOR_RE.match(context)
+        anchor = match.group(1) if match else f"@{attribute.group(1)}" if attribute else None
+        return cls(
+            id=rule_id,
+            rule_type=rule.get("ruleType", "firm"),
+            message=rule.get("message") or rule.get("text") or "Rule violation",
+            context=context,
+            mode=mode,
+            anchor=anchor,
+            allowed=frozenset(allowed),
+        )
+
+
+def _constraint_mode(rule: Dict[str, Any]) -> str:
+    constraint = str(rule.get("constraint") or "").strip().lower()
+    if constraint in FORBIDDEN_CONSTRAINTS:
+        return "forbid"
+    if constraint in REQUIRED_CONSTRAINTS:
+        return "require"
+    return "manual"
+
+
+def _enum_values(table: Any) -> List[str]:
+    if not table:
+        return []
+    if isinstance(table, dict):
+        table = table.get("values") or list(table)
+    return [str(v.get("value") if isinstance(v, dict) else v) for v in table]
+
+
+def rule_set_version(rules: List[Dict[str, Any]] | Dict[str, Any]) -> str:
+    """Stable hash of a rule list or mapping, used to key compiled engines and results."""
+    payload = json.dumps(rules, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+@dataclass
+class BrexReport:
+    violations: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    evaluated: int = 0
+    skipped: int = 0
+
+    def messages(self) -> List[str]:
+        return [f"{v['rule_id']}: {v['message']}" for v in self.violations]
+
+
+class BrexEngine:
+    """A BREX rule set compiled for repeated evaluation.
+
+    Every context XPath is compiled once. Rules whose context starts with
+    ``//element`` are indexed by that element name, and ``//*[@attr ...]``
+    rules by ``@attr``; evaluation walks the tree once to collect the
+    element names present, probes each anchor attribute, and skips every
+    rule whose anchor does not occur. Rules that fail to compile are listed in
+    ``errors`` and never evaluated.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], version: str | None = None):
+        self.version = version or rule_set_version(rules)
+        self.rules: List[BrexRule] = []
+        self.errors: Dict[str, str] = {}
+        self.by_anchor: Dict[str, List[BrexRule]] = {}
+        self.unanchored: List[BrexRule] = []
+        for raw in rules:
+            rule = BrexRule.from_dict(raw)
+            if rule.mode == "manual" or not rule.context:
+                self.rules.append(rule)
+                continue
+            try:
+                rule.xpath = validation_artifacts.xpath(rule.context)
+            except etree.XPathError as exc:
+                self.errors[rule.id] = str(exc)
+                continue
+            self.rules.append(rule)
+            if rule.anchor is not None and rule.mode != "require":
+                self.by_anchor.setdefault(rule.anchor, []).append(rule)
+            else:
+                self.unanchored.append(rule)
+        # Attribute anchors are probed in C rather than by reading every
+        # element's attributes in Python.
+        self._attribute_probes = {
+            name: validation_artifacts.xpath(f"boolean(//{name})")
+            for name in self.by_anchor
+            if name.startswith("@")
+        }
+        self._lock = threading.Lock()
+        self._totals: Dict[str, List[float]] = {}
+
+    def evaluate(self, tree: Any) -> BrexReport:
+        """Evaluate the rule set against a parsed lxml element or tree."""
+        report = BrexReport()
+        present = {el.tag for el in tree.iter(etree.Element)}
+        present.update(name for name, probe in self._attribute_probes.items() if probe(tree))
+        candidates = list(self.unanchored)
+        for name in present & self.by_anchor.keys():
+            candidates.extend(self.by_anchor[name])
+        report.skipped = len(self.rules) - len(candidates)
+        for rule in candidates:
+            start = time.perf_counter()
+            try:
+                result = rule.xpath(tree)
+            except etree.XPathError as exc:
+                report.violations.append(self._violation(rule, f"Rule could not be evaluated: {exc}", 0))
+                continue
+            finally:
+                report.timings[rule.id] = time.perf_counter() - start
+            nodes = result if isinstance(result, list) else [result] if result else []
+            if rule.mode == "forbid" and nodes:
+                report.violations.append(self._violation(rule, rule.message, len(nodes)))
+            elif rule.mode == "require" and not nodes:
+                report.violations.append(self._violation(rule, rule.message, 0))
+            elif rule.mode == "enum":
+                bad = [str(n) for n in nodes if str(n) not in rule.allowed]
+                if bad:
+                    report.violations.append(
+                        self._violation(rule, f"{rule.message} (found {', '.join(sorted(set(bad)))})", len(bad))
+                    )
+        report.evaluated = len(candidates)
+        self._record(report.timings)
+        return report
+
+    @staticmethod
+    def _violation(rule: BrexRule, message: str, count: int) -> Dict[str, Any]:
+        return {
+            "rule_id": rule.id,
+            "rule_type": rule.rule_type,
+            "severity": "warning" if rule.rule_type == "narrative" else "error",
+            "message": message,
+            "count": count,
+        }
+
+    def _record(self, timings: Dict[str, float]) -> None:
+        with self._lock:
+            for rule_id, seconds in timings.items():
+                total = self._totals.setdefault(rule_id, [0, 0.0])
+                total[0] += 1
+                total[1] += seconds
+
+    def stats(self, slowest: int = 10) -> Dict[str, Any]:
+        """Rule counts and the rules with the highest cumulative evaluation time."""
+        with self._lock:
+            totals = sorted(self._totals.items(), key=lambda kv: kv[1][1], reverse=True)[:slowest]
+        return {
+            "version": self.version,
+            "rules": len(self.rules),
+            "indexed": sum(len(r) for r in self.by_anchor.values()),
+            "unanchored": len(self.unanchored),
+            "manual": sum(1 for r in self.rules if r.mode == "manual"),
+            "compile_errors": len(self.errors),
+            "slowest": [
+                {"rule_id": rule_id, "runs": runs, "total_ms": round(seconds * 1000, 3)}
+                for rule_id, (runs, seconds) in totals
+            ],
+        }
+
+
+_engines: "OrderedDict[str, BrexEngine]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def compile_brex_rules(rules: List[Dict[str, Any]]) -> BrexEngine:
+    """Return the compiled engine for ``rules``, shared by identical rule sets."""
+    version = rule_set_version(rules)
+    with _engines_lock:
+        engine = _engines.get(version)
+        if engine is not None:
+            _engines.move_to_end(version)
+            return engine
+    engine = BrexEngine(rules, version)
+    with _engines_lock:
+        _engines[version] = engine
+        while len(_engines) > 8:
+            _engines.popitem(last=False)
+    return engine
+
 
 def apply_brex_rules(xml_str: str, rules: List[Dict]) -> List[str]:
-    """Evaluate BREX XPath rules against XML and return violation messages.
+    """Evaluate BREX rules against XML and return violation messages.
 
-    Each rule should be a dictionary with ``id``, ``xpath`` and ``message`` keys.
-    The rule's XPath expression is expected to select nodes that violate the
-    constraint. If any nodes are returned, the corresponding message is added to
-    the result list prefixed with the rule id.
+    Rules are either S1000D rules with ``contextXPath``, ``ruleType`` and
+    ``constraint`` keys, or legacy rules with ``id``, ``xpath`` and
+    ``message`` keys whose expression selects nodes that violate the
+    constraint. Each violation is reported as ``"<rule id>: <message>"``.
+    The rule set is compiled once and reused across calls.
     """
     try:
         tree = etree.fromstring(xml_str.encode())
     except Exception:
         return ["Invalid XML provided"]
-
-    violations: List[str] = []
-    for rule in rules:
-        xpath = rule.get("xpath")
-        if not xpath:
-            continue
-        nodes = tree.xpath(xpath)
-        if nodes:
-            rule_id = rule.get("id", "BREX")
-            message = rule.get("message", "Rule violation")
-            violations.append(f"{rule_id}: {message}")
-    return violations
+    return compile_brex_rules(rules).evaluate(tree).messages()
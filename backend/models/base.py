@@ -87,4 +87,16 @@ class SettingsModel(BaseDocument):
         "learn_event_code": "00",
     }
     brex_rules: Dict[str, Any] = {}
-    templates: Dict[str, Any] = {}
\ No newline at end of file
+    templates: Dict[str, Any] = {}
+    # "separate" issues classify/extract/rewrite calls, "combined" asks the
+    # text provider for all three in one structured response
+    text_analysis_mode: str = "separate"
+    # Requests/tokens per minute and concurrent calls, keyed by
+    # "provider" or "provider:model" (the more specific key wins)
+    rate_limits: Dict[str, Dict[str, Any]] = {
+        "openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 8},
+        "anthropic": {"rpm": 50, "tpm": 40000, "max_concurrency": 4},
+    }
+    # Overrides for RetryPolicy fields (max_attempts, base_delay, max_delay,
+    # timeout, failure_threshold, reset_timeout)
+    retry_policy: Dict[str, Any] = {}
\ No newline at end of file
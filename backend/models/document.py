@@ -1,7 +1,7 @@
 """Document and Data Module models."""
 
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from .base import BaseDocument, DMTypeEnum, ValidationStatus, SecurityLevel
 import uuid
@@ -35,6 +35,7 @@ class ICN(BaseDocument):
     height: int = 0
     security_level: SecurityLevel = SecurityLevel.UNCLASSIFIED
     watermark_applied: bool = False
+    processing_status: str = "pending"
 
 
 class DataModule(BaseDocument):
@@ -54,6 +55,10 @@ class DataModule(BaseDocument):
     # Validation
     validation_status: ValidationStatus = ValidationStatus.RED
     validation_errors: List[str] = []
+    validation_diagnostics: List[Dict[str, Any]] = []
+    validation_fingerprint: Optional[str] = None  # Hash of the inputs of the last validation
+    validation_rules: Optional[str] = None  # rule versions of the last full validation
+    validation_ai_reviewed: bool = False
     xsd_valid: bool = False
     brex_valid: bool = False
     icn_valid: bool = False
@@ -1,11 +1,11 @@
 """Main FastAPI server for Aquila S1000D-AI system."""
 
+import asyncio
 import base64
 import io
 import json
 import logging
 import os
-import re
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -13,13 +13,20 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 
+from backend.ai_providers.inference_executor import inference_executor
+from backend.ai_providers.micro_batcher import batch_stats
 from backend.ai_providers.provider_factory import ProviderFactory
-from backend.brex_rules import apply_brex_rules
+from backend.ai_providers.provider_pool import provider_pool
+from backend.ai_providers.rate_limiter import rate_limiter
+from backend.ai_providers.resilience import resilience
+from backend.ai_providers.response_cache import response_cache
+from backend.brex_rules import BrexEngine, compile_brex_rules
 
 # Import models
 from backend.models.base import ProviderEnum, SecurityLevel, SettingsModel, ValidationStatus
@@ -34,6 +41,9 @@ from backend.models.document import (
 
 # Import services
 from backend.services.document_service import DocumentService
+from backend.services.uploads import UploadSizeLimitMiddleware, UploadTooLargeError, iter_upload_file
+from backend.services.validation import Diagnostic, ValidationResult, rules_version, validate_module
+from backend.services.validation_pool import validation_pool
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -71,6 +81,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Oversized uploads are refused before Starlette spools the multipart body
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/api/documents/upload"])
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -93,6 +106,15 @@ if S1000D_BREX_PATH.exists():
     with open(S1000D_BREX_PATH, "r") as f:
         ALL_BREX_RULES = json.load(f)
     S1000D_BREX_RULES = ALL_BREX_RULES.copy()
+BREX_ENGINE: BrexEngine = compile_brex_rules(S1000D_BREX_RULES)
+
+
+def set_active_brex_rules(rules: List[Dict[str, Any]]) -> None:
+    """Activate an XML BREX rule list and compile it for validation."""
+    global S1000D_BREX_RULES, BREX_ENGINE
+    S1000D_BREX_RULES = rules
+    BREX_ENGINE = compile_brex_rules(rules)
+
 
 # Initialize document service (settings loaded later)
 document_service = DocumentService(db=db)
@@ -104,7 +126,7 @@ system_settings: SettingsModel | None = None
 @app.on_event("startup")
 async def init_settings():
     """Ensure a settings document exists and cache it."""
-    global system_settings, S1000D_BREX_RULES
+    global system_settings
     doc = await db.settings.find_one({})
     if not doc:
         system_settings = SettingsModel(brex_rules=DEFAULT_BREX_RULES)
@@ -112,10 +134,24 @@ async def init_settings():
     else:
         system_settings = SettingsModel(**doc)
     document_service.settings = system_settings
+    rate_limiter.configure(system_settings.rate_limits)
+    resilience.configure(system_settings.retry_policy)
 
     # Allow overriding the XML BREX rules from settings
     if isinstance(system_settings.brex_rules, list):
-        S1000D_BREX_RULES = system_settings.brex_rules
+        set_active_brex_rules(system_settings.brex_rules)
+
+
+@app.on_event("startup")
+async def warm_up_providers():
+    """Construct the selected AI providers before the first request arrives."""
+    await asyncio.to_thread(ProviderFactory.warm_up)
+
+
+@app.on_event("startup")
+async def start_retrieval_backfill():
+    """Index documents uploaded before the retrieval index existed, in the background."""
+    app.state.retrieval_backfill = asyncio.create_task(document_service.backfill_retrieval_index())
 
 
 # Create API router (no authentication)
@@ -126,131 +162,109 @@ def validate_module_dict(
     module: Dict[str, Any], rules: Dict[str, Any]
 ) -> Tuple[ValidationStatus, List[str], bool, bool]:
     """Validate a data module dictionary against BREX and XSD rules."""
-    errors: List[str] = []
-    status = ValidationStatus.GREEN
-
-    title_rules = rules.get("title", {})
-    title = module.get("title", "")
-    if title_rules.get("required") and not title:
-        errors.append("Title is required")
-        status = ValidationStatus.RED
-    if (
-        title
-        and title_rules.get("maxLength")
-        and len(title) > int(title_rules["maxLength"])
-    ):
-        errors.append("Title exceeds maximum length")
-        status = ValidationStatus.RED
-    pattern = title_rules.get("pattern")
-    if title and pattern and not re.match(pattern, title):
-        errors.append("Title does not match pattern")
-        status = ValidationStatus.RED
-
-    dmc_rules = rules.get("dmc", {})
-    dmc = module.get("dmc", "")
-    if dmc_rules.get("required") and not dmc:
-        errors.append("DMC is required")
-        status = ValidationStatus.RED
-    dmc_pattern = dmc_rules.get("pattern")
-    if dmc and dmc_pattern and not re.match(dmc_pattern, dmc):
-        errors.append("DMC does not match pattern")
-        status = ValidationStatus.RED
-
-    content_rules = rules.get("content", {})
-    content = module.get("content", "")
-    if content_rules.get("required") and not content:
-        errors.append("Content is required")
-        status = ValidationStatus.RED
-    if (
-        content
-        and content_rules.get("minLength")
-        and len(content) < int(content_rules["minLength"])
-    ):
-        errors.append("Content below minimum length")
-        status = ValidationStatus.RED
-    if (
-        content
-        and content_rules.get("maxLength")
-        and len(content) > int(content_rules["maxLength"])
-    ):
-        errors.append("Content exceeds maximum length")
-        status = ValidationStatus.RED
-
-    ste_rules = rules.get("ste", {})
-    ste_score = float(module.get("ste_score", 0))
-    if ste_score < float(ste_rules.get("minScore", 0)):
-        status = ValidationStatus.RED
-    elif (
-        ste_score < float(ste_rules.get("warnBelowScore", 0))
-        and status == ValidationStatus.GREEN
-    ):
-        status = ValidationStatus.AMBER
-
-    security_rules = rules.get("security", {})
-    sec_level = module.get("security_level")
-    allowed = security_rules.get("allowedClassifications")
-    if allowed and sec_level and sec_level not in allowed:
-        errors.append("Security classification not allowed")
-        status = ValidationStatus.RED
-
-    brex_valid = len(errors) == 0
-
-    xsd_valid = False
-    try:
-        dm_obj = DataModule(**module)
-        xml_str = document_service.render_data_module_xml(dm_obj)
-        xsd_valid = document_service.validate_xml(xml_str)
-        if not xsd_valid:
-            errors.append("XSD validation failed")
-            status = ValidationStatus.RED
-
-        # Apply XML BREX rules
-        violations = apply_brex_rules(xml_str, S1000D_BREX_RULES)
-        if violations:
-            errors.extend(violations)
-            status = ValidationStatus.RED
-            brex_valid = False
-    except Exception as exc:  # pragma: no cover - best effort
-        errors.append(f"XSD validation error: {exc}")
-        status = ValidationStatus.RED
-        xsd_valid = False
-
-    return status, errors, brex_valid, xsd_valid
+    result = validate_module(module, rules, BREX_ENGINE)
+    return result.status, result.errors(), result.brex_valid, result.xsd_valid
+
+
+async def reference_diagnostics(
+    modules: List[Dict[str, Any]], results: List[ValidationResult], rules: Dict[str, Any]
+) -> None:
+    """Add broken DM and ICN reference errors to ``results``.
+
+    The references of all ``modules`` are looked up with one query per
+    collection.
+    """
+    references = rules.get("references", {})
+    if document_service.db is None or references.get("allowBrokenRefs", False):
+        return
+    checks = [
+        ("validateDMRefs", "dm_refs", document_service.db.data_modules, "dmc", "references.dm", "data module"),
+        ("validateICNRefs", "icn_refs", document_service.db.icns, "lcn", "references.icn", "ICN"),
+    ]
+    for flag, field, collection, key, rule_id, label in checks:
+        if not references.get(flag):
+            continue
+        wanted = {ref for module in modules for ref in module.get(field, [])}
+        if not wanted:
+            continue
+        found = {
+            doc[key]
+            async for doc in collection.find({key: {"$in": list(wanted)}}, {key: 1, "_id": 0})
+        }
+        for module, result in zip(modules, results):
+            for ref in module.get(field, []):
+                if ref not in found:
+                    result.add(Diagnostic(rule_id, "reference", "error", f"Broken {label} reference: {ref}"))
+
+
+async def validate_module_full(
+    module: Dict[str, Any], rules: Dict[str, Any], reuse: bool = False
+) -> ValidationResult:
+    """Run the structural checks, then reference lookups and the AI review.
+
+    With ``reuse``, an unchanged module keeps its stored result and is only
+    sent for AI review if no earlier run reviewed it.
+    """
+    result = validate_module(module, rules, BREX_ENGINE, reuse=reuse)
+    await reference_diagnostics([module], [result], rules)
+
+    if not result.ai_reviewed:
+        review = await document_service.review_module_ai(module.get("content", ""))
+        for issue in review.get("issues", []):
+            result.add(Diagnostic("ai.review", "ai", "warning", f"AI: {issue}"))
+        result.ai_reviewed = True
+    return result
+
+
+def validation_update(result: ValidationResult) -> Dict[str, Any]:
+    """The ``$set`` document recording ``result`` on a data module."""
+    return {
+        "validation_status": result.status.value,
+        "validation_errors": result.errors(),
+        "validation_diagnostics": result.to_dict()["diagnostics"],
+        "xsd_valid": result.xsd_valid,
+        "brex_valid": result.status != ValidationStatus.RED and result.brex_valid,
+        "validation_fingerprint": result.fingerprint,
+        "validation_rules": result.rules_version,
+        "validation_ai_reviewed": result.ai_reviewed,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def validation_changed(module: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """Whether ``update`` records anything not already stored on ``module``."""
+    return any(module.get(key) != value for key, value in update.items() if key != "updated_at")
+
+
+async def invalidate_validations() -> int:
+    """Clear the fingerprints of modules validated under other rules.
+
+    Called when the field rules or the XML BREX rule set change, so the
+    affected modules are validated in full on their next run.
+    """
+    current = rules_version(await load_field_rules(), BREX_ENGINE)
+    result = await db.data_modules.update_many(
+        {"validation_rules": {"$exists": True, "$nin": [None, current]}},
+        {"$set": {"validation_fingerprint": None, "validation_rules": None}},
+    )
+    return result.modified_count
+
+
+async def load_field_rules() -> Dict[str, Any]:
+    """The settings BREX rules for module fields, or the defaults."""
+    settings_doc = await db.settings.find_one({})
+    if settings_doc and "brex_rules" in settings_doc:
+        return SettingsModel(**settings_doc).brex_rules
+    return DEFAULT_BREX_RULES
 
 
 async def async_validate_module_dict(
     module: Dict[str, Any], rules: Dict[str, Any]
 ) -> Tuple[ValidationStatus, List[str], bool, bool]:
     """Async wrapper that also checks references and performs AI review."""
-    status, errors, brex_valid, xsd_valid = validate_module_dict(module, rules)
-
-    if document_service.db is not None and rules.get("references", {}).get(
-        "validateDMRefs"
-    ):
-        for ref in module.get("dm_refs", []):
-            exists = await document_service.db.data_modules.find_one({"dmc": ref})
-            if not exists and not rules["references"].get("allowBrokenRefs", False):
-                errors.append(f"Broken data module reference: {ref}")
-                status = ValidationStatus.RED
-
-    if document_service.db is not None and rules.get("references", {}).get(
-        "validateICNRefs"
-    ):
-        for ref in module.get("icn_refs", []):
-            exists = await document_service.db.icns.find_one({"lcn": ref})
-            if not exists and not rules["references"].get("allowBrokenRefs", False):
-                errors.append(f"Broken ICN reference: {ref}")
-                status = ValidationStatus.RED
-
-    review = await document_service.review_module_ai(module.get("content", ""))
-    issues = review.get("issues", [])
-    if issues:
-        errors.extend([f"AI: {i}" for i in issues])
-        if status == ValidationStatus.GREEN:
-            status = ValidationStatus.AMBER
-
-    brex_valid = status != ValidationStatus.RED and brex_valid
-    return status, errors, brex_valid, xsd_valid
+    result = await validate_module_full(module, rules)
+    brex_valid = result.status != ValidationStatus.RED and result.brex_valid
+    return result.status, result.errors(), brex_valid, result.xsd_valid
 
 
 # API Endpoints
@@ -270,6 +284,19 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "providers": provider_config,
+        "provider_pool": provider_pool.stats(),
+        "response_cache": response_cache.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "resilience": resilience.stats(),
+        "local_inference": {**inference_executor.stats(), "batches": batch_stats()},
+        "blob_store": await document_service.blob_store.stats(),
+        "text_store": document_service.text_store.stats(),
+        "extraction": document_service.extraction.stats(),
+        "image_index": await asyncio.to_thread(document_service.image_index.stats),
+        "validation_artifacts": document_service.artifacts.stats(),
+        "brex": BREX_ENGINE.stats(),
+        "validation_pool": validation_pool.stats(),
+        "retrieval_index": await asyncio.to_thread(document_service.retrieval_index.stats),
     }
 
 
@@ -298,13 +325,13 @@ async def get_xml_brex_rules():
 @api_router.post("/brex-xml-rules")
 async def set_xml_brex_rules(payload: Dict[str, Any]):
     """Set the active XML BREX rules by id list."""
-    global S1000D_BREX_RULES
     ids = payload.get("enabled_ids") or []
     if not ids:
-        S1000D_BREX_RULES = ALL_BREX_RULES.copy()
+        set_active_brex_rules(ALL_BREX_RULES.copy())
     else:
-        S1000D_BREX_RULES = [r for r in ALL_BREX_RULES if r.get("id") in ids]
-    return {"count": len(S1000D_BREX_RULES)}
+        set_active_brex_rules([r for r in ALL_BREX_RULES if r.get("id") in ids])
+    invalidated = await invalidate_validations()
+    return {"count": len(S1000D_BREX_RULES), "version": BREX_ENGINE.version, "invalidated": invalidated}
 
 
 @api_router.post("/settings")
@@ -335,9 +362,17 @@ async def update_settings(settings: Dict[str, Any]):
         os.environ["TEXT_MODEL"] = system_settings.text_model
     if "vision_model" in settings:
         os.environ["VISION_MODEL"] = system_settings.vision_model
+    if {"text_provider", "vision_provider", "text_model", "vision_model"} & settings.keys():
+        await ProviderFactory.invalidate()
+    if "rate_limits" in settings:
+        rate_limiter.configure(system_settings.rate_limits)
+    if "retry_policy" in settings:
+        resilience.configure(system_settings.retry_policy)
 
     # Update document service settings
     document_service.settings = system_settings
+    if "brex_rules" in settings:
+        await invalidate_validations()
 
     return {
         "message": "Settings updated successfully",
@@ -393,6 +428,7 @@ async def set_providers(
         await db.settings.update_one(
             {"id": system_settings.id}, {"$set": system_settings.dict()}
         )
+        await ProviderFactory.invalidate()
 
         return {
             "message": "Providers updated successfully",
@@ -408,17 +444,15 @@ async def set_providers(
 # Document upload endpoints
 @api_router.post("/documents/upload")
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     security_level: SecurityLevel = Form(SecurityLevel.UNCLASSIFIED),
 ):
     """Upload a document for processing."""
     try:
-        # Read file data
-        file_data = await file.read()
-
-        # Upload document
-        document = await document_service.upload_document(
-            file_data=file_data,
+        # Stream the file to disk without holding it in memory
+        document = await document_service.upload_document_stream(
+            iter_upload_file(file),
             filename=file.filename,
             mime_type=file.content_type,
             security_level=security_level,
@@ -427,12 +461,17 @@ async def upload_document(
         # Store in database
         await db.documents.insert_one(document.dict())
 
+        # Make the text available as context for other documents
+        background_tasks.add_task(document_service.index_document, document)
+
         return {
             "message": "Document uploaded successfully",
             "document_id": document.id,
             "filename": document.filename,
             "size": document.file_size,
         }
+    except UploadTooLargeError as e:
+        raise HTTPException(413, str(e))
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(500, f"Error uploading document: {str(e)}")
@@ -462,9 +501,36 @@ async def get_document(document_id: str):
         raise HTTPException(500, f"Error fetching document: {str(e)}")
 
 
+@api_router.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Delete a document and release its stored file."""
+    try:
+        document = await db.documents.find_one_and_delete({"id": document_id})
+        if not document:
+            raise HTTPException(404, "Document not found")
+        await document_service.delete_document(UploadedDocument(**document))
+        return {"message": "Document deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting document: {str(e)}")
+        raise HTTPException(500, f"Error deleting document: {str(e)}")
+
+
+@api_router.post("/blobs/gc")
+async def collect_blob_garbage(grace_seconds: float | None = None):
+    """Remove stored files that are no longer referenced."""
+    removed = await document_service.blob_store.collect_garbage(grace_seconds)
+    return {"removed": len(removed), "blobs": removed}
+
+
 @api_router.post("/documents/{document_id}/process")
-async def process_document(document_id: str):
-    """Process a document to create data modules."""
+async def process_document(document_id: str, force: bool = False):
+    """Process a document to create data modules.
+
+    A completed run for the same content, providers, models and pipeline
+    version is reused unless ``force`` is set.
+    """
     try:
         # Get document
         doc_data = await db.documents.find_one({"id": document_id})
@@ -472,47 +538,58 @@ async def process_document(document_id: str):
             raise HTTPException(404, "Document not found")
 
         document = UploadedDocument(**doc_data)
+        await document_service.load_settings()
+        run_key = document_service.processing_key(document)
+
+        if not force:
+            previous = await document_service.find_completed_run(run_key, document)
+            if previous is not None:
+                modules, icns = previous
+                await _mark_processed(document_id)
+                return {
+                    "message": "Document already processed; reused previous results",
+                    "document_id": document_id,
+                    "data_modules": len(modules),
+                    "images": len(icns),
+                    "modules": [dm.dict() for dm in modules],
+                    "reused": True,
+                }
 
-        # Extract text content
-        text_content = await document_service.extract_text_from_document(document)
+        async def run() -> Tuple[List[DataModule], List[ICN]]:
 
-        # Extract images
-        images = await document_service.extract_images_from_document(document)
+            async def process_text() -> List[DataModule]:
+                text_content = await document_service.extract_text_from_document(document)
+                return await document_service.process_document_with_ai(document, text_content)
 
-        # Process images with AI
-        processed_images = []
-        for image in images:
-            processed_image = await document_service.process_image_with_ai(image)
-            processed_images.append(processed_image)
-            # Store ICN in database
-            await db.icns.insert_one(processed_image.dict())
+            # Pages go to the vision stage as they are rendered, alongside the text
+            processed_images, data_modules = await asyncio.gather(
+                document_service.process_images_with_ai(
+                    document_service.iter_document_images(document),
+                    on_processed=document_service.store_icn,
+                ),
+                process_text(),
+            )
 
-        # Process document with AI
-        data_modules = await document_service.process_document_with_ai(
-            document, text_content
-        )
+            # Store data modules in database
+            stored_modules = []
+            for dm in data_modules:
+                entry = {"action": "create", "dmc": dm.dmc, "source_file": document.filename, "user": "system", "author": "ai"}
+                dm.audit_log.append(entry)
+                await db.data_modules.insert_one(dm.dict())
+                stored_modules.append(dm)
+                await document_service.audit_service.log(entry)
 
-        # Store data modules in database
-        stored_modules = []
-        for dm in data_modules:
-            entry = {"action": "create", "dmc": dm.dmc, "source_file": document.filename, "user": "system", "author": "ai"}
-            dm.audit_log.append(entry)
-            await db.data_modules.insert_one(dm.dict())
-            stored_modules.append(dm)
-            await document_service.audit_service.log(entry)
+            await document_service.refresh_cross_references()
+            await document_service.record_run(run_key, document, stored_modules, processed_images)
+            return stored_modules, processed_images
 
-        await document_service.refresh_cross_references()
+        if force:
+            stored_modules, processed_images = await run()
+        else:
+            stored_modules, processed_images = await document_service.run_once(run_key, run)
 
         # Update document status
-        await db.documents.update_one(
-            {"id": document_id},
-            {
-                "$set": {
-                    "processing_status": "completed",
-                    "updated_at": datetime.utcnow(),
-                }
-            },
-        )
+        await _mark_processed(document_id)
 
         return {
             "message": "Document processed successfully",
@@ -520,14 +597,29 @@ async def process_document(document_id: str):
             "data_modules": len(stored_modules),
             "images": len(processed_images),
             "modules": [dm.dict() for dm in stored_modules],
+            "reused": False,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         raise HTTPException(500, f"Error processing document: {str(e)}")
 
 
+async def _mark_processed(document_id: str) -> None:
+    await db.documents.update_one(
+        {"id": document_id},
+        {
+            "$set": {
+                "processing_status": "completed",
+                "updated_at": datetime.utcnow(),
+            }
+        },
+    )
+
+
 @api_router.get("/documents/{document_id}/process-stream")
-async def process_document_stream(document_id: str):
+async def process_document_stream(document_id: str, force: bool = False):
     """Stream data modules one by one using Server-Sent Events."""
     try:
         doc_data = await db.documents.find_one({"id": document_id})
@@ -535,13 +627,50 @@ async def process_document_stream(document_id: str):
             raise HTTPException(404, "Document not found")
 
         document = UploadedDocument(**doc_data)
-        text_content = await document_service.extract_text_from_document(document)
-        images = await document_service.extract_images_from_document(document)
-        for image in images:
-            processed_image = await document_service.process_image_with_ai(image)
-            await db.icns.insert_one(processed_image.dict())
+        await document_service.load_settings()
+        run_key = document_service.processing_key(document)
+        previous = None if force else await document_service.find_completed_run(run_key, document)
+        if previous is not None:
+
+            async def replay_generator():
+                for dm in previous[0]:
+                    yield f"event: module\ndata: {dm.json()}\n\n"
+                await _mark_processed(document_id)
+                yield "event: end\ndata: reused\n\n"
+
+            return StreamingResponse(replay_generator(), media_type="text/event-stream")
+
 
         async def event_generator():
+            # Extraction progress is reported page by page before any module
+            progress: asyncio.Queue = asyncio.Queue()
+            extraction = asyncio.ensure_future(
+                document_service.extract_text_from_document(document, on_progress=progress.put_nowait)
+            )
+            # Images are rendered and processed while the text modules stream
+            images_task = asyncio.ensure_future(
+                document_service.process_images_with_ai(
+                    document_service.iter_document_images(document),
+                    on_processed=document_service.store_icn,
+                )
+            )
+            getter = None
+            try:
+                while not extraction.done() or not progress.empty():
+                    getter = asyncio.ensure_future(progress.get())
+                    done, _ = await asyncio.wait({getter, extraction}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter in done:
+                        yield f"event: progress\ndata: {json.dumps(getter.result())}\n\n"
+                    else:
+                        getter.cancel()
+            except BaseException:
+                for task in (getter, extraction, images_task):
+                    if task is not None:
+                        task.cancel()
+                raise
+            text_content = extraction.result()
+
+            modules: List[DataModule] = []
             async for dm in document_service.process_document_streaming(document, text_content):
                 entry = {
                     "action": "create",
@@ -553,13 +682,13 @@ async def process_document_stream(document_id: str):
                 dm.audit_log.append(entry)
                 await db.data_modules.insert_one(dm.dict())
                 await document_service.audit_service.log(entry)
+                modules.append(dm)
                 yield f"event: module\ndata: {dm.json()}\n\n"
 
+            processed_images = await images_task
             await document_service.refresh_cross_references()
-            await db.documents.update_one(
-                {"id": document_id},
-                {"$set": {"processing_status": "completed", "updated_at": datetime.utcnow()}},
-            )
+            await document_service.record_run(run_key, document, modules, processed_images)
+            await _mark_processed(document_id)
             yield "event: end\ndata: done\n\n"
 
         return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -659,6 +788,20 @@ async def get_icns():
         raise HTTPException(500, f"Error fetching ICNs: {str(e)}")
 
 
+@api_router.get("/icns/duplicates")
+async def get_icn_duplicates(min_size: int = 2):
+    """List clusters of perceptually duplicate ICNs.
+
+    Each cluster names the ICN whose vision results were reused and its
+    members with their Hamming distance to it.
+    """
+    try:
+        return await document_service.image_index.clusters(max(2, min_size))
+    except Exception as e:
+        logger.error(f"Error fetching ICN duplicates: {str(e)}")
+        raise HTTPException(500, f"Error fetching ICN duplicates: {str(e)}")
+
+
 @api_router.get("/icns/{icn_id}")
 async def get_icn(icn_id: str):
     """Get a specific ICN."""
@@ -721,51 +864,121 @@ async def update_icn(icn_id: str, icn_data: Dict[str, Any]):
 
 # Validation endpoints
 @api_router.post("/validate/{dmc}")
-async def validate_data_module(dmc: str):
-    """Validate a data module using BREX rules."""
+async def validate_data_module(dmc: str, force: bool = False):
+    """Validate a data module using BREX rules.
+
+    A module unchanged since its last validation under the current rules
+    returns the stored result unless ``force`` is set.
+    """
     try:
         module = await db.data_modules.find_one({"dmc": dmc})
         if not module:
             raise HTTPException(404, "Data module not found")
 
-        settings_doc = await db.settings.find_one({})
-        if settings_doc and "brex_rules" in settings_doc:
-            rules = SettingsModel(**settings_doc).brex_rules
-        else:
-            rules = DEFAULT_BREX_RULES
-        (
-            validation_status,
-            validation_errors,
-            brex_valid,
-            xml_valid,
-        ) = await async_validate_module_dict(module, rules)
+        rules = await load_field_rules()
+        result = await validate_module_full(module, rules, reuse=not force)
+        update = validation_update(result)
 
         # Update module validation status
-        await db.data_modules.update_one(
-            {"dmc": dmc},
-            {
-                "$set": {
-                    "validation_status": validation_status.value,
-                    "validation_errors": validation_errors,
-                    "xsd_valid": xml_valid,
-                    "brex_valid": brex_valid,
-                    "updated_at": datetime.utcnow(),
-                }
-            },
-        )
+        if validation_changed(module, update):
+            await db.data_modules.update_one({"dmc": dmc}, {"$set": update})
 
         return {
             "dmc": dmc,
-            "status": validation_status.value,
-            "errors": validation_errors,
-            "xsd_valid": xml_valid,
-            "brex_valid": brex_valid,
+            "status": update["validation_status"],
+            "errors": update["validation_errors"],
+            "diagnostics": update["validation_diagnostics"],
+            "xsd_valid": update["xsd_valid"],
+            "brex_valid": update["brex_valid"],
+            "cached": result.cached,
         }
     except Exception as e:
         logger.error(f"Error validating data module: {str(e)}")
         raise HTTPException(500, f"Error validating data module: {str(e)}")
 
 
+@api_router.post("/validate")
+async def validate_data_modules(
+    pm_code: Optional[str] = None,
+    status: Optional[ValidationStatus] = None,
+    source_document_id: Optional[str] = None,
+    force: bool = False,
+):
+    """Validate every matching data module, streaming results as Server-Sent Events.
+
+    Modules are selected by publication module, validation status and
+    source document; with no filter the whole project is validated. XSD
+    and BREX checks run in worker processes and references are checked per
+    batch; the AI review is left to the single-module endpoint. Events are
+    ``results`` (one per batch), ``progress`` and a final ``end`` summary.
+
+    Modules unchanged since their last validation under the current rules
+    keep their stored results and are only written back when a reference
+    check changes the outcome; ``force`` validates everything again.
+    """
+    query: Dict[str, Any] = {}
+    if pm_code is not None:
+        pm = await db.publication_modules.find_one({"pm_code": pm_code})
+        if not pm:
+            raise HTTPException(404, "Publication module not found")
+        query["dmc"] = {"$in": pm.get("dm_list", [])}
+    if status is not None:
+        query["validation_status"] = status.value
+    if source_document_id is not None:
+        query["source_document_id"] = source_document_id
+
+    rules = await load_field_rules()
+    brex_rules = S1000D_BREX_RULES
+    total = await db.data_modules.count_documents(query)
+
+    async def event_generator():
+        counts = {s.value: 0 for s in ValidationStatus}
+        validated = unchanged = 0
+        started = datetime.utcnow()
+        cursor = db.data_modules.find(query, batch_size=validation_pool.batch_size)
+        try:
+            async for modules, results in validation_pool.validate(
+                cursor, rules, brex_rules, reuse=not force
+            ):
+                await reference_diagnostics(modules, results, rules)
+                updates = [validation_update(result) for result in results]
+                writes = [
+                    UpdateOne({"dmc": m["dmc"]}, {"$set": u})
+                    for m, u in zip(modules, updates)
+                    if validation_changed(m, u)
+                ]
+                if writes:
+                    await db.data_modules.bulk_write(writes, ordered=False)
+                batch = []
+                for module, update, result in zip(modules, updates, results):
+                    counts[update["validation_status"]] += 1
+                    unchanged += result.cached
+                    batch.append(
+                        {
+                            "dmc": module["dmc"],
+                            "status": update["validation_status"],
+                            "errors": update["validation_errors"],
+                            "xsd_valid": update["xsd_valid"],
+                            "brex_valid": update["brex_valid"],
+                            "cached": result.cached,
+                        }
+                    )
+                validated += len(batch)
+                yield f"event: results\ndata: {json.dumps(batch)}\n\n"
+                yield f"event: progress\ndata: {json.dumps({'validated': validated, 'total': total})}\n\n"
+        finally:
+            await cursor.close()
+        summary = {
+            "validated": validated,
+            "unchanged": unchanged,
+            "counts": counts,
+            "seconds": (datetime.utcnow() - started).total_seconds(),
+        }
+        yield f"event: end\ndata: {json.dumps(summary)}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 @api_router.post("/fix-module/{dmc}")
 async def fix_data_module(dmc: str, method: str = "ai"):
     """Attempt correction of a data module."""
@@ -872,17 +1085,22 @@ async def test_text_provider(text: str, task_type: str = "classify"):
     try:
         from backend.ai_providers.base import TextProcessingRequest
 
-        text_provider = ProviderFactory.create_text_provider()
+        text_provider = await ProviderFactory.acquire_text_provider()
         request = TextProcessingRequest(text=text, task_type=task_type)
 
-        if task_type == "classify":
-            response = await text_provider.classify_document(request)
-        elif task_type == "extract":
-            response = await text_provider.extract_structured_data(request)
-        elif task_type == "rewrite":
-            response = await text_provider.rewrite_to_ste(request)
-        else:
-            raise HTTPException(400, "Invalid task type")
+        try:
+            if task_type == "classify":
+                response = await text_provider.classify_document(request)
+            elif task_type == "extract":
+                response = await text_provider.extract_structured_data(request)
+            elif task_type == "rewrite":
+                response = await text_provider.rewrite_to_ste(request)
+            elif task_type == "combined":
+                response = await text_provider.analyze_document(request)
+            else:
+                raise HTTPException(400, "Invalid task type")
+        finally:
+            await ProviderFactory.release_provider(text_provider)
 
         return response.dict()
     except Exception as e:
@@ -896,17 +1114,22 @@ async def test_vision_provider(image_data: str, task_type: str = "caption"):
     try:
         from backend.ai_providers.base import VisionProcessingRequest
 
-        vision_provider = ProviderFactory.create_vision_provider()
+        vision_provider = await ProviderFactory.acquire_vision_provider()
         request = VisionProcessingRequest(image_data=image_data, task_type=task_type)
 
-        if task_type == "caption":
-            response = await vision_provider.generate_caption(request)
-        elif task_type == "objects":
-            response = await vision_provider.detect_objects(request)
-        elif task_type == "hotspots":
-            response = await vision_provider.generate_hotspots(request)
-        else:
-            raise HTTPException(400, "Invalid task type")
+        try:
+            if task_type == "caption":
+                response = await vision_provider.generate_caption(request)
+            elif task_type == "objects":
+                response = await vision_provider.detect_objects(request)
+            elif task_type == "hotspots":
+                response = await vision_provider.generate_hotspots(request)
+            elif task_type == "analyze":
+                response = await vision_provider.analyze_image(image_data)
+            else:
+                raise HTTPException(400, "Invalid task type")
+        finally:
+            await ProviderFactory.release_provider(vision_provider)
 
         return response.dict()
     except Exception as e:
@@ -925,6 +1148,20 @@ async def shutdown_db_client():
     client.close()
 
 
+@app.on_event("shutdown")
+async def shutdown_providers():
+    """Close pooled AI provider clients on shutdown."""
+    await ProviderFactory.shutdown()
+    backfill = getattr(app.state, "retrieval_backfill", None)
+    if backfill is not None:
+        backfill.cancel()
+    document_service.blob_store.close()
+    document_service.retrieval_index.close()
+    document_service.image_index.close()
+    document_service.extraction.shutdown()
+    validation_pool.shutdown()
+
+
 if __name__ == "__main__":
     import uvicorn
 
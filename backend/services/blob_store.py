@@ -0,0 +1,452 @@
+"""Content-addressed, reference-counted storage for uploads and rendered images."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def shard_path(root: Path, sha256_hash: str) -> Path:
+    """Return ``root/ab/cd/<hash>`` for a SHA-256 hex digest."""
+    return root / sha256_hash[:2] / sha256_hash[2:4] / sha256_hash
+
+
+class LocalBlobBackend:
+    """Blobs stored as files in a sharded directory tree."""
+
+    name = "local"
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256_hash: str) -> Path:
+        return shard_path(self.root, sha256_hash)
+
+    async def has(self, sha256_hash: str) -> bool:
+        return self.path(sha256_hash).exists()
+
+    async def write(self, sha256_hash: str, src: Path) -> None:
+        """Move ``src`` into place, or discard it if the blob already exists."""
+        target = self.path(sha256_hash)
+        if target.exists():
+            src.unlink(missing_ok=True)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(shutil.move, str(src), str(target))
+
+    async def materialize(self, sha256_hash: str) -> Path:
+        return self.path(sha256_hash)
+
+    async def remove(self, sha256_hash: str) -> None:
+        self.path(sha256_hash).unlink(missing_ok=True)
+
+
+class GridFSBlobBackend:
+    """Blobs stored in a MongoDB GridFS bucket.
+
+    Readers such as PyPDF2 need a file path, so blobs are materialized into a
+    local sharded cache on first access.
+    """
+
+    name = "gridfs"
+
+    def __init__(self, db: Any, cache_root: str | Path, bucket_name: str = "blobs"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self.cache = LocalBlobBackend(cache_root)
+
+    async def has(self, sha256_hash: str) -> bool:
+        return await self.files.find_one({"filename": sha256_hash}, {"_id": 1}) is not None
+
+    async def write(self, sha256_hash: str, src: Path) -> None:
+        if not await self.has(sha256_hash):
+            with open(src, "rb") as f:
+                await self.bucket.upload_from_stream(sha256_hash, f)
+        await self.cache.write(sha256_hash, src)
+
+    async def materialize(self, sha256_hash: str) -> Path:
+        path = self.cache.path(sha256_hash)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(path.name + ".part")
+            with open(partial, "wb") as f:
+                await self.bucket.download_to_stream_by_name(sha256_hash, f)
+            os.replace(partial, path)
+        return path
+
+    async def remove(self, sha256_hash: str) -> None:
+        async for doc in self.files.find({"filename": sha256_hash}, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+        await self.cache.remove(sha256_hash)
+
+
+class SQLiteBlobIndex:
+    """Blob metadata, reference counts and derived artifacts in SQLite."""
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS derived (
+                    source TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (source, kind)
+                );
+                """
+            )
+        return self._conn
+
+    def _run(self, func, *args):
+        def locked():
+            with self._lock:
+                conn = self._connect()
+                result = func(conn, *args)
+                conn.commit()
+                return result
+
+        return asyncio.to_thread(locked)
+
+    async def register(self, sha256_hash: str, size: int, mime_type: str) -> bool:
+        def op(conn):
+            now = time.time()
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, 0, ?, ?)",
+                (sha256_hash, size, mime_type, now, now),
+            )
+            return cur.rowcount == 1
+
+        return await self._run(op)
+
+    async def add_ref(self, sha256_hash: str, delta: int) -> int:
+        def op(conn):
+            conn.execute(
+                "UPDATE blobs SET refcount = MAX(0, refcount + ?), updated_at = ? WHERE sha256 = ?",
+                (delta, time.time(), sha256_hash),
+            )
+            row = conn.execute(
+                "SELECT refcount FROM blobs WHERE sha256 = ?", (sha256_hash,)
+            ).fetchone()
+            return row[0] if row else 0
+
+        return await self._run(op)
+
+    async def get(self, sha256_hash: str) -> Dict[str, Any] | None:
+        def op(conn):
+            row = conn.execute(
+                "SELECT sha256, size, mime_type, refcount, created_at, updated_at "
+                "FROM blobs WHERE sha256 = ?",
+                (sha256_hash,),
+            ).fetchone()
+            keys = ("sha256", "size", "mime_type", "refcount", "created_at", "updated_at")
+            return dict(zip(keys, row)) if row else None
+
+        return await self._run(op)
+
+    async def unreferenced(self, before: float) -> List[str]:
+        def op(conn):
+            rows = conn.execute(
+                "SELECT sha256 FROM blobs WHERE refcount <= 0 AND updated_at < ?", (before,)
+            ).fetchall()
+            return [r[0] for r in rows]
+
+        return await self._run(op)
+
+    async def forget(self, sha256_hash: str) -> None:
+        await self._run(lambda conn: conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256_hash,)))
+
+    async def get_derived(self, source: str, kind: str) -> Dict[str, Any] | None:
+        def op(conn):
+            row = conn.execute(
+                "SELECT data FROM derived WHERE source = ? AND kind = ?", (source, kind)
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+
+        return await self._run(op)
+
+    async def set_derived(self, source: str, kind: str, data: Dict[str, Any]) -> Dict[str, Any] | None:
+        """Store ``data`` and return the entry it replaced, if any."""
+
+        def op(conn):
+            row = conn.execute(
+                "SELECT data FROM derived WHERE source = ? AND kind = ?", (source, kind)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO derived VALUES (?, ?, ?)",
+                (source, kind, json.dumps(data, sort_keys=True)),
+            )
+            return json.loads(row[0]) if row else None
+
+        return await self._run(op)
+
+    async def pop_derived(self, source: str) -> List[Dict[str, Any]]:
+        def op(conn):
+            rows = conn.execute("SELECT data FROM derived WHERE source = ?", (source,)).fetchall()
+            conn.execute("DELETE FROM derived WHERE source = ?", (source,))
+            return [json.loads(r[0]) for r in rows]
+
+        return await self._run(op)
+
+    async def counts(self) -> Dict[str, Any]:
+        def op(conn):
+            blobs, size, unreferenced = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(CASE WHEN refcount <= 0 THEN 1 ELSE 0 END), 0) FROM blobs"
+            ).fetchone()
+            return {"blobs": blobs, "bytes": size, "unreferenced": unreferenced}
+
+        return await self._run(op)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class MongoBlobIndex:
+    """Blob metadata, reference counts and derived artifacts in MongoDB."""
+
+    def __init__(self, db: Any):
+        self.blobs = db.blobs
+        self.derived = db.blob_derived
+
+    async def register(self, sha256_hash: str, size: int, mime_type: str) -> bool:
+        now = time.time()
+        result = await self.blobs.update_one(
+            {"_id": sha256_hash},
+            {
+                "$setOnInsert": {
+                    "size": size,
+                    "mime_type": mime_type,
+                    "refcount": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            },
+            upsert=True,
+        )
+        return result.upserted_id is not None
+
+    async def add_ref(self, sha256_hash: str, delta: int) -> int:
+        # Pipeline update so the count is clamped at zero atomically
+        doc = await self.blobs.find_one_and_update(
+            {"_id": sha256_hash},
+            [
+                {
+                    "$set": {
+                        "refcount": {"$max": [0, {"$add": ["$refcount", delta]}]},
+                        "updated_at": time.time(),
+                    }
+                }
+            ],
+            return_document=True,
+        )
+        return doc["refcount"] if doc else 0
+
+    async def get(self, sha256_hash: str) -> Dict[str, Any] | None:
+        doc = await self.blobs.find_one({"_id": sha256_hash})
+        if doc is None:
+            return None
+        doc["sha256"] = doc.pop("_id")
+        return doc
+
+    async def unreferenced(self, before: float) -> List[str]:
+        cursor = self.blobs.find({"refcount": {"$lte": 0}, "updated_at": {"$lt": before}}, {"_id": 1})
+        return [doc["_id"] async for doc in cursor]
+
+    async def forget(self, sha256_hash: str) -> None:
+        await self.blobs.delete_one({"_id": sha256_hash})
+
+    async def get_derived(self, source: str, kind: str) -> Dict[str, Any] | None:
+        doc = await self.derived.find_one({"_id": f"{source}:{kind}"})
+        return doc["data"] if doc else None
+
+    async def set_derived(self, source: str, kind: str, data: Dict[str, Any]) -> Dict[str, Any] | None:
+        doc = await self.derived.find_one_and_replace(
+            {"_id": f"{source}:{kind}"},
+            {"_id": f"{source}:{kind}", "source": source, "data": data},
+            upsert=True,
+        )
+        return doc["data"] if doc else None
+
+    async def pop_derived(self, source: str) -> List[Dict[str, Any]]:
+        docs = await self.derived.find({"source": source}).to_list(None)
+        await self.derived.delete_many({"source": source})
+        return [d["data"] for d in docs]
+
+    async def counts(self) -> Dict[str, Any]:
+        blobs = await self.blobs.count_documents({})
+        unreferenced = await self.blobs.count_documents({"refcount": {"$lte": 0}})
+        total = await self.blobs.aggregate(
+            [{"$group": {"_id": None, "bytes": {"$sum": "$size"}}}]
+        ).to_list(1)
+        return {
+            "blobs": blobs,
+            "bytes": total[0]["bytes"] if total else 0,
+            "unreferenced": unreferenced,
+        }
+
+    def close(self) -> None:
+        return None
+
+
+class BlobStore:
+    """Deduplicated blob storage keyed by SHA-256.
+
+    Each blob carries a reference count. Documents hold one reference to
+    their upload and stored ICNs one to their image. Derived artifacts (for
+    example the page renders of a PDF) are recorded against their source
+    blob with :meth:`set_derived` and hold one reference to each blob listed
+    in their ``blobs`` entry; producers store those blobs with ``ref=True``
+    and release their own reference once the artifact is recorded. Blobs whose
+    count has been zero for longer than the grace period are removed by
+    :meth:`collect_garbage`, together with the artifacts derived from them.
+    """
+
+    def __init__(self, backend: Any, index: Any):
+        self.backend = backend
+        self.index = index
+        self.counters = {"stored": 0, "deduplicated": 0, "collected": 0}
+
+    @classmethod
+    def from_env(cls, root: str | Path, db: Any | None = None) -> "BlobStore":
+        """Build the store selected by ``BLOB_STORE_BACKEND`` (local or gridfs)."""
+        root = Path(os.environ.get("BLOB_STORE_PATH") or root)
+        backend_name = os.environ.get("BLOB_STORE_BACKEND", "local").lower()
+        if backend_name == "gridfs":
+            if db is None:
+                raise ValueError("GridFS blob store requires a database")
+            return cls(GridFSBlobBackend(db, root), MongoBlobIndex(db))
+        if backend_name != "local":
+            raise ValueError(f"Unknown blob store backend: {backend_name}")
+        return cls(LocalBlobBackend(root), SQLiteBlobIndex(root / "index.sqlite3"))
+
+    async def put_file(
+        self, src: Path, sha256_hash: str, size: int, mime_type: str, ref: bool = True
+    ) -> Path:
+        """Move ``src`` into the store and return the blob's local path.
+
+        ``src`` is deleted if an identical blob is already stored. With
+        ``ref`` the caller takes one reference to the blob.
+        """
+        new = await self.index.register(sha256_hash, size, mime_type)
+        if new or not await self.backend.has(sha256_hash):
+            await self.backend.write(sha256_hash, src)
+            self.counters["stored"] += 1
+        else:
+            src.unlink(missing_ok=True)
+            self.counters["deduplicated"] += 1
+        if ref:
+            await self.index.add_ref(sha256_hash, 1)
+        return await self.backend.materialize(sha256_hash)
+
+    async def put_bytes(self, data: bytes, mime_type: str, ref: bool = False) -> tuple[str, Path]:
+        """Store in-memory ``data`` and return its hash and local path."""
+        sha256_hash = hashlib.sha256(data).hexdigest()
+        if await self.index.get(sha256_hash) is not None and await self.backend.has(sha256_hash):
+            self.counters["deduplicated"] += 1
+            if ref:
+                await self.index.add_ref(sha256_hash, 1)
+            return sha256_hash, await self.backend.materialize(sha256_hash)
+        fd, tmp = tempfile.mkstemp(dir=self._tmp_dir())
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        path = await self.put_file(Path(tmp), sha256_hash, len(data), mime_type, ref=ref)
+        return sha256_hash, path
+
+    def _tmp_dir(self) -> Path:
+        root = getattr(self.backend, "root", None) or self.backend.cache.root
+        tmp = Path(root) / "tmp"
+        tmp.mkdir(parents=True, exist_ok=True)
+        return tmp
+
+    async def path(self, sha256_hash: str) -> Path | None:
+        """Local path of a stored blob, or ``None`` if it is not stored."""
+        if not await self.backend.has(sha256_hash):
+            return None
+        return await self.backend.materialize(sha256_hash)
+
+    async def add_ref(self, sha256_hash: str) -> int:
+        return await self.index.add_ref(sha256_hash, 1)
+
+    async def release(self, sha256_hash: str) -> int:
+        """Drop one reference. The blob is removed by the next GC once unreferenced."""
+        return await self.index.add_ref(sha256_hash, -1)
+
+    async def get_derived(self, source: str, kind: str) -> Dict[str, Any] | None:
+        """Return derived artifact data if every blob it references is stored."""
+        data = await self.index.get_derived(source, kind)
+        if data is None:
+            return None
+        for sha256_hash in data.get("blobs", []):
+            if not await self.backend.has(sha256_hash):
+                return None
+        return data
+
+    async def set_derived(self, source: str, kind: str, data: Dict[str, Any]) -> None:
+        """Record an artifact derived from ``source`` and reference its blobs."""
+        for sha256_hash in data.get("blobs", []):
+            await self.index.add_ref(sha256_hash, 1)
+        previous = await self.index.set_derived(source, kind, data)
+        for sha256_hash in (previous or {}).get("blobs", []):
+            await self.index.add_ref(sha256_hash, -1)
+
+    async def collect_garbage(self, grace_seconds: float | None = None) -> List[str]:
+        """Delete blobs unreferenced for ``grace_seconds`` (``BLOB_GC_GRACE``)."""
+        if grace_seconds is None:
+            grace_seconds = float(os.environ.get("BLOB_GC_GRACE", 3600))
+        removed: List[str] = []
+        while True:
+            candidates = await self.index.unreferenced(time.time() - grace_seconds)
+            if not candidates:
+                break
+            for sha256_hash in candidates:
+                for data in await self.index.pop_derived(sha256_hash):
+                    for child in data.get("blobs", []):
+                        await self.index.add_ref(child, -1)
+                await self.backend.remove(sha256_hash)
+                await self.index.forget(sha256_hash)
+                removed.append(sha256_hash)
+            # Children released above are collected on the next pass only
+            # once their own grace period has passed.
+            if grace_seconds > 0:
+                break
+        self.counters["collected"] += len(removed)
+        if removed:
+            logger.info(f"Blob GC removed {len(removed)} blobs")
+        return removed
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name, **self.counters, **await self.index.counts()}
+
+    def close(self) -> None:
+        self.index.close()
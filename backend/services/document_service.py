@@ -1,28 +1,17 @@
 """Document processing service."""
 
 import hashlib
-import base64
 import aiofiles
-from typing import List, Dict, Any, Callable, AsyncGenerator
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, AsyncGenerator
 from pathlib import Path
 import shutil
 import os
-from PyPDF2 import PdfReader
-from pptx import Presentation
-from openpyxl import load_workbook
-from PIL import Image
-import pytesseract
-from docx import Document
-from pdf2image import convert_from_path
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-import xmlschema
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Image, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 import io
 import asyncio
 import uuid
 import re
 import logging
+import tempfile
 from datetime import datetime
 
 from backend.models.document import (
@@ -34,8 +23,25 @@ from backend.models.document import (
 )
 from backend.models.base import DMTypeEnum, SettingsModel, StructureType, SecurityLevel
 from backend.ai_providers.provider_factory import ProviderFactory
-from backend.ai_providers.base import TextProcessingRequest, VisionProcessingRequest
+from backend.ai_providers.base import (
+    TextProcessingRequest,
+    TextProcessingResponse,
+)
 from backend.services.audit import AuditService
+from backend.services.blob_store import BlobStore
+from backend.services.extraction_pool import (
+    IMAGE_EXTENSIONS,
+    ExtractionPool,
+    ProgressCallback,
+    extraction_kind,
+    extraction_pool,
+)
+from backend.services.image_index import ImageHashIndex, dhash_file, hamming
+from backend.services.retrieval_index import RetrievalIndex
+from backend.services.text_store import PageText, TextStore
+from backend.services.stage_scheduler import StageScheduler, stage_limits
+from backend.services.uploads import iter_bytes, stream_to_file
+from backend.services.validation_artifacts import validation_artifacts
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +73,11 @@ DEFAULT_STRUCTURE_CODES: Dict[StructureType, Dict[str, str]] = {
     },
 }
 
+IMAGE_SUFFIXES = {mime: suffix for suffix, mime in IMAGE_EXTENSIONS.items()}
+
+# Bump when a pipeline change should invalidate previously completed runs
+PIPELINE_VERSION = "1"
+
 # Info code mapping per data module type
 DM_INFO_CODE_MAP: Dict[DMTypeEnum, str] = {
     DMTypeEnum.PROC: "020",
@@ -78,6 +89,21 @@ DM_INFO_CODE_MAP: Dict[DMTypeEnum, str] = {
     DMTypeEnum.GEN: "000",
 }
 
+
+def pdf_render_settings() -> Dict[str, Any]:
+    """Options for extracting and rasterizing PDF images, read from the environment."""
+    color = os.environ.get("PDF_RENDER_COLOR", "rgb").lower()
+    return {
+        "mode": "pages" if os.environ.get("PDF_IMAGE_MODE", "embedded").lower() == "pages" else "embedded",
+        "min_image_size": int(os.environ.get("PDF_IMAGE_MIN_SIZE", 64)),
+        "vector_ops": int(os.environ.get("PDF_VECTOR_MIN_OPS", 200)),
+        "dpi": int(os.environ.get("PDF_RENDER_DPI", 150)),
+        "color": "gray" if color in ("gray", "grey", "grayscale") else "rgb",
+        "batch": max(1, int(os.environ.get("PDF_RENDER_BATCH", 4))),
+        "threads": max(1, int(os.environ.get("PDF_RENDER_THREADS", 2))),
+    }
+
+
 class DocumentService:
     """Service for document processing and management."""
 
@@ -87,6 +113,8 @@ class DocumentService:
         settings: Any | None = None,
         notifier: Callable[[str], None] | None = None,
         db: Any | None = None,
+        blob_store: BlobStore | None = None,
+        extraction: ExtractionPool | None = None,
     ):
         self.upload_path = Path(upload_path)
         self.upload_path.mkdir(parents=True, exist_ok=True)
@@ -100,7 +128,16 @@ class DocumentService:
         backend_root = Path(__file__).resolve().parent.parent
         self.templates_path = backend_root / "templates"
         self.schema_path = backend_root / "schemas" / "simple_data_module.xsd"
+        self.artifacts = validation_artifacts
         self.audit_service = AuditService(self.upload_path / "audit.log")
+        self.stage_limits = stage_limits
+        self.blob_store = blob_store or BlobStore.from_env(self.upload_path / "blobs", db)
+        self._runs_in_flight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.text_store = TextStore(self.upload_path / "text")
+        self.extraction = extraction or extraction_pool
+        self.retrieval_index = RetrievalIndex(self.upload_path / "retrieval.sqlite3")
+        self.image_index = ImageHashIndex(self.upload_path / "image_hashes.sqlite3")
+        self._vision_in_flight: Dict[int, asyncio.Future] = {}
 
     async def load_settings(self) -> Any:
         """Load settings from the database if available."""
@@ -118,103 +155,127 @@ class DocumentService:
         security_level: SecurityLevel = SecurityLevel.UNCLASSIFIED,
     ) -> UploadedDocument:
         """Upload and store a document."""
-        sha256_hash = hashlib.sha256(file_data).hexdigest()
-        file_id = str(uuid.uuid4())
-        ext = Path(filename).suffix
-        stored_name = f"{file_id}{ext}"
-        file_path = self.upload_path / stored_name
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(file_data)
+        return await self.upload_document_stream(
+            iter_bytes(file_data), filename, mime_type, security_level
+        )
+
+    async def upload_document_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        mime_type: str | None,
+        security_level: SecurityLevel = SecurityLevel.UNCLASSIFIED,
+        max_size: int | None = None,
+    ) -> UploadedDocument:
+        """Stream a document to disk chunk by chunk.
+
+        Raises :class:`UploadTooLargeError` once more than ``max_size`` bytes
+        (default ``MAX_UPLOAD_MB``) have been received.
+        """
+        stored = await stream_to_file(
+            chunks, self.upload_path, filename, mime_type, max_size
+        )
+        path = await self.blob_store.put_file(
+            stored.path, stored.sha256_hash, stored.size, stored.mime_type
+        )
         return UploadedDocument(
             filename=filename,
-            file_path=str(file_path),
-            mime_type=mime_type,
-            file_size=len(file_data),
-            sha256_hash=sha256_hash,
+            file_path=str(path),
+            mime_type=stored.mime_type,
+            file_size=stored.size,
+            sha256_hash=stored.sha256_hash,
             security_level=security_level,
             metadata={},
         )
 
-    async def extract_text_from_document(self, document: UploadedDocument) -> str:
+    async def store_icn(self, icn: ICN) -> None:
+        """Insert ``icn`` and take a reference to its image blob."""
+        await self.db.icns.insert_one(icn.dict())
+        await self.blob_store.add_ref(icn.sha256_hash)
+
+    async def delete_document(self, document: UploadedDocument) -> None:
+        """Release the document's reference to its stored blob."""
+        if await self.blob_store.release(document.sha256_hash) == 0:
+            await self.retrieval_index.remove(document.sha256_hash)
+
+    async def extract_text_from_document(
+        self, document: UploadedDocument, on_progress: ProgressCallback | None = None
+    ) -> str:
         """Extract text content from a document."""
-        fp = Path(document.file_path)
-        try:
-            if document.mime_type == "application/pdf":
-                return await self._extract_pdf_text(fp)
-            if (
-                document.mime_type
-                == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            ):
-                return await self._extract_docx_text(fp)
-            if (
-                document.mime_type
-                == "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-            ):
-                return await self._extract_pptx_text(fp)
-            if (
-                document.mime_type
-                == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            ):
-                return await self._extract_xlsx_text(fp)
-            if document.mime_type.startswith("text/"):
-                return await self._extract_plain_text(fp)
+        pages = await self.get_document_pages(document, on_progress)
+        if pages is None:
             return ""
+        with pages:
+            return pages.text()
+
+    async def get_document_pages(
+        self, document: UploadedDocument, on_progress: ProgressCallback | None = None
+    ) -> PageText | None:
+        """Return the document's extracted text per page.
+
+        Text is extracted once per file hash in the extraction process pool
+        and served from the text store afterwards. ``on_progress`` receives
+        ``{"page": n, "pages": total}`` as pages complete. Returns ``None``
+        for unsupported types or failed extraction; failures are not cached.
+        """
+        cached = self.text_store.load(document.sha256_hash)
+        if cached is not None:
+            return cached
+        kind = extraction_kind(document.mime_type)
+        if kind is None:
+            return None
+        try:
+            pages = await self.extraction.extract(kind, document.file_path, on_progress)
         except Exception as e:
             logger.error(f"Error extracting text from {document.filename}: {e}")
-            return ""
+            return None
+        if kind == "pdf":
+            pages = await self._ocr_missing_text(document, pages)
+        return self.text_store.save(document.sha256_hash, pages)
+
+    async def _ocr_missing_text(self, document: UploadedDocument, pages: List[str]) -> List[str]:
+        """Replace the text of pages without a usable text layer by OCR.
+
+        Only pages with fewer than ``OCR_MIN_CHARS`` extracted characters are
+        sent to Tesseract. ``OCR_MIN_CHARS=0`` disables OCR.
+        """
+        min_chars = int(os.environ.get("OCR_MIN_CHARS", 20))
+        missing = [i + 1 for i, text in enumerate(pages) if len(text.strip()) < min_chars]
+        if not missing:
+            return pages
+        texts = await self.extraction.ocr_pdf_pages(
+            document.file_path,
+            missing,
+            dpi=int(os.environ.get("OCR_DPI", 300)),
+            cache_root=self.upload_path / "ocr",
+        )
+        merged = list(pages)
+        for number, text in texts.items():
+            if text.strip():
+                merged[number - 1] = text.strip() + "\n"
+        return merged
 
-    async def _extract_pdf_text(self, file_path: Path) -> str:
+    async def _extract_text(self, kind: str, file_path: Path) -> str:
         try:
-            reader = PdfReader(str(file_path))
-            return "".join(page.extract_text() + "\n" for page in reader.pages)
+            return "".join(await self.extraction.extract(kind, file_path))
         except Exception as e:
-            logger.error(f"Error extracting PDF text: {e}")
+            logger.error(f"Error extracting {kind} text: {e}")
             return ""
 
+    async def _extract_pdf_text(self, file_path: Path) -> str:
+        return await self._extract_text("pdf", file_path)
+
     async def _extract_docx_text(self, file_path: Path) -> str:
-        try:
-            doc = await asyncio.to_thread(Document, str(file_path))
-            paragraphs = [p.text for p in doc.paragraphs if p.text]
-            return "\n".join(paragraphs)
-        except Exception as e:
-            logger.error(f"Error extracting DOCX text: {e}")
-            return ""
+        return await self._extract_text("docx", file_path)
 
     async def _extract_pptx_text(self, file_path: Path) -> str:
-        try:
-            prs = Presentation(str(file_path))
-            text = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            return text
-        except Exception as e:
-            logger.error(f"Error extracting PPTX text: {e}")
-            return ""
+        return await self._extract_text("pptx", file_path)
 
     async def _extract_xlsx_text(self, file_path: Path) -> str:
-        try:
-            workbook = load_workbook(str(file_path))
-            text = ""
-            for sheet in workbook.worksheets:
-                for row in sheet.iter_rows(values_only=True):
-                    for cell in row:
-                        if cell is not None:
-                            text += str(cell) + " "
-                    text += "\n"
-            return text
-        except Exception as e:
-            logger.error(f"Error extracting XLSX text: {e}")
-            return ""
+        return await self._extract_text("xlsx", file_path)
 
     async def _extract_plain_text(self, file_path: Path) -> str:
-        try:
-            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                return await f.read()
-        except Exception as e:
-            logger.error(f"Error extracting plain text: {e}")
-            return ""
+        return await self._extract_text("text", file_path)
 
     def _derive_lcn(self, name: str) -> str:
         match = re.search(r"(LCN-[A-Za-z0-9_-]+)", name, re.IGNORECASE)
@@ -225,17 +286,53 @@ class DocumentService:
     async def extract_images_from_document(
         self, document: UploadedDocument
     ) -> List[ICN]:
+        return [icn async for icn in self.iter_document_images(document)]
+
+    async def iter_document_images(self, document: UploadedDocument) -> AsyncIterator[ICN]:
+        """Yield the document's ICNs as they become available.
+
+        PDF pages are yielded as soon as each one is rendered, so the vision
+        stage can start before the whole file is rasterized.
+        """
         if document.mime_type == "application/pdf":
-            return await self._extract_pdf_images(document)
-        if document.mime_type.startswith("image/"):
-            return await self._process_single_image(document)
-        return []
+            async for icn in self._iter_pdf_images(document):
+                yield icn
+        elif document.mime_type.startswith("image/"):
+            for icn in await self._process_single_image(document):
+                yield icn
 
     async def _extract_pdf_images(self, document: UploadedDocument) -> List[ICN]:
-        file_path = Path(document.file_path)
-        icns: List[ICN] = []
+        return [icn async for icn in self._iter_pdf_images(document)]
+
+    async def _iter_pdf_images(self, document: UploadedDocument) -> AsyncIterator[ICN]:
+        settings = pdf_render_settings()
+        if settings["mode"] == "pages":
+            kind = f"pdf_pages@{settings['dpi']}{settings['color']}"
+            producer = self._render_pdf_pages(document, settings)
+        else:
+            kind = (
+                f"pdf_figures@{settings['dpi']}{settings['color']}"
+                f":{settings['min_image_size']}:{settings['vector_ops']}"
+            )
+            producer = self._extract_pdf_figures(document, settings)
+
+        cached = await self.blob_store.get_derived(document.sha256_hash, kind)
+        if cached is not None:
+            for entry in cached["images"]:
+                yield await self._figure_icn(document, entry)
+            return
+
+        # Producers store each blob with a reference of their own, so a GC
+        # run before the derived record exists cannot remove it; the
+        # references are released once the record holds its own.
+        entries: List[Dict[str, Any]] = []
         try:
-            pages = await asyncio.to_thread(convert_from_path, str(file_path))
+            async for entry in producer:
+                entries.append(entry)
+                yield await self._figure_icn(document, entry)
+            await self.blob_store.set_derived(
+                document.sha256_hash, kind, {"images": entries, "blobs": [e["sha256"] for e in entries]}
+            )
         except Exception as e:
             logger.error(f"Error extracting PDF images: {e}")
             if self.notifier:
@@ -245,33 +342,132 @@ class DocumentService:
                     )
                 except Exception:
                     pass
-            return []
+        finally:
+            for entry in entries:
+                await self.blob_store.release(entry["sha256"])
 
-        for idx, img in enumerate(pages, start=1):
-            filename = f"{file_path.stem}_page{idx}.png"
-            out_path = self.icn_path / filename
-            img.save(out_path, format="PNG")
-            async with aiofiles.open(out_path, "rb") as f:
-                data = await f.read()
-            sha256_hash = hashlib.sha256(data).hexdigest()
-            width, height = img.size
-            context = pytesseract.image_to_string(img)
-            icns.append(
-                ICN(
-                    filename=filename,
-                    file_path=str(out_path),
-                    sha256_hash=sha256_hash,
-                    mime_type="image/png",
-                    width=width,
-                    height=height,
-                    lcn=self._derive_lcn(filename),
-                    caption=context.strip(),
+    async def _figure_icn(self, document: UploadedDocument, entry: Dict[str, Any]) -> ICN:
+        filename = f"{Path(document.filename).stem}_{entry['name']}"
+        return ICN(
+            filename=filename,
+            file_path=str(await self.blob_store.path(entry["sha256"])),
+            sha256_hash=entry["sha256"],
+            mime_type=entry["mime_type"],
+            width=entry["width"],
+            height=entry["height"],
+            lcn=self._derive_lcn(filename),
+            caption=entry["caption"],
+        )
+
+    async def _extract_pdf_figures(
+        self, document: UploadedDocument, settings: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the PDF's embedded images, rasterizing only vector figure pages.
+
+        Images smaller than ``min_image_size`` pixels are skipped as
+        decoration, and an image repeated on several pages (a logo) is
+        yielded once.
+        """
+        file_path = str(document.file_path)
+        seen: set[str] = set()
+        async for index, _, page in self.extraction.iter_pdf_figures(
+            file_path, settings["min_image_size"], settings["vector_ops"]
+        ):
+            number = index + 1
+            for k, image in enumerate(page["images"], start=1):
+                sha256_hash = hashlib.sha256(image["data"]).hexdigest()
+                if sha256_hash in seen:
+                    continue
+                seen.add(sha256_hash)
+                await self.blob_store.put_bytes(image["data"], image["mime_type"], ref=True)
+                yield {
+                    "sha256": sha256_hash,
+                    "name": f"page{number}_img{k}{IMAGE_SUFFIXES[image['mime_type']]}",
+                    "mime_type": image["mime_type"],
+                    "width": image["width"],
+                    "height": image["height"],
+                    "caption": "",
+                }
+            if page["vector"]:
+                with tempfile.TemporaryDirectory(dir=self.upload_path) as scratch:
+                    paths = await asyncio.to_thread(
+                        self._rasterize_pages, file_path, number, number, scratch, settings
+                    )
+                    for page_path in paths:
+                        yield await self._store_rendered_page(page_path, f"page{number}.png")
+
+    async def _render_pdf_pages(
+        self, document: UploadedDocument, settings: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Render PDF pages into the blob store in batches of a few pages.
+
+        pdf2image writes each batch as PNG files into a scratch folder; the
+        encoded bytes are hashed and stored as they are, and only the current
+        batch is held at any time. Yields the entry of each page in order.
+        """
+        from pdf2image import pdfinfo_from_path
+
+        file_path = str(document.file_path)
+        info = await asyncio.to_thread(pdfinfo_from_path, file_path)
+        total = int(info["Pages"])
+        batch = settings["batch"]
+        number = 0
+        with tempfile.TemporaryDirectory(dir=self.upload_path) as scratch:
+            for first in range(1, total + 1, batch):
+                last = min(first + batch - 1, total)
+                paths = await asyncio.to_thread(
+                    self._rasterize_pages, file_path, first, last, scratch, settings
                 )
-            )
-        return icns
+                for page_path in sorted(paths):
+                    number += 1
+                    yield await self._store_rendered_page(page_path, f"page{number}.png")
+
+    async def _store_rendered_page(self, page_path: str, name: str) -> Dict[str, Any]:
+        """Move a rendered PNG into the blob store and describe it.
+
+        The caption is left empty for the vision stage; page OCR belongs to
+        the document text (see :meth:`_ocr_missing_text`).
+        """
+        from PIL import Image
+
+        async with aiofiles.open(page_path, "rb") as f:
+            data = await f.read()
+        os.remove(page_path)
+        sha256_hash, _ = await self.blob_store.put_bytes(data, "image/png", ref=True)
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        return {
+            "sha256": sha256_hash,
+            "name": name,
+            "mime_type": "image/png",
+            "width": width,
+            "height": height,
+            "caption": "",
+        }
+
+    @staticmethod
+    def _rasterize_pages(
+        file_path: str, first: int, last: int, output_folder: str, settings: Dict[str, Any]
+    ) -> List[str]:
+        """Render pages ``first``..``last`` (1-based) to PNG files and return their paths."""
+        from pdf2image import convert_from_path
+
+        return convert_from_path(
+            file_path,
+            dpi=settings["dpi"],
+            first_page=first,
+            last_page=last,
+            thread_count=settings["threads"],
+            output_folder=output_folder,
+            fmt="png",
+            grayscale=settings["color"] == "gray",
+            paths_only=True,
+        )
 
     async def _process_single_image(self, document: UploadedDocument) -> List[ICN]:
         try:
+            from PIL import Image
+
             async with aiofiles.open(document.file_path, "rb") as f:
                 image_data = await f.read()
             image = Image.open(io.BytesIO(image_data))
@@ -315,30 +511,61 @@ class DocumentService:
             parts.append(f"<caution><cautiontext><para>{c}</para></cautiontext></caution>")
         return "\n".join(parts)
 
-    async def gather_all_documents_text(self, exclude_id: str | None = None) -> str:
-        """Concatenate text from all uploaded documents."""
+    async def index_document(self, document: UploadedDocument) -> int:
+        """Add the document's text to the cross-document retrieval index.
+
+        A document whose text cannot be extracted is recorded with no
+        chunks, so it is not extracted again on every backfill.
+        """
+        try:
+            text = await self.extract_text_from_document(document)
+        except Exception as e:
+            logger.warning(f"Could not index {document.filename}: {e}")
+            text = ""
+        return await self.retrieval_index.add(document.sha256_hash, text)
+
+    async def backfill_retrieval_index(self) -> int:
+        """Index stored documents missing from the retrieval index.
+
+        New uploads are indexed on ingest; this covers documents uploaded
+        before the index existed. Returns the number of documents indexed.
+        """
         if self.db is None:
-            return ""
-        docs = await self.db.documents.find().to_list(1000)
-        texts: list[str] = []
-        for d in docs:
-            if exclude_id and d.get("id") == exclude_id:
+            return 0
+        indexed = await self.retrieval_index.indexed_keys()
+        count = 0
+        async for d in self.db.documents.find({}, {"_id": 0}):
+            if d.get("sha256_hash") in indexed:
                 continue
             try:
-                txt = await self.extract_text_from_document(UploadedDocument(**d))
-                if txt:
-                    texts.append(txt)
-            except Exception:
+                await self.index_document(UploadedDocument(**d))
+            except Exception as e:
+                logger.warning(f"Could not backfill retrieval index: {e}")
                 continue
-        return "\n".join(texts)
+            indexed.add(d["sha256_hash"])
+            count += 1
+        return count
+
+    async def related_context(self, document: UploadedDocument, text_content: str) -> str:
+        """Chunks of other documents most relevant to ``text_content``.
+
+        The result is bounded by ``CONTEXT_TOKEN_BUDGET`` regardless of
+        corpus size.
+        """
+        return await self.retrieval_index.context(
+            text_content, exclude=[document.sha256_hash]
+        )
 
     async def review_module_ai(self, content: str) -> Dict[str, Any]:
         """Use AI provider to review module content."""
         if not (os.environ.get("OPENAI_API_KEY") or os.environ.get("ANTHROPIC_API_KEY")):
             return {"issues": [], "suggested_text": content}
-        provider = ProviderFactory.create_text_provider()
-        req = TextProcessingRequest(text=content, task_type="review")
-        res = await provider.review_module(req)
+        provider = await ProviderFactory.acquire_text_provider()
+        try:
+            req = TextProcessingRequest(text=content, task_type="review")
+            res = await provider.review_module(req)
+        finally:
+            await ProviderFactory.release_provider(provider)
         return res.result
 
     async def refresh_cross_references(self) -> None:
@@ -365,28 +592,207 @@ class DocumentService:
                     {"$set": {"dm_refs": list(dm_refs), "icn_refs": list(icn_refs), "updated_at": datetime.utcnow()}}
                 )
 
+    def processing_key(self, document: UploadedDocument) -> str:
+        """Identify a processing run by content, providers, models and pipeline.
+
+        Two runs with the same key produce equivalent data modules and ICNs,
+        so a completed run can be reused instead of calling the providers
+        again.
+        """
+        text_provider, text_model = ProviderFactory.current_selection("text")
+        vision_provider, vision_model = ProviderFactory.current_selection("vision")
+        parts = [
+            document.sha256_hash,
+            f"{text_provider}:{text_model or ''}",
+            f"{vision_provider}:{vision_model or ''}",
+            str(getattr(self.settings, "structure_type", StructureType.OTHER).value),
+            getattr(self.settings, "text_analysis_mode", "separate"),
+            PIPELINE_VERSION,
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    async def find_completed_run(
+        self, key: str, document: UploadedDocument
+    ) -> tuple[List[DataModule], List[ICN]] | None:
+        """Return the modules and ICNs of a completed run, if all still exist.
+
+        A run recorded for another upload of the same file is moved over to
+        ``document``, so the reused modules point at the document that asked
+        for them.
+        """
+        if self.db is None:
+            return None
+        run = await self.db.processing_runs.find_one({"_id": key, "status": "completed"})
+        if not run:
+            return None
+        modules = await self.db.data_modules.find({"dmc": {"$in": run["dmcs"]}}).to_list(None)
+        icns = await self.db.icns.find({"icn_id": {"$in": run["icn_ids"]}}).to_list(None)
+        if len(modules) != len(run["dmcs"]) or len(icns) != len(run["icn_ids"]):
+            return None
+        if run.get("document_id") != document.id:
+            await self.db.data_modules.update_many(
+                {"dmc": {"$in": run["dmcs"]}},
+                {"$set": {"source_document_id": document.id, "updated_at": datetime.utcnow()}},
+            )
+            await self.db.processing_runs.update_one({"_id": key}, {"$set": {"document_id": document.id}})
+            for module in modules:
+                module["source_document_id"] = document.id
+        return [DataModule(**m) for m in modules], [ICN(**i) for i in icns]
+
+    async def record_run(
+        self,
+        key: str,
+        document: UploadedDocument,
+        modules: List[DataModule],
+        icns: List[ICN],
+    ) -> None:
+        """Remember a completed run so identical requests can reuse it.
+
+        Runs with a module or image that failed (for example while a
+        provider's circuit was open) are not recorded, so the next request
+        tries again instead of reusing the failure.
+        """
+        if self.db is None:
+            return
+        if any(m.processing_status != "completed" for m in modules) or any(
+            i.processing_status != "completed" for i in icns
+        ):
+            logger.info(f"Not recording run {key[:12]} for reuse: it has failed modules or images")
+            return
+        await self.db.processing_runs.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "status": "completed",
+                "document_id": document.id,
+                "sha256_hash": document.sha256_hash,
+                "pipeline_version": PIPELINE_VERSION,
+                "dmcs": [m.dmc for m in modules],
+                "icn_ids": [i.icn_id for i in icns],
+                "completed_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
+    async def run_once(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``func()``, sharing the result with concurrent calls for ``key``.
+
+        A second request for a run that is still in flight waits for the
+        first one instead of starting the pipeline again.
+        """
+        task = self._runs_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._runs_in_flight[key] = task
+            task.add_done_callback(lambda _: self._runs_in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _limit_key(self, kind: str) -> str:
+        provider = os.environ.get(f"{kind.upper()}_PROVIDER", "openai").lower()
+        return f"{kind}:{provider}"
+
+    def _text_stages(self, text_provider: Any, text_content: str) -> StageScheduler:
+        """Build the classify/extract/rewrite stages, which are independent.
+
+        In ``combined`` analysis mode a single provider call answers all three
+        and the classify/extract/rewrite stages just unpack its result.
+        """
+        limit = self._limit_key("text")
+        scheduler = StageScheduler(limits=self.stage_limits)
+        if getattr(self.settings, "text_analysis_mode", "separate") == "combined":
+            request = TextProcessingRequest(text=text_content, task_type="combined")
+            scheduler.add(
+                "analysis",
+                lambda _: text_provider.analyze_document(request),
+                limit=limit,
+            )
+            for name, key in (
+                ("classify", "classification"),
+                ("extract", "extraction"),
+                ("rewrite", "rewrite"),
+            ):
+                scheduler.add(
+                    name,
+                    lambda deps, key=key: self._unpack_analysis(deps["analysis"], key),
+                    after=["analysis"],
+                )
+            return scheduler
+        for name, task_type, call in (
+            ("classify", "classify", text_provider.classify_document),
+            ("extract", "extract", text_provider.extract_structured_data),
+            ("rewrite", "rewrite", text_provider.rewrite_to_ste),
+        ):
+            request = TextProcessingRequest(text=text_content, task_type=task_type)
+            scheduler.add(name, lambda _, call=call, request=request: call(request), limit=limit)
+        return scheduler
+
+    @staticmethod
+    async def _unpack_analysis(analysis: TextProcessingResponse, key: str) -> TextProcessingResponse:
+        result = analysis.result.get(key)
+        if not isinstance(result, dict):
+            result = {"error": analysis.result.get("error", f"missing {key} in combined analysis")}
+        return TextProcessingResponse(
+            result=result,
+            confidence=analysis.confidence,
+            processing_time=analysis.processing_time,
+            provider=analysis.provider,
+            model_used=analysis.model_used,
+            prompt_hash=analysis.prompt_hash,
+            response_hash=analysis.response_hash,
+        )
+
+    async def record_task(
+        self, task_type: str, input_data: Dict[str, Any], response: Any
+    ) -> None:
+        """Store a :class:`ProcessingTask` for one provider response.
+
+        The task carries the response cache's prompt and response hashes, so
+        a processing record can be traced to the cache entry it came from.
+        """
+        if self.db is None:
+            return
+        if isinstance(response, TextProcessingResponse):
+            error = response.result.get("error", "")
+        else:
+            # Vision providers report failures with zero confidence.
+            error = response.caption if response.confidence == 0.0 else ""
+        task = ProcessingTask(
+            task_type=task_type,
+            input_data=input_data,
+            output_data=response.dict(exclude={"prompt_hash", "response_hash"}),
+            status="failed" if error else "completed",
+            error_message=str(error),
+            processing_time=response.processing_time,
+            provider_used=f"{response.provider}:{response.model_used}",
+            prompt_hash=response.prompt_hash,
+            response_hash=response.response_hash,
+        )
+        try:
+            await self.db.processing_tasks.insert_one(task.dict())
+        except Exception as e:
+            logger.warning(f"Could not record {task_type} task: {e}")
+
     async def process_document_with_ai(
         self, document: UploadedDocument, text_content: str
     ) -> List[DataModule]:
         await self.load_settings()
-        text_provider = ProviderFactory.create_text_provider()
         logs: List[Dict[str, Any]] = []
         logs.append({"timestamp": datetime.utcnow(), "message": "Begin AI processing"})
         if self.db is not None:
-            extra_text = await self.gather_all_documents_text(exclude_id=document.id)
-            if extra_text:
-                text_content = f"{text_content}\n{extra_text}"[:10000]
+            related = await self.related_context(document, text_content)
+            if related:
+                text_content = f"{text_content}\n\nRelated context:\n{related}"
+        text_provider = await ProviderFactory.acquire_text_provider()
         try:
-            classification = TextProcessingRequest(
-                text=text_content, task_type="classify"
-            )
-            class_response = await text_provider.classify_document(classification)
+            results = await self._text_stages(text_provider, text_content).run()
+            for name in ("classify", "extract", "rewrite"):
+                await self.record_task(name, {"document_id": document.id}, results[name])
+            class_response = results["classify"]
             logs.append({"timestamp": datetime.utcnow(), "message": f"classification: {class_response.result}"})
             if "error" in class_response.result:
                 raise Exception(class_response.result["error"])
 
-            extract_req = TextProcessingRequest(text=text_content, task_type="extract")
-            extract_res = await text_provider.extract_structured_data(extract_req)
+            extract_res = results["extract"]
             logs.append({"timestamp": datetime.utcnow(), "message": f"extraction: {extract_res.result}"})
             if "error" in extract_res.result:
                 raise Exception(extract_res.result["error"])
@@ -419,8 +825,7 @@ class DocumentService:
                 icn_refs=icn_refs,
             )
 
-            rewrite_req = TextProcessingRequest(text=text_content, task_type="rewrite")
-            rewrite_res = await text_provider.rewrite_to_ste(rewrite_req)
+            rewrite_res = results["rewrite"]
             logs.append({"timestamp": datetime.utcnow(), "message": f"rewrite: {rewrite_res.result}"})
             logs.append({"timestamp": datetime.utcnow(), "message": "AI processing completed"})
 
@@ -477,30 +882,33 @@ class DocumentService:
             basic.processing_logs = logs
             basic.xml_content = self.render_data_module_xml(basic)
             return [basic]
+        finally:
+            await ProviderFactory.release_provider(text_provider)
 
     async def process_document_streaming(
         self, document: UploadedDocument, text_content: str
     ) -> AsyncGenerator[DataModule, None]:
         """Yield data modules one by one while processing with AI."""
         await self.load_settings()
-        text_provider = ProviderFactory.create_text_provider()
         logs: List[Dict[str, Any]] = []
         logs.append({"timestamp": datetime.utcnow(), "message": "Begin AI processing"})
 
         if self.db is not None:
-            extra_text = await self.gather_all_documents_text(exclude_id=document.id)
-            if extra_text:
-                text_content = f"{text_content}\n{extra_text}"[:10000]
+            related = await self.related_context(document, text_content)
+            if related:
+                text_content = f"{text_content}\n\nRelated context:\n{related}"
 
+        text_provider = await ProviderFactory.acquire_text_provider()
+        tasks = self._text_stages(text_provider, text_content).start()
         try:
-            classification = TextProcessingRequest(text=text_content, task_type="classify")
-            class_response = await text_provider.classify_document(classification)
+            class_response = await tasks["classify"]
+            await self.record_task("classify", {"document_id": document.id}, class_response)
             logs.append({"timestamp": datetime.utcnow(), "message": f"classification: {class_response.result}"})
             if "error" in class_response.result:
                 raise Exception(class_response.result["error"])
 
-            extract_req = TextProcessingRequest(text=text_content, task_type="extract")
-            extract_res = await text_provider.extract_structured_data(extract_req)
+            extract_res = await tasks["extract"]
+            await self.record_task("extract", {"document_id": document.id}, extract_res)
             logs.append({"timestamp": datetime.utcnow(), "message": f"extraction: {extract_res.result}"})
             if "error" in extract_res.result:
                 raise Exception(extract_res.result["error"])
@@ -541,8 +949,8 @@ class DocumentService:
             verbatim.xml_content = self.render_data_module_xml(verbatim)
             yield verbatim
 
-            rewrite_req = TextProcessingRequest(text=text_content, task_type="rewrite")
-            rewrite_res = await text_provider.rewrite_to_ste(rewrite_req)
+            rewrite_res = await tasks["rewrite"]
+            await self.record_task("rewrite", {"document_id": document.id}, rewrite_res)
             logs.append({"timestamp": datetime.utcnow(), "message": f"rewrite: {rewrite_res.result}"})
             logs.append({"timestamp": datetime.utcnow(), "message": "AI processing completed"})
 
@@ -589,6 +997,11 @@ class DocumentService:
             basic.processing_logs = logs
             basic.xml_content = self.render_data_module_xml(basic)
             yield basic
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            await ProviderFactory.release_provider(text_provider)
 
     def _generate_dmc(self, classification_result: dict, variant: str = "00") -> str:
         """Generate a fully S1000D compliant Data Module Code."""
@@ -623,34 +1036,132 @@ class DocumentService:
         )
 
     async def process_image_with_ai(self, icn: ICN) -> ICN:
-        vision_provider = ProviderFactory.create_vision_provider()
+        """Caption and analyse ``icn`` with the vision provider.
+
+        Near-duplicates of an already processed illustration (by perceptual
+        hash) reuse its results instead of calling the provider, and take
+        over its LCN when they are within ``PHASH_LCN_DISTANCE``. Only
+        results of the currently selected vision provider and model are
+        reused.
+        """
+        provider_type, model_name = ProviderFactory.current_selection("vision")
+        model = f"{provider_type}:{model_name or ''}"
+        try:
+            phash = await asyncio.to_thread(dhash_file, icn.file_path)
+        except Exception as e:
+            logger.warning(f"Could not hash image {icn.filename}: {e}")
+            phash = None
+
+        pending: asyncio.Future | None = None
+        try:
+            if phash is not None:
+                # Copies of a figure on consecutive pages are usually in
+                # flight together; wait for the first to finish rather than
+                # paying for each of them.
+                similar = self._similar_in_flight(phash)
+                if similar is not None:
+                    await asyncio.shield(similar)
+                else:
+                    pending = asyncio.get_running_loop().create_future()
+                    self._vision_in_flight[phash] = pending
+                match = await self.image_index.nearest(phash, model)
+                if match is not None:
+                    result = match["result"]
+                    icn.caption = result["caption"]
+                    icn.objects = result["objects"]
+                    icn.hotspots = result["hotspots"]
+                    icn.processing_status = "completed"
+                    if match["distance"] <= int(os.environ.get("PHASH_LCN_DISTANCE", 2)):
+                        icn.lcn = match["lcn"]
+                    await self.image_index.add(
+                        icn.icn_id, icn.lcn, icn.filename, phash, result, match["representative"], model
+                    )
+                    return icn
+            return await self._analyze_image(icn, phash, model)
+        finally:
+            if pending is not None:
+                del self._vision_in_flight[phash]
+                pending.set_result(None)
+
+    def _similar_in_flight(self, phash: int) -> asyncio.Future | None:
+        for other, pending in self._vision_in_flight.items():
+            if hamming(phash, other) <= self.image_index.threshold:
+                return pending
+        return None
+
+    async def _analyze_image(self, icn: ICN, phash: int | None, model: str) -> ICN:
+        vision_provider = await ProviderFactory.acquire_vision_provider()
+        limit = self._limit_key("vision")
         try:
             async with aiofiles.open(icn.file_path, "rb") as f:
                 image_data = await f.read()
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
-            caption_req = VisionProcessingRequest(
-                image_data=image_base64, task_type="caption"
-            )
-            caption_res = await vision_provider.generate_caption(caption_req)
-            objects_req = VisionProcessingRequest(
-                image_data=image_base64, task_type="objects"
-            )
-            objects_res = await vision_provider.detect_objects(objects_req)
-            hotspots_req = VisionProcessingRequest(
-                image_data=image_base64, task_type="hotspots"
-            )
-            hotspots_res = await vision_provider.generate_hotspots(hotspots_req)
-            icn.caption = caption_res.caption
-            icn.objects = objects_res.objects
-            icn.hotspots = hotspots_res.hotspots
+            async with self.stage_limits.slot(limit):
+                result = await vision_provider.analyze_image(image_data)
+            await self.record_task("vision", {"icn_id": icn.icn_id, "sha256_hash": icn.sha256_hash}, result)
+            icn.caption = result.caption
+            icn.objects = result.objects
+            icn.hotspots = result.hotspots
+            # Vision providers report failures with zero confidence; those
+            # must not be handed on to later duplicates.
+            icn.processing_status = "completed" if result.confidence > 0.0 else "error"
+            if phash is not None and result.confidence > 0.0:
+                await self.image_index.add(
+                    icn.icn_id,
+                    icn.lcn,
+                    icn.filename,
+                    phash,
+                    {"caption": icn.caption, "objects": icn.objects, "hotspots": icn.hotspots},
+                    model=model,
+                )
             return icn
         except Exception as e:
             logger.error(f"Error processing image with AI: {e}")
             icn.caption = f"Error processing image: {e}"
+            icn.processing_status = "error"
             return icn
+        finally:
+            await ProviderFactory.release_provider(vision_provider)
+
+    async def process_images_with_ai(
+        self,
+        icns: List[ICN] | AsyncIterator[ICN],
+        on_processed: Callable[[ICN], Awaitable[None]] | None = None,
+    ) -> List[ICN]:
+        """Process several images concurrently, bounded by ``AI_MAX_CONCURRENCY``.
+
+        ``icns`` may be an async iterator such as :meth:`iter_document_images`;
+        each image is scheduled as soon as it is produced. ``on_processed`` is
+        awaited for each ICN as soon as it completes.
+        """
+
+        async def process(icn: ICN) -> ICN:
+            processed = await self.process_image_with_ai(icn)
+            if on_processed is not None:
+                await on_processed(processed)
+            return processed
+
+        if isinstance(icns, list):
+            return await self.stage_limits.gather("images", [process(i) for i in icns])
+
+        async def bounded(icn: ICN) -> ICN:
+            async with self.stage_limits.slot("images"):
+                return await process(icn)
+
+        tasks: List["asyncio.Task[ICN]"] = []
+        try:
+            async for icn in icns:
+                tasks.append(asyncio.ensure_future(bounded(icn)))
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
     def _render_pdf(self, module: DataModule, icns: List[ICN], pdf_path: Path) -> None:
         """Render a PDF file for the given data module."""
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer
+
         styles = getSampleStyleSheet()
         styles.add(
             ParagraphStyle(
@@ -683,18 +1194,15 @@ class DocumentService:
 
     def render_data_module_xml(self, module: DataModule) -> str:
         """Render a DataModule to XML using Jinja2 template."""
-        env = Environment(
-            loader=FileSystemLoader(str(self.templates_path)),
-            autoescape=select_autoescape(["xml"]),
-        )
-        template = env.get_template("data_module.xml.j2")
+        template = self.artifacts.template(self.templates_path, "data_module.xml.j2", autoescape=True)
         return template.render(module=module)
 
     def validate_xml(self, xml_str: str) -> bool:
         """Validate XML string against built-in XSD."""
         try:
-            schema = xmlschema.XMLSchema(self.schema_path)
-            return schema.is_valid(xml_str)
+            from lxml import etree
+
+            return self.artifacts.schema(self.schema_path).validate(etree.fromstring(xml_str.encode()))
         except Exception:
             return False
 
@@ -717,8 +1225,7 @@ class DocumentService:
 
         package_files: List[Path] = []
         errors: List[str] = []
-        env = Environment(loader=FileSystemLoader(str(self.templates_path)))
-        html_template = env.get_template("data_module.html.j2")
+        html_template = self.artifacts.template(self.templates_path, "data_module.html.j2")
 
         for mod_data in modules:
             dm = DataModule(**mod_data)
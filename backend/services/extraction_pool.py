@@ -0,0 +1,442 @@
+"""Process pool for CPU-bound text extraction from uploaded files.
+
+The extractor functions are module level so they can be pickled into worker
+processes, and import their format libraries lazily so workers only load
+what they use.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from backend.services.blob_store import shard_path
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+
+def pdf_page_count(file_path: str) -> int:
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Text of pages ``start`` (inclusive) to ``end`` (exclusive)."""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() + "\n" for i in range(start, end)]
+
+
+IMAGE_EXTENSIONS = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+}
+
+# Path construction operators; a page drawn mostly with these is a vector figure.
+PATH_OPERATORS = frozenset([b"m", b"l", b"c", b"v", b"y", b"re"])
+
+_COMPONENT_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+
+def _color_mode(color_space) -> Tuple[str, Any]:
+    """PIL mode for a PDF colour space, and the palette for indexed images."""
+    color_space = color_space.get_object() if color_space is not None else "/DeviceRGB"
+    if isinstance(color_space, list):
+        family = color_space[0]
+        if family == "/ICCBased":
+            return _COMPONENT_MODES[int(color_space[1].get_object().get("/N", 3))], None
+        if family == "/Indexed":
+            base, _, lookup = (v.get_object() for v in color_space[1:4])
+            lookup = lookup.get_data() if hasattr(lookup, "get_data") else bytes(lookup)
+            base_mode, _ = _color_mode(base)
+            return "P", (base_mode, lookup)
+        raise ValueError(f"Unsupported colour space {family}")
+    return {"/DeviceGray": "L", "/DeviceRGB": "RGB", "/DeviceCMYK": "CMYK"}[color_space], None
+
+
+def _image_bytes(obj) -> Tuple[bytes, str]:
+    """Encoded bytes and MIME type of an image XObject.
+
+    JPEG streams are returned exactly as stored. Everything else is
+    re-encoded as PNG, the other format every vision API accepts: JPEG 2000
+    streams are decoded by PIL and other encodings hold raw samples.
+    """
+    from PIL import Image
+
+    filters = obj.get("/Filter", [])
+    filters = [filters] if isinstance(filters, str) else list(filters)
+    data = obj.get_data()
+    if filters and filters[-1] == "/DCTDecode":
+        return data, "image/jpeg"
+    if filters and filters[-1] == "/JPXDecode":
+        with Image.open(io.BytesIO(data)) as decoded:
+            image = decoded.convert("RGBA" if "A" in decoded.mode else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue(), "image/png"
+
+    size = (int(obj["/Width"]), int(obj["/Height"]))
+    if obj.get("/ImageMask") or int(obj.get("/BitsPerComponent", 8)) == 1:
+        image = Image.frombytes("1", size, data)
+    else:
+        mode, palette = _color_mode(obj.get("/ColorSpace"))
+        image = Image.frombytes(mode, size, data)
+        if palette is not None:
+            base_mode, lookup = palette
+            if base_mode == "L":
+                lookup = b"".join(lookup[i : i + 1] * 3 for i in range(len(lookup)))
+            image.putpalette(lookup[: 768])
+        if image.mode in ("CMYK", "P"):
+            image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue(), "image/png"
+
+
+def _xobjects(resources, seen: set) -> Iterator[Tuple[str, Any]]:
+    """Yield ``(name, object)`` for the XObjects of ``resources``.
+
+    Form XObjects are followed into their own resources, so figures wrapped
+    in forms are found too. Each form is visited once, which also guards
+    against forms that refer to themselves.
+    """
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
+    for name, ref in xobjects.get_object().items():
+        obj = ref.get_object()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        yield name, obj
+        if obj.get("/Subtype") == "/Form":
+            yield from _xobjects(obj.get("/Resources"), seen)
+
+
+def _page_images(page, min_size: int) -> List[Dict]:
+    images = []
+    for name, obj in _xobjects(page.get("/Resources"), set()):
+        if obj.get("/Subtype") != "/Image":
+            continue
+        width, height = int(obj.get("/Width", 0)), int(obj.get("/Height", 0))
+        if width < min_size or height < min_size:
+            continue
+        try:
+            data, mime_type = _image_bytes(obj)
+        except Exception:
+            # Unsupported encodings are skipped rather than failing the page
+            continue
+        images.append(
+            {"name": name.lstrip("/"), "data": data, "mime_type": mime_type, "width": width, "height": height}
+        )
+    return images
+
+
+def _path_operator_count(page, reader) -> int:
+    """Path segments drawn by the page, including those inside Form XObjects."""
+    from PyPDF2.generic import ContentStream
+
+    streams = [page.get_contents()]
+    for _, obj in _xobjects(page.get("/Resources"), set()):
+        if obj.get("/Subtype") == "/Form":
+            streams.append(obj)
+    count = 0
+    for contents in streams:
+        if contents is None:
+            continue
+        stream = ContentStream(contents, reader)
+        count += sum(1 for _, operator in stream.operations if operator in PATH_OPERATORS)
+    return count
+
+
+def pdf_figure_range(file_path: str, start: int, end: int, min_size: int, vector_ops: int) -> List[Dict]:
+    """Embedded images of pages ``start`` to ``end`` (exclusive).
+
+    Each entry lists the page's images at least ``min_size`` pixels on both
+    sides, and flags pages without such images that draw at least
+    ``vector_ops`` path segments as vector figures to be rasterized.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    entries = []
+    for i in range(start, end):
+        page = reader.pages[i]
+        images = _page_images(page, min_size)
+        vector = not images and _path_operator_count(page, reader) >= vector_ops
+        entries.append({"images": images, "vector": vector})
+    return entries
+
+
+def ocr_pdf_page(file_path: str, page_number: int, dpi: int, cache_root: str) -> Tuple[str, bool]:
+    """OCR one PDF page (1-based); returns the text and whether it was cached.
+
+    The cache is keyed by a hash of the rendered page pixels, so the same
+    scanned page is only recognized once across files.
+    """
+    from pdf2image import convert_from_path
+
+    image = convert_from_path(
+        file_path, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True
+    )[0]
+    digest = hashlib.sha256(f"{dpi}:{image.mode}:{image.size}:".encode())
+    digest.update(image.tobytes())
+    cache_path = shard_path(Path(cache_root), digest.hexdigest()).with_suffix(".txt")
+    if cache_path.exists():
+        return cache_path.read_text(encoding="utf-8"), True
+
+    import pytesseract
+
+    text = pytesseract.image_to_string(image)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    partial = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.part")
+    partial.write_text(text, encoding="utf-8")
+    os.replace(partial, cache_path)
+    return text, False
+
+
+def docx_pages(file_path: str) -> List[str]:
+    from docx import Document
+
+    doc = Document(file_path)
+    return ["\n".join(p.text for p in doc.paragraphs if p.text)]
+
+
+def pptx_pages(file_path: str) -> List[str]:
+    from pptx import Presentation
+
+    prs = Presentation(file_path)
+    return [
+        "".join(shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text"))
+        for slide in prs.slides
+    ]
+
+
+def xlsx_pages(file_path: str) -> List[str]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    pages = []
+    for sheet in workbook.worksheets:
+        text = ""
+        for row in sheet.iter_rows(values_only=True):
+            for cell in row:
+                if cell is not None:
+                    text += str(cell) + " "
+            text += "\n"
+        pages.append(text)
+    workbook.close()
+    return pages
+
+
+def plain_pages(file_path: str) -> List[str]:
+    return [Path(file_path).read_text(encoding="utf-8")]
+
+
+EXTRACTORS: Dict[str, Callable[[str], List[str]]] = {
+    "docx": docx_pages,
+    "pptx": pptx_pages,
+    "xlsx": xlsx_pages,
+    "text": plain_pages,
+}
+
+MIME_KINDS = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+}
+
+
+def extraction_kind(mime_type: str) -> str | None:
+    """Extractor name for ``mime_type``, or ``None`` if unsupported."""
+    if mime_type.startswith("text/"):
+        return "text"
+    return MIME_KINDS.get(mime_type)
+
+
+class ExtractionPool:
+    """Run extractors in worker processes, splitting PDFs into page ranges.
+
+    PDF ranges of ``pages_per_task`` pages are extracted in parallel and
+    yielded in page order, so callers can report progress page by page.
+    Workers are started with ``spawn`` to stay independent of the server's
+    threads and event loop.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        pages_per_task: int | None = None,
+        ocr_workers: int | None = None,
+    ):
+        if max_workers is None:
+            max_workers = int(os.environ.get("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+        if pages_per_task is None:
+            pages_per_task = int(os.environ.get("PDF_PAGES_PER_TASK", 16))
+        if ocr_workers is None:
+            ocr_workers = int(os.environ.get("OCR_WORKERS", max_workers))
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.ocr_workers = max(1, ocr_workers)
+        self._executor: Executor | None = None
+        self._ocr_executor: Executor | None = None
+        self.counters = {
+            "documents": 0,
+            "tasks": 0,
+            "pages": 0,
+            "ocr_pages": 0,
+            "ocr_cache_hits": 0,
+            "ocr_errors": 0,
+        }
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _ocr_pool(self) -> Executor:
+        # OCR gets its own workers so scanned pages do not starve extraction
+        if self._ocr_executor is None:
+            self._ocr_executor = ProcessPoolExecutor(
+                max_workers=self.ocr_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._ocr_executor
+
+    async def _submit(self, func: Callable, *args) -> List[str] | int:
+        self.counters["tasks"] += 1
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+
+    def page_ranges(self, total: int) -> List[Tuple[int, int]]:
+        return [
+            (start, min(start + self.pages_per_task, total))
+            for start in range(0, total, self.pages_per_task)
+        ]
+
+    async def _iter_pdf_ranges(self, file_path: str, func: Callable, *args) -> AsyncIterator[Tuple[int, int, Any]]:
+        """Run ``func(file_path, start, end, *args)`` over page ranges.
+
+        Results are yielded per page and in page order. At most one range
+        more than there are workers is in flight, which bounds the memory
+        held by finished ranges waiting for an earlier one.
+        """
+        total = await self._submit(pdf_page_count, file_path)
+        ranges = iter(self.page_ranges(total))
+        pending: Deque["asyncio.Future[List[Any]]"] = deque()
+
+        def refill() -> None:
+            while len(pending) <= self.max_workers:
+                bounds = next(ranges, None)
+                if bounds is None:
+                    return
+                pending.append(asyncio.ensure_future(self._submit(func, file_path, *bounds, *args)))
+
+        try:
+            refill()
+            index = 0
+            while pending:
+                results = await pending.popleft()
+                refill()
+                for item in results:
+                    self.counters["pages"] += 1
+                    yield index, total, item
+                    index += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def iter_pdf_pages(self, file_path: str | Path) -> AsyncIterator[Tuple[int, int, str]]:
+        """Yield ``(page_index, page_count, text)`` in page order."""
+        async for entry in self._iter_pdf_ranges(str(file_path), pdf_page_range):
+            yield entry
+
+    async def iter_pdf_figures(
+        self, file_path: str | Path, min_size: int, vector_ops: int
+    ) -> AsyncIterator[Tuple[int, int, Dict]]:
+        """Yield ``(page_index, page_count, entry)`` from :func:`pdf_figure_range`."""
+        async for entry in self._iter_pdf_ranges(str(file_path), pdf_figure_range, min_size, vector_ops):
+            yield entry
+
+    async def ocr_pdf_pages(
+        self, file_path: str | Path, page_numbers: Iterable[int], dpi: int, cache_root: str | Path
+    ) -> Dict[int, str]:
+        """OCR the given 1-based pages concurrently.
+
+        Pages that fail (for example when Tesseract is not installed) are
+        left out of the result.
+        """
+        loop = asyncio.get_running_loop()
+        page_numbers = list(page_numbers)
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._ocr_pool(), ocr_pdf_page, str(file_path), number, dpi, str(cache_root)
+                )
+                for number in page_numbers
+            ),
+            return_exceptions=True,
+        )
+        texts: Dict[int, str] = {}
+        for number, result in zip(page_numbers, results):
+            if isinstance(result, BaseException):
+                self.counters["ocr_errors"] += 1
+                logger.warning(f"OCR failed for page {number} of {file_path}: {result}")
+                continue
+            text, cached = result
+            self.counters["ocr_pages"] += 1
+            self.counters["ocr_cache_hits"] += int(cached)
+            texts[number] = text
+        return texts
+
+    async def extract(
+        self,
+        kind: str,
+        file_path: str | Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> List[str]:
+        """Extract the pages of a file of ``kind`` (see :func:`extraction_kind`)."""
+        self.counters["documents"] += 1
+        if kind == "pdf":
+            pages: List[str] = []
+            async for index, total, text in self.iter_pdf_pages(file_path):
+                pages.append(text)
+                if on_progress is not None:
+                    on_progress({"page": index + 1, "pages": total})
+            return pages
+        pages = await self._submit(EXTRACTORS[kind], str(file_path))
+        self.counters["pages"] += len(pages)
+        if on_progress is not None:
+            on_progress({"page": len(pages), "pages": len(pages)})
+        return pages
+
+    def shutdown(self) -> None:
+        for executor in (self._executor, self._ocr_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._ocr_executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "pages_per_task": self.pages_per_task,
+            "ocr_workers": self.ocr_workers,
+            **self.counters,
+        }
+
+
+extraction_pool = ExtractionPool()
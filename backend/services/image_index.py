@@ -0,0 +1,202 @@
+"""Perceptual-hash index of illustrations for near-duplicate detection."""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+HASH_BITS = 64
+BANDS = 8
+BAND_BITS = HASH_BITS // BANDS
+
+
+def dhash(image: Any, size: int = 8) -> int:
+    """64-bit difference hash of a PIL image.
+
+    The image is reduced to a ``size + 1`` by ``size`` grayscale thumbnail
+    and each bit records whether a pixel is brighter than its right-hand
+    neighbour, so the hash survives rescaling and recompression.
+    """
+    import numpy as np
+    from PIL import Image
+
+    thumb = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_file(path: str | Path) -> int:
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return dhash(image)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _bands(phash: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(phash >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+class ImageHashIndex:
+    """Perceptual hashes of processed ICNs with their vision results, in SQLite.
+
+    Every ICN is stored with the ICN whose results it reused (its cluster
+    representative) and the ``provider:model`` that produced the results;
+    lookups only match entries of the same model. Lookups split the hash into eight bands: two hashes
+    within a Hamming distance of at most seven share at least one band
+    exactly, so only ICNs with a matching band are compared.
+    """
+
+    def __init__(self, db_path: str | Path, threshold: int | None = None):
+        if threshold is None:
+            threshold = int(os.environ.get("PHASH_THRESHOLD", 6))
+        self.db_path = Path(db_path)
+        self.threshold = max(0, min(threshold, BANDS - 1))
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.counters = {"lookups": 0, "reused": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS icns (
+                    icn_id TEXT PRIMARY KEY,
+                    lcn TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    phash TEXT NOT NULL,
+                    representative TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    model TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS icns_representative ON icns(representative);
+                CREATE TABLE IF NOT EXISTS bands (
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    icn_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS bands_lookup ON bands(band, value);
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(icns)")}
+            if "model" not in columns:
+                self._conn.execute("ALTER TABLE icns ADD COLUMN model TEXT NOT NULL DEFAULT ''")
+        return self._conn
+
+    def nearest_sync(self, phash: int, model: str = "") -> Dict[str, Any] | None:
+        """Return the closest indexed ICN of ``model`` within the threshold, if any.
+
+        The result holds the matched ``icn_id``, its ``representative``,
+        the representative's ``lcn`` and vision ``result``, and the Hamming
+        ``distance``.
+        """
+        bands = _bands(phash)
+        with self._lock:
+            self.counters["lookups"] += 1
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT DISTINCT i.icn_id, i.phash, i.representative FROM bands b "
+                "JOIN icns i ON i.icn_id = b.icn_id WHERE i.model = ? AND ("
+                + " OR ".join("(b.band = ? AND b.value = ?)" for _ in bands)
+                + ")",
+                [model, *(v for band, value in enumerate(bands) for v in (band, value))],
+            ).fetchall()
+            best = None
+            for icn_id, stored, representative in rows:
+                distance = hamming(phash, int(stored, 16))
+                if distance <= self.threshold and (best is None or distance < best[0]):
+                    best = (distance, icn_id, representative)
+            if best is None:
+                return None
+            distance, icn_id, representative = best
+            lcn, result = conn.execute(
+                "SELECT lcn, result FROM icns WHERE icn_id = ?", (representative,)
+            ).fetchone()
+            self.counters["reused"] += 1
+        return {
+            "icn_id": icn_id,
+            "representative": representative,
+            "lcn": lcn,
+            "result": json.loads(result),
+            "distance": distance,
+        }
+
+    def add_sync(
+        self,
+        icn_id: str,
+        lcn: str,
+        filename: str,
+        phash: int,
+        result: Dict[str, Any],
+        representative: str | None = None,
+        model: str = "",
+    ) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM bands WHERE icn_id = ?", (icn_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO icns (icn_id, lcn, filename, phash, representative, result, model) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (icn_id, lcn, filename, f"{phash:016x}", representative or icn_id, json.dumps(result), model),
+            )
+            conn.executemany(
+                "INSERT INTO bands VALUES (?, ?, ?)",
+                [(band, value, icn_id) for band, value in enumerate(_bands(phash))],
+            )
+            conn.commit()
+
+    def clusters_sync(self, min_size: int = 2) -> List[Dict[str, Any]]:
+        """Groups of ICNs sharing a representative, largest first."""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT icn_id, lcn, filename, phash, representative FROM icns "
+                "WHERE representative IN (SELECT representative FROM icns "
+                "GROUP BY representative HAVING COUNT(*) >= ?) ORDER BY representative, icn_id",
+                (min_size,),
+            ).fetchall()
+        clusters: Dict[str, Dict[str, Any]] = {}
+        hashes = {icn_id: int(phash, 16) for icn_id, _, _, phash, _ in rows}
+        for icn_id, lcn, filename, phash, representative in rows:
+            cluster = clusters.setdefault(representative, {"representative": representative, "members": []})
+            cluster["members"].append(
+                {
+                    "icn_id": icn_id,
+                    "lcn": lcn,
+                    "filename": filename,
+                    "distance": hamming(int(phash, 16), hashes[representative]),
+                }
+            )
+        return sorted(clusters.values(), key=lambda c: len(c["members"]), reverse=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            icns, clusters = self._connect().execute(
+                "SELECT COUNT(*), COUNT(DISTINCT representative) FROM icns"
+            ).fetchone()
+        return {"icns": icns, "unique": clusters, "threshold": self.threshold, **self.counters}
+
+    async def nearest(self, phash: int, model: str = "") -> Dict[str, Any] | None:
+        return await asyncio.to_thread(self.nearest_sync, phash, model)
+
+    async def add(self, *args: Any, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.add_sync, *args, **kwargs)
+
+    async def clusters(self, min_size: int = 2) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.clusters_sync, min_size)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
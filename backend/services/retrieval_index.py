@@ -0,0 +1,263 @@
+"""Local BM25 retrieval over chunked document text for cross-document context."""
+
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_-]+")
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be been but by can do for from has have if in into is it
+    its may must no not of on or shall should that the their then there these
+    this to was were when which will with you your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text: str, chunk_words: int = 200, overlap: int = 40) -> List[str]:
+    """Split ``text`` into overlapping windows of about ``chunk_words`` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start : start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+class RetrievalIndex:
+    """Incremental BM25 index persisted in SQLite.
+
+    Documents are keyed by content hash, so duplicates are indexed once.
+    Every indexed document is recorded in ``documents``, including those
+    without any indexable text, so they are not indexed again. Queries only
+    touch the postings of the query terms, so their cost grows with the
+    number of matching chunks rather than the corpus text.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        chunk_words: int = 200,
+        overlap: int = 40,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.db_path = Path(db_path)
+        self.chunk_words = chunk_words
+        self.overlap = overlap
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    doc_key TEXT NOT NULL,
+                    ord INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_key);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS postings_term ON postings(term);
+                CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id);
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_key TEXT PRIMARY KEY,
+                    chunks INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO documents
+                    SELECT doc_key, COUNT(*) FROM chunks GROUP BY doc_key;
+                """
+            )
+        return self._conn
+
+    # -- writes -----------------------------------------------------------
+
+    def add_sync(self, doc_key: str, text: str) -> int:
+        """Index ``text`` under ``doc_key``. Returns the number of new chunks.
+
+        ``doc_key`` is recorded as indexed even when ``text`` yields no
+        chunks.
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn.execute("SELECT 1 FROM documents WHERE doc_key=?", (doc_key,)).fetchone():
+                return 0
+            added = 0
+            for ord_, chunk in enumerate(chunk_text(text, self.chunk_words, self.overlap)):
+                terms = Counter(tokenize(chunk))
+                if not terms:
+                    continue
+                cur = conn.execute(
+                    "INSERT INTO chunks (doc_key, ord, text, length) VALUES (?, ?, ?, ?)",
+                    (doc_key, ord_, chunk, sum(terms.values())),
+                )
+                conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, cur.lastrowid, tf) for term, tf in terms.items()],
+                )
+                added += 1
+            conn.execute("INSERT INTO documents VALUES (?, ?)", (doc_key, added))
+            conn.commit()
+            return added
+
+    def remove_sync(self, doc_key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE doc_key=?)",
+                (doc_key,),
+            )
+            conn.execute("DELETE FROM chunks WHERE doc_key=?", (doc_key,))
+            conn.execute("DELETE FROM documents WHERE doc_key=?", (doc_key,))
+            conn.commit()
+
+    def indexed_keys_sync(self) -> set[str]:
+        with self._lock:
+            rows = self._connect().execute("SELECT doc_key FROM documents").fetchall()
+        return {r[0] for r in rows}
+
+    # -- queries ----------------------------------------------------------
+
+    def search_sync(
+        self,
+        query: str,
+        top_k: int = 5,
+        exclude: Iterable[str] = (),
+        max_query_terms: int = 32,
+    ) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` chunks scoring highest for ``query``.
+
+        Long queries (a whole document) are reduced to their
+        ``max_query_terms`` most distinctive terms by tf-idf.
+        """
+        exclude = set(exclude)
+        query_tf = Counter(tokenize(query))
+        if not query_tf:
+            return []
+        with self._lock:
+            conn = self._connect()
+            n_chunks, total_len = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+            ).fetchone()
+            if not n_chunks:
+                return []
+            avgdl = total_len / n_chunks
+            idf = self._idf(conn, list(query_tf), n_chunks)
+            terms = sorted(
+                (t for t in query_tf if idf.get(t, 0) > 0),
+                key=lambda t: query_tf[t] * idf[t],
+                reverse=True,
+            )[:max_query_terms]
+            scores: Dict[int, float] = {}
+            for term in terms:
+                rows = conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length, c.doc_key FROM postings p "
+                    "JOIN chunks c ON c.id = p.chunk_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                for chunk_id, tf, length, doc_key in rows:
+                    if doc_key in exclude:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avgdl)
+                    score = idf[term] * tf * (self.k1 + 1) / (tf + norm)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+            best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+            results = []
+            for chunk_id, score in best:
+                doc_key, ord_, text = conn.execute(
+                    "SELECT doc_key, ord, text FROM chunks WHERE id=?", (chunk_id,)
+                ).fetchone()
+                results.append({"doc_key": doc_key, "ord": ord_, "text": text, "score": score})
+        return results
+
+    @staticmethod
+    def _idf(conn: sqlite3.Connection, terms: List[str], n_chunks: int) -> Dict[str, float]:
+        idf: Dict[str, float] = {}
+        for start in range(0, len(terms), 500):
+            batch = terms[start : start + 500]
+            rows = conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({','.join('?' * len(batch))}) "
+                "GROUP BY term",
+                batch,
+            ).fetchall()
+            for term, df in rows:
+                idf[term] = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+        return idf
+
+    def context_sync(
+        self,
+        query: str,
+        exclude: Iterable[str] = (),
+        top_k: int | None = None,
+        token_budget: int | None = None,
+    ) -> str:
+        """Join the best chunks for ``query`` up to ``token_budget`` tokens.
+
+        Tokens are estimated at four characters each.
+        """
+        if top_k is None:
+            top_k = int(os.environ.get("CONTEXT_TOP_K", 5))
+        if token_budget is None:
+            token_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1000))
+        budget = token_budget * 4
+        parts: List[str] = []
+        for hit in self.search_sync(query, top_k=top_k, exclude=exclude):
+            if len(hit["text"]) > budget:
+                break
+            parts.append(hit["text"])
+            budget -= len(hit["text"]) + 1
+        return "\n".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            docs, chunks = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents"
+            ).fetchone()
+        return {"documents": docs, "chunks": chunks}
+
+    # -- async wrappers ---------------------------------------------------
+
+    async def add(self, doc_key: str, text: str) -> int:
+        return await asyncio.to_thread(self.add_sync, doc_key, text)
+
+    async def remove(self, doc_key: str) -> None:
+        await asyncio.to_thread(self.remove_sync, doc_key)
+
+    async def indexed_keys(self) -> set[str]:
+        return await asyncio.to_thread(self.indexed_keys_sync)
+
+    async def context(self, query: str, exclude: Iterable[str] = (), **kwargs: Any) -> str:
+        return await asyncio.to_thread(self.context_sync, query, list(exclude), **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,119 @@
+"""Dependency-aware scheduling of concurrent AI processing stages."""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+
+class ConcurrencyLimits:
+    """Named semaphores bounding how many stages run at once per key.
+
+    Keys are usually ``"<kind>:<provider>"`` so that every caller of the same
+    backend shares one limit. Semaphores are recreated when used from a new
+    event loop.
+    """
+
+    def __init__(self, default_limit: int | None = None, limits: Dict[str, int] | None = None):
+        if default_limit is None:
+            default_limit = int(os.environ.get("AI_MAX_CONCURRENCY", 4))
+        self.default_limit = max(1, default_limit)
+        self.limits: Dict[str, int] = dict(limits or {})
+        self._semaphores: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        entry = self._semaphores.get(key)
+        if entry is None or entry[0] is not loop:
+            entry = (loop, asyncio.Semaphore(self.limits.get(key, self.default_limit)))
+            self._semaphores[key] = entry
+        return entry[1]
+
+    @asynccontextmanager
+    async def slot(self, key: str | None) -> AsyncIterator[None]:
+        """Hold one slot of ``key`` for the duration of the block."""
+        if key is None:
+            yield
+            return
+        async with self._semaphore(key):
+            yield
+
+    async def gather(self, key: str, aws: Iterable[Awaitable[Any]]) -> List[Any]:
+        """Await ``aws`` concurrently with at most the limit for ``key`` in flight."""
+
+        async def bounded(aw: Awaitable[Any]) -> Any:
+            async with self.slot(key):
+                return await aw
+
+        return list(await asyncio.gather(*(bounded(aw) for aw in aws)))
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Dict[str, Any]], Awaitable[Any]]
+    after: Tuple[str, ...] = ()
+    limit: str | None = None
+
+
+@dataclass
+class StageScheduler:
+    """Run stages as soon as the stages they depend on have finished.
+
+    Each stage function receives a dict with the results of its dependencies.
+    Stages without a dependency between them run concurrently, bounded by the
+    :class:`ConcurrencyLimits` slot named by ``limit``.
+    """
+
+    limits: ConcurrencyLimits | None = None
+    stages: Dict[str, Stage] = field(default_factory=dict)
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Any]],
+        after: Iterable[str] = (),
+        limit: str | None = None,
+    ) -> "StageScheduler":
+        after = tuple(after)
+        missing = [d for d in after if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, func, after, limit)
+        return self
+
+    def start(self) -> Dict[str, "asyncio.Task[Any]"]:
+        """Schedule every stage and return the task for each one."""
+        limits = self.limits or ConcurrencyLimits()
+        tasks: Dict[str, asyncio.Task[Any]] = {}
+
+        async def run_stage(stage: Stage) -> Any:
+            deps = {d: await tasks[d] for d in stage.after}
+            async with limits.slot(stage.limit):
+                return await stage.func(deps)
+
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        return tasks
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results by name.
+
+        The first stage error is raised after the remaining stages are
+        cancelled.
+        """
+        tasks = self.start()
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+
+stage_limits = ConcurrencyLimits()
@@ -0,0 +1,117 @@
+"""Persistent per-page store of text extracted from uploaded files."""
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Iterator, List
+
+from backend.services.blob_store import shard_path
+
+# Bump when extraction changes so stale sidecars are ignored.
+TEXT_EXTRACTOR_VERSION = "2"
+
+
+class PageText:
+    """Extracted pages of one file, read lazily from a memory-mapped sidecar."""
+
+    def __init__(self, path: Path, offsets: List[int]):
+        self.path = path
+        self.offsets = offsets
+        self._file = None
+        self._map: mmap.mmap | bytes | None = None
+
+    def _data(self) -> mmap.mmap | bytes:
+        if self._map is None:
+            if self.offsets[-1] == 0:
+                # mmap cannot map an empty file
+                self._map = b""
+            else:
+                self._file = open(self.path, "rb")
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def page(self, index: int) -> str:
+        """Text of page ``index`` (0-based)."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self._data()[start:end].decode("utf-8")
+
+    def pages(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.page(i)
+
+    def text(self) -> str:
+        """Full text of the file, pages concatenated in order."""
+        return self._data()[: self.offsets[-1]].decode("utf-8")
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map = None
+        self._file = None
+
+    def __enter__(self) -> "PageText":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TextStore:
+    """Sidecar text files keyed by content hash.
+
+    Each file's pages are stored as one UTF-8 file next to a JSON index of
+    page byte offsets, under a sharded ``ab/cd/<hash>`` layout. Entries are
+    never invalidated explicitly: changed content has a different hash.
+    """
+
+    def __init__(self, root: str | Path, version: str = TEXT_EXTRACTOR_VERSION):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self.counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    def _paths(self, sha256_hash: str) -> tuple[Path, Path]:
+        base = shard_path(self.root, sha256_hash)
+        suffix = f".v{self.version}"
+        return base.with_name(base.name + suffix + ".txt"), base.with_name(base.name + suffix + ".json")
+
+    def load(self, sha256_hash: str) -> PageText | None:
+        text_path, index_path = self._paths(sha256_hash)
+        try:
+            offsets = json.loads(index_path.read_text())["offsets"]
+        except (OSError, ValueError, KeyError):
+            self.counters["misses"] += 1
+            return None
+        if not text_path.exists():
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return PageText(text_path, offsets)
+
+    def save(self, sha256_hash: str, pages: List[str]) -> PageText:
+        text_path, index_path = self._paths(sha256_hash)
+        text_path.parent.mkdir(parents=True, exist_ok=True)
+        offsets = [0]
+        tmp_text = text_path.with_name(text_path.name + ".part")
+        with open(tmp_text, "wb") as f:
+            for page in pages:
+                data = page.encode("utf-8")
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        tmp_index = index_path.with_name(index_path.name + ".part")
+        tmp_index.write_text(json.dumps({"offsets": offsets}))
+        os.replace(tmp_text, text_path)
+        # The index is written last so a reader never sees offsets
+        # without the matching text.
+        os.replace(tmp_index, index_path)
+        self.counters["stores"] += 1
+        return PageText(text_path, offsets)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
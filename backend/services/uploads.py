@@ -0,0 +1,200 @@
+"""Streaming upload helpers: chunked writes, incremental hashing and MIME sniffing."""
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterable
+
+import aiofiles
+from starlette.responses import JSONResponse
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Allowance for multipart boundaries, part headers and small form fields on
+# top of the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+
+OOXML_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Leading bytes of the binary formats we accept, most specific first.
+MAGIC_NUMBERS = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+]
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+def max_upload_size() -> int:
+    """Maximum accepted upload size in bytes (``MAX_UPLOAD_MB``)."""
+    return int(float(os.environ.get("MAX_UPLOAD_MB", 1024)) * 1024 * 1024)
+
+
+def upload_chunk_size() -> int:
+    return int(os.environ.get("UPLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+
+
+def sniff_mime_type(head: bytes, filename: str, declared: str | None = None) -> str:
+    """Detect the MIME type from the first bytes of a file.
+
+    Signatures take precedence over the client supplied type. ZIP containers
+    are resolved to the Office Open XML type matching the file extension.
+    """
+    for magic, mime in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"PK\x03\x04"):
+        return OOXML_TYPES.get(Path(filename).suffix.lower(), "application/zip")
+    if head and b"\x00" not in head:
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character may be cut at the end of the chunk.
+            if e.start < len(head) - 3:
+                return declared or "application/octet-stream"
+        if declared and declared != "application/octet-stream":
+            return declared
+        return "text/plain"
+    return declared or "application/octet-stream"
+
+
+class UploadSizeLimitMiddleware:
+    """Refuse upload requests whose body exceeds ``max_upload_size()``.
+
+    Starlette spools a multipart body to a temporary file before the endpoint
+    runs, so :func:`stream_to_file` alone only sees the limit crossed after
+    the whole body has arrived. This middleware answers 413 for the upload
+    ``paths`` without reading the body when ``Content-Length`` is too large,
+    and stops reading a body without one as soon as it crosses the limit.
+    """
+
+    def __init__(self, app, paths: Iterable[str], overhead: int = MULTIPART_OVERHEAD):
+        self.app = app
+        self.paths = set(paths)
+        self.overhead = overhead
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        max_size = max_upload_size()
+        limit = max_size + self.overhead
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await self._reject(scope, receive, send, max_size)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await self._reject(scope, receive, send, max_size)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # The endpoint's own answer to the cut-off body is dropped.
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    @staticmethod
+    async def _reject(scope, receive, send, max_size: int) -> None:
+        response = JSONResponse(
+            {"detail": f"Upload exceeds maximum size of {max_size} bytes"}, status_code=413
+        )
+        await response(scope, receive, send)
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    size: int
+    sha256_hash: str
+    mime_type: str
+
+
+async def stream_to_file(
+    chunks: AsyncIterator[bytes],
+    directory: Path,
+    filename: str,
+    declared_mime: str | None = None,
+    max_size: int | None = None,
+) -> StoredUpload:
+    """Write ``chunks`` to a new file in ``directory`` while hashing them.
+
+    Only one chunk is held in memory at a time. The file is written under a
+    temporary name and renamed once complete; it is removed if the upload
+    exceeds ``max_size`` or fails.
+    """
+    if max_size is None:
+        max_size = max_upload_size()
+    file_id = str(uuid.uuid4())
+    target = directory / f"{file_id}{Path(filename).suffix}"
+    partial = target.with_name(target.name + ".part")
+    digest = hashlib.sha256()
+    size = 0
+    mime_type = declared_mime or "application/octet-stream"
+    sniffed = False
+    try:
+        async with aiofiles.open(partial, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if not sniffed:
+                    mime_type = sniff_mime_type(chunk[:4096], filename, declared_mime)
+                    sniffed = True
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds maximum size of {max_size} bytes"
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+        os.replace(partial, target)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return StoredUpload(target, size, digest.hexdigest(), mime_type)
+
+
+async def iter_upload_file(upload, chunk_size: int | None = None) -> AsyncIterator[bytes]:
+    """Yield fixed-size chunks from a Starlette ``UploadFile``."""
+    chunk_size = chunk_size or upload_chunk_size()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def iter_bytes(data: bytes, chunk_size: int | None = None) -> AsyncIterator[bytes]:
+    """Yield fixed-size chunks from an in-memory payload."""
+    chunk_size = chunk_size or upload_chunk_size()
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
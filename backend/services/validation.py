@@ -0,0 +1,225 @@
+"""Single-parse validation of data modules: field rules, XSD and BREX."""
+
+import hashlib
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+from lxml import etree
+
+from backend.brex_rules import BrexEngine, rule_set_version
+from backend.models.base import ValidationStatus
+from backend.models.document import DataModule
+from backend.services.validation_artifacts import ArtifactRegistry, validation_artifacts
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATES_PATH = BACKEND_ROOT / "templates"
+SCHEMA_PATH = BACKEND_ROOT / "schemas" / "simple_data_module.xsd"
+
+# Module fields checked by the field rules but not part of the rendered XML.
+FINGERPRINT_FIELDS = ("ste_score", "security_level")
+
+
+@dataclass
+class Diagnostic:
+    """One finding of a validation rule.
+
+    ``source`` is ``field`` (settings rules on module fields), ``ste``,
+    ``xsd``, ``brex``, ``reference`` or ``ai``.
+    """
+
+    rule_id: str
+    source: str
+    severity: str
+    message: str
+    line: int | None = None
+
+    def text(self) -> str:
+        if self.source == "brex":
+            return f"{self.rule_id}: {self.message}"
+        if self.source == "xsd":
+            where = f" (line {self.line})" if self.line else ""
+            return f"XSD: {self.message}{where}"
+        return self.message
+
+
+@dataclass
+class ValidationResult:
+    status: ValidationStatus = ValidationStatus.GREEN
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    xsd_valid: bool = False
+    brex_timings: Dict[str, float] = field(default_factory=dict)
+    fingerprint: str | None = None
+    rules_version: str | None = None
+    cached: bool = False
+    ai_reviewed: bool = False
+
+    @classmethod
+    def from_stored(cls, module: Dict[str, Any]) -> "ValidationResult":
+        """Rebuild the result recorded on ``module`` by a previous run.
+
+        Reference diagnostics are dropped: they depend on other modules and
+        are checked again on every run.
+        """
+        result = cls(
+            xsd_valid=module.get("xsd_valid", False),
+            fingerprint=module.get("validation_fingerprint"),
+            rules_version=module.get("validation_rules"),
+            cached=True,
+            ai_reviewed=module.get("validation_ai_reviewed", False),
+        )
+        for entry in module.get("validation_diagnostics", []):
+            if entry.get("source") != "reference":
+                result.add(Diagnostic(**entry))
+        return result
+
+    def add(self, diagnostic: Diagnostic, status: ValidationStatus | None = None) -> None:
+        """Record ``diagnostic`` and lower the status accordingly.
+
+        Errors turn the status RED and warnings AMBER unless ``status``
+        overrides it.
+        """
+        self.diagnostics.append(diagnostic)
+        if status is None:
+            status = ValidationStatus.RED if diagnostic.severity == "error" else ValidationStatus.AMBER
+        if status == ValidationStatus.RED or self.status == ValidationStatus.GREEN:
+            self.status = status
+
+    @property
+    def brex_valid(self) -> bool:
+        """No errors from module field rules or XML BREX rules."""
+        return not any(
+            d.severity == "error" and d.source in ("field", "brex", "reference") for d in self.diagnostics
+        )
+
+    def errors(self) -> List[str]:
+        return [d.text() for d in self.diagnostics]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status.value,
+            "xsd_valid": self.xsd_valid,
+            "brex_valid": self.brex_valid,
+            "fingerprint": self.fingerprint,
+            "cached": self.cached,
+            "diagnostics": [asdict(d) for d in self.diagnostics],
+        }
+
+
+def rules_version(rules: Dict[str, Any], engine: BrexEngine) -> str:
+    """Version of the XML BREX rule set and the field rules together."""
+    return f"{engine.version}:{rule_set_version(rules)}"
+
+
+def module_fingerprint(xml: str, module: Dict[str, Any], version: str) -> str:
+    """Hash of everything a validation result depends on, except references."""
+    digest = hashlib.sha256(version.encode())
+    fields = {name: module.get(name) for name in FINGERPRINT_FIELDS}
+    digest.update(json.dumps(fields, sort_keys=True, default=str).encode())
+    digest.update(xml.encode())
+    return digest.hexdigest()
+
+
+def check_fields(module: Dict[str, Any], rules: Dict[str, Any], result: ValidationResult) -> None:
+    """Apply the settings BREX rules (title, dmc, content, ste, security)."""
+
+    def error(rule_id: str, message: str) -> None:
+        result.add(Diagnostic(rule_id, "field", "error", message))
+
+    title_rules = rules.get("title", {})
+    title = module.get("title", "")
+    if title_rules.get("required") and not title:
+        error("title.required", "Title is required")
+    if title and title_rules.get("maxLength") and len(title) > int(title_rules["maxLength"]):
+        error("title.maxLength", "Title exceeds maximum length")
+    pattern = title_rules.get("pattern")
+    if title and pattern and not re.match(pattern, title):
+        error("title.pattern", "Title does not match pattern")
+
+    dmc_rules = rules.get("dmc", {})
+    dmc = module.get("dmc", "")
+    if dmc_rules.get("required") and not dmc:
+        error("dmc.required", "DMC is required")
+    dmc_pattern = dmc_rules.get("pattern")
+    if dmc and dmc_pattern and not re.match(dmc_pattern, dmc):
+        error("dmc.pattern", "DMC does not match pattern")
+
+    content_rules = rules.get("content", {})
+    content = module.get("content", "")
+    if content_rules.get("required") and not content:
+        error("content.required", "Content is required")
+    if content and content_rules.get("minLength") and len(content) < int(content_rules["minLength"]):
+        error("content.minLength", "Content below minimum length")
+    if content and content_rules.get("maxLength") and len(content) > int(content_rules["maxLength"]):
+        error("content.maxLength", "Content exceeds maximum length")
+
+    ste_rules = rules.get("ste", {})
+    ste_score = float(module.get("ste_score", 0))
+    if ste_score < float(ste_rules.get("minScore", 0)):
+        result.add(Diagnostic("ste.minScore", "ste", "error", f"STE score {ste_score:.2f} below minimum"))
+    elif ste_score < float(ste_rules.get("warnBelowScore", 0)):
+        result.add(Diagnostic("ste.warnBelowScore", "ste", "warning", f"STE score {ste_score:.2f} below target"))
+
+    security_rules = rules.get("security", {})
+    sec_level = module.get("security_level")
+    allowed = security_rules.get("allowedClassifications")
+    if allowed and sec_level and sec_level not in allowed:
+        error("security.allowedClassifications", "Security classification not allowed")
+
+
+def validate_module(
+    module: Dict[str, Any],
+    rules: Dict[str, Any],
+    engine: BrexEngine,
+    artifacts: ArtifactRegistry = validation_artifacts,
+    templates_path: Path = TEMPLATES_PATH,
+    schema_path: Path = SCHEMA_PATH,
+    reuse: bool = False,
+) -> ValidationResult:
+    """Validate a data module dictionary without I/O beyond artifact loading.
+
+    The module is rendered once and parsed once into an lxml tree; the XSD
+    (``lxml.etree.XMLSchema``) and the BREX engine both run on that tree.
+    The function is self-contained so it can run in worker processes.
+
+    With ``reuse``, a module whose stored ``validation_fingerprint`` equals
+    the fingerprint of its rendered XML under the current rules gets its
+    stored result back (see :meth:`ValidationResult.from_stored`) without
+    being validated again.
+    """
+    try:
+        dm = DataModule(**module)
+        template = artifacts.template(templates_path, "data_module.xml.j2", autoescape=True)
+        xml = template.render(module=dm)
+    except Exception as exc:
+        result = ValidationResult()
+        check_fields(module, rules, result)
+        result.add(Diagnostic("xsd.render", "xsd", "error", f"Module could not be rendered: {exc}"))
+        return result
+
+    version = rules_version(rules, engine)
+    fingerprint = module_fingerprint(xml, module, version)
+    if reuse and module.get("validation_fingerprint") == fingerprint:
+        return ValidationResult.from_stored(module)
+
+    result = ValidationResult(fingerprint=fingerprint, rules_version=version)
+    check_fields(module, rules, result)
+    try:
+        tree = etree.fromstring(xml.encode())
+    except etree.XMLSyntaxError as exc:
+        result.add(Diagnostic("xsd.parse", "xsd", "error", f"Module XML is not well formed: {exc}", exc.lineno))
+        return result
+
+    schema = artifacts.schema(schema_path)
+    result.xsd_valid = schema.validate(tree)
+    for entry in schema.error_log:
+        result.add(Diagnostic("xsd", "xsd", "error", entry.message, entry.line))
+
+    report = engine.evaluate(tree)
+    result.brex_timings = report.timings
+    for violation in report.violations:
+        # Narrative rules only warn
+        result.add(Diagnostic(violation["rule_id"], "brex", violation["severity"], violation["message"]))
+    return result
@@ -0,0 +1,107 @@
+"""Compile-once cache of validation artifacts: XSD schemas, templates and XPaths."""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+
+class ArtifactRegistry:
+    """Compiled artifacts keyed by their source, recompiled when it changes.
+
+    File-backed artifacts are stamped with the file's modification time and
+    size and compiled again when either differs. Templates are served from
+    one Jinja environment per directory, whose own cache reloads a template
+    when its file changes. XPath expressions are keyed by their text, so an
+    edited rule simply compiles a new entry.
+    """
+
+    def __init__(self, max_xpaths: int = 4096):
+        self.max_xpaths = max_xpaths
+        self._lock = threading.Lock()
+        self._files: Dict[Tuple[str, str], Tuple[Tuple[int, int], Any]] = {}
+        self._environments: Dict[Tuple[str, bool], Any] = {}
+        self._xpaths: "OrderedDict[str, Any]" = OrderedDict()
+        self.counters = {"hits": 0, "compiles": 0}
+
+    def load(self, path: str | Path, compile: Callable[[Path], Any], kind: str | None = None) -> Any:
+        """Return ``compile(path)``, reusing the result while the file is unchanged."""
+        path = Path(path)
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = (str(path), kind or getattr(compile, "__qualname__", repr(compile)))
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.counters["hits"] += 1
+                return entry[1]
+        artifact = compile(path)
+        with self._lock:
+            self._files[key] = (stamp, artifact)
+            self.counters["compiles"] += 1
+        return artifact
+
+    def schema(self, path: str | Path) -> Any:
+        """Compiled ``lxml.etree.XMLSchema`` for the XSD at ``path``."""
+
+        def compile_schema(p: Path) -> Any:
+            from lxml import etree
+
+            return etree.XMLSchema(etree.parse(str(p)))
+
+        return self.load(path, compile_schema, "xsd")
+
+    def template(self, directory: str | Path, name: str, autoescape: bool = False) -> Any:
+        """Compiled Jinja template ``name`` from ``directory``."""
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        key = (str(directory), autoescape)
+        with self._lock:
+            env = self._environments.get(key)
+            if env is None:
+                env = Environment(
+                    loader=FileSystemLoader(str(directory)),
+                    autoescape=select_autoescape(["xml"]) if autoescape else False,
+                    auto_reload=True,
+                )
+                self._environments[key] = env
+        return env.get_template(name)
+
+    def xpath(self, expression: str) -> Any:
+        """Compiled ``lxml.etree.XPath`` for ``expression``.
+
+        Raises ``lxml.etree.XPathSyntaxError`` for invalid expressions.
+        """
+        with self._lock:
+            compiled = self._xpaths.get(expression)
+            if compiled is not None:
+                self._xpaths.move_to_end(expression)
+                self.counters["hits"] += 1
+                return compiled
+        from lxml import etree
+
+        compiled = etree.XPath(expression)
+        with self._lock:
+            self._xpaths[expression] = compiled
+            self.counters["compiles"] += 1
+            while len(self._xpaths) > self.max_xpaths:
+                self._xpaths.popitem(last=False)
+        return compiled
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+            self._environments.clear()
+            self._xpaths.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "environments": len(self._environments),
+                "xpaths": len(self._xpaths),
+                **self.counters,
+            }
+
+
+validation_artifacts = ArtifactRegistry()
@@ -0,0 +1,114 @@
+"""Process pool for validating many data modules at once.
+
+XSD and BREX validation are CPU bound, so bulk runs send batches of modules
+to worker processes. Each worker compiles the BREX rule set once (see
+:func:`backend.brex_rules.compile_brex_rules`) and reuses it for every
+later batch with the same rules.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from backend.brex_rules import compile_brex_rules
+from backend.services.validation import ValidationResult, validate_module
+
+Batch = List[Dict[str, Any]]
+
+
+def validate_batch(
+    modules: Batch, rules: Dict[str, Any], brex_rules: List[Dict[str, Any]], reuse: bool = False
+) -> List[ValidationResult]:
+    """Validate ``modules`` against the field rules and BREX rule list."""
+    engine = compile_brex_rules(brex_rules)
+    return [validate_module(module, rules, engine, reuse=reuse) for module in modules]
+
+
+class ValidationPool:
+    """Validate streams of modules in worker processes, one batch per task.
+
+    At most one batch more than there are workers is in flight, so a
+    project of any size is read from its cursor as the workers free up.
+    Batches are yielded as they finish, not in input order.
+    """
+
+    def __init__(self, max_workers: int | None = None, batch_size: int | None = None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("VALIDATION_WORKERS", os.cpu_count() or 1))
+        if batch_size is None:
+            batch_size = int(os.environ.get("VALIDATION_BATCH_SIZE", 64))
+        self.max_workers = max(1, max_workers)
+        self.batch_size = max(1, batch_size)
+        self._executor: Executor | None = None
+        self.counters = {"runs": 0, "batches": 0, "modules": 0}
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(
+        self, batch: Batch, rules: Dict[str, Any], brex_rules: List[Dict[str, Any]], reuse: bool
+    ) -> Tuple[Batch, List[ValidationResult]]:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._pool(), validate_batch, batch, rules, brex_rules, reuse)
+        self.counters["batches"] += 1
+        self.counters["modules"] += len(batch)
+        return batch, results
+
+    async def validate(
+        self,
+        modules: AsyncIterator[Dict[str, Any]],
+        rules: Dict[str, Any],
+        brex_rules: List[Dict[str, Any]],
+        reuse: bool = False,
+    ) -> AsyncIterator[Tuple[Batch, List[ValidationResult]]]:
+        """Yield ``(modules, results)`` for each finished batch.
+
+        ``reuse`` is passed on to :func:`validate_module`.
+        """
+        self.counters["runs"] += 1
+        pending: Set["asyncio.Future[Tuple[Batch, List[ValidationResult]]]"] = set()
+        exhausted = False
+
+        async def next_batch() -> Batch:
+            batch: Batch = []
+            async for module in modules:
+                module.pop("_id", None)
+                batch.append(module)
+                if len(batch) >= self.batch_size:
+                    break
+            return batch
+
+        try:
+            while True:
+                while not exhausted and len(pending) <= self.max_workers:
+                    batch = await next_batch()
+                    if len(batch) < self.batch_size:
+                        exhausted = True
+                    if batch:
+                        pending.add(asyncio.ensure_future(self._run(batch, rules, brex_rules, reuse)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_workers": self.max_workers, "batch_size": self.batch_size, **self.counters}
+
+
+validation_pool = ValidationPool()
@@ -113,3 +113,22 @@ def test_validation_and_publish(tmp_path):
     resp = r.json()
     assert os.path.exists(resp["package"])
     assert resp.get("errors") == []
+
+
+def test_unchanged_module_skips_revalidation(tmp_path, monkeypatch):
+    client, dm, _ = setup_client(tmp_path)
+    reviews = []
+
+    async def review(content):
+        reviews.append(content)
+        return {"issues": []}
+
+    monkeypatch.setattr(server.document_service, "review_module_ai", review)
+    first = client.post(f"/api/validate/{dm.dmc}").json()
+    second = client.post(f"/api/validate/{dm.dmc}").json()
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["status"] == first["status"]
+    assert len(reviews) == 1
+
+    assert client.post(f"/api/validate/{dm.dmc}?force=true").json()["cached"] is False
+    assert len(reviews) == 2
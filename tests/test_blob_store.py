@@ -0,0 +1,46 @@
+import asyncio
+
+from backend.services.blob_store import BlobStore, LocalBlobBackend, SQLiteBlobIndex
+from backend.services.document_service import DocumentService
+
+
+def _store(tmp_path):
+    root = tmp_path / "blobs"
+    return BlobStore(LocalBlobBackend(root), SQLiteBlobIndex(root / "index.sqlite3"))
+
+
+def test_duplicate_uploads_share_one_blob(tmp_path):
+    store = _store(tmp_path)
+    service = DocumentService(upload_path=tmp_path, blob_store=store)
+
+    async def main():
+        first = await service.upload_document(b"same manual", "a.txt", "text/plain")
+        second = await service.upload_document(b"same manual", "b.txt", "text/plain")
+        return first, second, await store.stats()
+
+    first, second, stats = asyncio.run(main())
+    assert first.file_path == second.file_path
+    assert first.file_path.endswith(f"{first.sha256_hash[:2]}/{first.sha256_hash[2:4]}/{first.sha256_hash}")
+    assert stats["blobs"] == 1 and stats["stored"] == 1 and stats["deduplicated"] == 1
+    assert not list(tmp_path.glob("*.txt"))
+
+
+def test_gc_removes_unreferenced_blobs_and_derived(tmp_path):
+    store = _store(tmp_path)
+    service = DocumentService(upload_path=tmp_path, blob_store=store)
+
+    async def main():
+        doc = await service.upload_document(b"%PDF-1.4 fake", "m.pdf", "application/pdf")
+        page_hash, page_path = await store.put_bytes(b"page image", "image/png")
+        await store.set_derived(doc.sha256_hash, "pdf_pages", {"blobs": [page_hash]})
+        assert await store.collect_garbage(0) == []
+
+        await service.delete_document(doc)
+        assert await store.collect_garbage(3600) == []
+        removed = await store.collect_garbage(0)
+        return doc, page_hash, page_path, removed
+
+    doc, page_hash, page_path, removed = asyncio.run(main())
+    assert removed == [doc.sha256_hash, page_hash]
+    assert not page_path.exists()
+    assert asyncio.run(store.get_derived(doc.sha256_hash, "pdf_pages")) is None
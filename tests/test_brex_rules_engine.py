@@ -1,6 +1,10 @@
+import json
+from pathlib import Path
+
 import pytest
+from lxml import etree
 
-from backend.brex_rules import apply_brex_rules
+from backend.brex_rules import BrexEngine, apply_brex_rules, compile_brex_rules
 from backend.models.base import DMTypeEnum, SettingsModel
 from backend.models.document import DataModule
 from backend.services.document_service import DocumentService
@@ -42,3 +46,49 @@ def test_apply_brex_rules_flags_empty_title(tmp_path):
     xml = create_xml(tmp_path, "DMC-TEST", "")
     violations = apply_brex_rules(xml, RULES)
     assert any(v.startswith("BREX-TITLE-001") for v in violations)
+
+
+SHIPPED_RULES = json.loads((Path(__file__).parent.parent / "backend" / "s1000d_brex_rules.json").read_text())
+
+
+def test_shipped_rule_set_compiles_and_skips_absent_contexts(tmp_path):
+    engine = compile_brex_rules(SHIPPED_RULES)
+    assert engine.errors == {}
+    assert engine is compile_brex_rules(list(SHIPPED_RULES))
+
+    report = engine.evaluate(etree.fromstring(create_xml(tmp_path, "DMC-TEST", "Title").encode()))
+    assert report.violations == []
+    assert report.evaluated == 0
+    assert report.skipped == len(engine.rules)
+
+    # the //*[attribute::changeMark ...] rule runs once the attribute occurs
+    marked = etree.fromstring(b'<dataModule><para changeMark="1"/></dataModule>')
+    assert set(engine.evaluate(marked).timings) == {"BREX-S1-00013"}
+
+
+def test_shipped_rules_flag_violations_in_context():
+    xml = b"""<dml><dmlIdent><dmlCode dmlType="s" seqNumber="00001"/></dmlIdent>
+    <dmlEntry><answer/></dmlEntry></dml>"""
+    report = compile_brex_rules(SHIPPED_RULES).evaluate(etree.fromstring(xml))
+    assert [v["rule_id"] for v in report.violations] == ["BREX-S1-00007"]
+    assert report.violations[0]["severity"] == "error"
+    assert report.messages()[0].startswith("BREX-S1-00007: The element answer must not be used")
+
+
+def test_required_enum_and_narrative_rules():
+    engine = BrexEngine(
+        [
+            {"id": "R1", "ruleType": "firm", "text": "Title required", "contextXPath": "//title", "constraint": "Required"},
+            {"id": "R2", "ruleType": "firm", "text": "Bad type", "contextXPath": "//dmType/text()",
+             "constraint": "As defined", "enumTable": ["GEN", "PROC"]},
+            {"id": "R3", "ruleType": "narrative", "text": "No notes", "contextXPath": "//note", "constraint": "Not allowed"},
+            {"id": "R4", "ruleType": "firm", "text": "Broken", "contextXPath": "//[", "constraint": "Not allowed"},
+        ]
+    )
+    assert set(engine.errors) == {"R4"}
+    report = engine.evaluate(etree.fromstring(b"<dm><dmType>XYZ</dmType><note/></dm>"))
+    by_id = {v["rule_id"]: v for v in report.violations}
+    assert set(by_id) == {"R1", "R2", "R3"}
+    assert "XYZ" in by_id["R2"]["message"]
+    assert by_id["R3"]["severity"] == "warning"
+    assert engine.stats()["rules"] == 3
@@ -9,7 +9,8 @@ from reportlab.pdfgen import canvas
 
 from backend.services.document_service import DocumentService
 from backend.models.document import UploadedDocument, DataModule, PublicationModule
-from backend.models.base import DMTypeEnum, SecurityLevel
+from backend.models.base import DMTypeEnum, SecurityLevel, SettingsModel
+from backend.ai_providers.base import TextProcessingResponse
 import zipfile
 import os
 import types
@@ -127,6 +128,13 @@ def test_publish_publication_module(tmp_path):
         assert f"{dm1.dmc}_{dm1.info_variant}.pdf" in names
 
 
+def _acquire(cls):
+    async def acquire():
+        return cls()
+
+    return acquire
+
+
 def test_process_document_carries_security_and_warnings(tmp_path):
     text = "WARNING: Hot surface\nCAUTION: Wear gloves\nStep 1"
     file_path = tmp_path / "s.txt"
@@ -153,14 +161,184 @@ def test_process_document_carries_security_and_warnings(tmp_path):
             return types.SimpleNamespace(result={"rewritten_text": request.text, "ste_score": 1.0})
 
     service = DocumentService(upload_path=tmp_path)
-    orig_factory = ProviderFactory.create_text_provider
-    ProviderFactory.create_text_provider = lambda: DummyProvider()
+    orig_factory = ProviderFactory.acquire_text_provider
+    ProviderFactory.acquire_text_provider = _acquire(DummyProvider)
     try:
         modules = asyncio.run(service.process_document_with_ai(doc, text))
     finally:
-        ProviderFactory.create_text_provider = orig_factory
+        ProviderFactory.acquire_text_provider = orig_factory
     assert modules
     for m in modules:
         assert m.security_level == SecurityLevel.SECRET
         assert "<warning>" in m.content
         assert "<caution>" in m.content
+
+
+def test_process_document_combined_mode_uses_single_call(tmp_path):
+    text = "Remove the panel.\nWARNING: Hot surface"
+    doc = UploadedDocument(
+        filename="c.txt",
+        file_path=str(tmp_path / "c.txt"),
+        mime_type="text/plain",
+        file_size=len(text),
+        sha256_hash=hashlib.sha256(text.encode()).hexdigest(),
+        metadata={},
+    )
+    calls = []
+
+    class CombinedProvider:
+        async def analyze_document(self, request):
+            calls.append(request.task_type)
+            return TextProcessingResponse(
+                result={
+                    "classification": {"dm_type": "PROC", "title": "Panel"},
+                    "extraction": {"references": [], "warnings": [], "cautions": []},
+                    "rewrite": {"rewritten_text": "Remove the panel.", "ste_score": 0.9},
+                }
+            )
+
+    service = DocumentService(upload_path=tmp_path, settings=SettingsModel(text_analysis_mode="combined"))
+    orig_factory = ProviderFactory.acquire_text_provider
+    ProviderFactory.acquire_text_provider = _acquire(CombinedProvider)
+    try:
+        modules = asyncio.run(service.process_document_with_ai(doc, text))
+    finally:
+        ProviderFactory.acquire_text_provider = orig_factory
+    assert calls == ["combined"]
+    assert [m.info_variant for m in modules] == ["00", "01"]
+    assert modules[0].dm_type == DMTypeEnum.PROC
+    assert modules[1].ste_score == 0.9
+
+
+def test_processing_key_tracks_providers_and_settings(tmp_path, monkeypatch):
+    service = DocumentService(upload_path=tmp_path, settings=SettingsModel())
+    doc = UploadedDocument(
+        filename="a.txt", file_path="a.txt", mime_type="text/plain", file_size=1, sha256_hash="abc"
+    )
+    monkeypatch.setenv("TEXT_PROVIDER", "openai")
+    monkeypatch.setenv("TEXT_MODEL", "gpt-4o-mini")
+    key = service.processing_key(doc)
+    assert service.processing_key(doc.copy(update={"id": "other"})) == key
+
+    monkeypatch.setenv("TEXT_MODEL", "gpt-4o")
+    assert service.processing_key(doc) != key
+    monkeypatch.setenv("TEXT_MODEL", "gpt-4o-mini")
+    service.settings = SettingsModel(text_analysis_mode="combined")
+    assert service.processing_key(doc) != key
+
+
+def test_run_once_shares_in_flight_runs(tmp_path):
+    service = DocumentService(upload_path=tmp_path)
+    calls = 0
+
+    async def pipeline():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        return await asyncio.gather(
+            service.run_once("k", pipeline), service.run_once("k", pipeline)
+        )
+
+    assert asyncio.run(main()) == [1, 1]
+    assert asyncio.run(service.run_once("k", pipeline)) == 2
+
+
+class MemoryCollection:
+    """Just enough of a Motor collection for the processing run records."""
+
+    def __init__(self, key):
+        self.key = key
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        for field, cond in query.items():
+            if isinstance(cond, dict) and "$in" in cond:
+                if doc.get(field) not in cond["$in"]:
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[doc[self.key]] = dict(doc)
+
+    async def insert_one(self, doc):
+        self.docs[doc[self.key]] = dict(doc)
+
+    async def find_one(self, query):
+        return next((dict(d) for d in self.docs.values() if self._matches(d, query)), None)
+
+    def find(self, query):
+        return FakeCursor([dict(d) for d in self.docs.values() if self._matches(d, query)])
+
+    async def update_many(self, query, update):
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                doc.update(update["$set"])
+
+    update_one = update_many
+
+
+def test_failed_runs_are_not_recorded_and_reuse_relinks_modules(tmp_path):
+    from backend.models.document import ICN
+
+    db = types.SimpleNamespace(
+        processing_runs=MemoryCollection("_id"),
+        data_modules=MemoryCollection("dmc"),
+        icns=MemoryCollection("icn_id"),
+    )
+    service = DocumentService(db=db, upload_path=tmp_path)
+    first = UploadedDocument(
+        filename="a.txt", file_path="a.txt", mime_type="text/plain", file_size=1, sha256_hash="abc"
+    )
+    second = first.copy(update={"id": "second"})
+    module = DataModule(
+        dmc="DMC-RUN-0001",
+        title="T",
+        dm_type=DMTypeEnum.GEN,
+        info_variant="00",
+        source_document_id=first.id,
+        processing_status="completed",
+    )
+    icn = ICN(filename="f.png", file_path="f.png", sha256_hash="x", mime_type="image/png")
+
+    async def main():
+        await db.data_modules.insert_one(module.dict())
+        await db.icns.insert_one(icn.dict())
+
+        failed = module.copy(update={"processing_status": "error"})
+        await service.record_run("k", first, [failed], [])
+        icn.processing_status = "error"
+        await service.record_run("k", first, [module], [icn])
+        assert await service.find_completed_run("k", first) is None
+
+        icn.processing_status = "completed"
+        await service.record_run("k", first, [module], [icn])
+        modules, icns = await service.find_completed_run("k", second)
+        assert [m.source_document_id for m in modules] == ["second"]
+        stored = await db.data_modules.find_one({"dmc": module.dmc})
+        assert stored["source_document_id"] == "second"
+
+    asyncio.run(main())
+
+
+def test_processing_tasks_record_cache_hashes(tmp_path):
+    db = types.SimpleNamespace(processing_tasks=MemoryCollection("id"))
+    service = DocumentService(db=db, upload_path=tmp_path)
+    ok = TextProcessingResponse(
+        result={"dm_type": "GEN"}, confidence=0.9, provider="openai", model_used="m",
+        prompt_hash="p1", response_hash="r1",
+    )
+    failed = TextProcessingResponse(result={"error": "429"}, provider="openai", model_used="m", prompt_hash="p2")
+
+    asyncio.run(service.record_task("classify", {"document_id": "d"}, ok))
+    asyncio.run(service.record_task("extract", {"document_id": "d"}, failed))
+
+    tasks = {t["task_type"]: t for t in db.processing_tasks.docs.values()}
+    assert (tasks["classify"]["prompt_hash"], tasks["classify"]["response_hash"]) == ("p1", "r1")
+    assert tasks["classify"]["status"] == "completed"
+    assert tasks["classify"]["provider_used"] == "openai:m"
+    assert tasks["extract"]["status"] == "failed" and tasks["extract"]["error_message"] == "429"
@@ -0,0 +1,41 @@
+import asyncio
+
+from reportlab.pdfgen import canvas
+
+from backend.services.extraction_pool import ExtractionPool, extraction_kind
+
+
+def _make_pdf(path, pages):
+    c = canvas.Canvas(str(path))
+    for i in range(pages):
+        c.drawString(72, 720, f"Page number {i}")
+        c.showPage()
+    c.save()
+
+
+def test_page_ranges_cover_document():
+    pool = ExtractionPool(max_workers=1, pages_per_task=4)
+    assert pool.page_ranges(10) == [(0, 4), (4, 8), (8, 10)]
+    assert pool.page_ranges(0) == []
+
+
+def test_extraction_kind():
+    assert extraction_kind("application/pdf") == "pdf"
+    assert extraction_kind("text/markdown") == "text"
+    assert extraction_kind("image/png") is None
+
+
+def test_pdf_ranges_are_merged_in_order_with_progress(tmp_path):
+    pdf = tmp_path / "manual.pdf"
+    _make_pdf(pdf, 7)
+    pool = ExtractionPool(max_workers=2, pages_per_task=2)
+    events = []
+    try:
+        pages = asyncio.run(pool.extract("pdf", pdf, on_progress=events.append))
+    finally:
+        pool.shutdown()
+
+    assert [p.strip() for p in pages] == [f"Page number {i}" for i in range(7)]
+    assert events == [{"page": i + 1, "pages": 7} for i in range(7)]
+    # one page count task plus four ranges
+    assert pool.stats()["tasks"] == 5
@@ -0,0 +1,123 @@
+import asyncio
+
+from PIL import Image, ImageDraw
+
+from backend.ai_providers.base import VisionProcessingResponse, VisionProvider
+from backend.ai_providers.provider_factory import ProviderFactory
+from backend.models.document import ICN
+from backend.services.document_service import DocumentService
+from backend.services.image_index import ImageHashIndex, dhash, hamming
+
+
+def _figure(shift=0):
+    image = Image.new("RGB", (120, 90), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10 + shift, 10, 60 + shift, 70), fill="black")
+    draw.ellipse((70, 20, 110, 60), fill="gray")
+    return image
+
+
+class CountingVisionProvider(VisionProvider):
+    calls = 0
+
+    async def analyze_image(self, image, context=None):
+        CountingVisionProvider.calls += 1
+        await asyncio.sleep(0.01)
+        return VisionProcessingResponse(
+            caption=f"figure {self.calls}", objects=["pump"], hotspots=[], confidence=0.9
+        )
+
+    async def generate_caption(self, request):
+        return VisionProcessingResponse(caption="figure", confidence=0.9)
+
+    async def detect_objects(self, request):
+        return VisionProcessingResponse(objects=["pump"], confidence=0.9)
+
+    async def generate_hotspots(self, request):
+        return VisionProcessingResponse(hotspots=[], confidence=0.9)
+
+
+def test_dhash_tolerates_rescaling():
+    original = dhash(_figure())
+    assert hamming(original, dhash(_figure().resize((240, 180)))) <= 2
+    assert hamming(original, dhash(_figure().transpose(Image.Transpose.FLIP_LEFT_RIGHT))) > 10
+
+
+def test_index_finds_near_duplicates_and_clusters(tmp_path):
+    index = ImageHashIndex(tmp_path / "hashes.sqlite3", threshold=4)
+    index.add_sync("ICN-A", "LCN-A", "a.png", 0b1111, {"caption": "a"})
+    assert index.nearest_sync(1 << 40) is None
+
+    match = index.nearest_sync(0b0111)
+    assert match["representative"] == "ICN-A" and match["distance"] == 1
+    index.add_sync("ICN-B", "LCN-A", "b.png", 0b0111, match["result"], representative="ICN-A")
+
+    [cluster] = index.clusters_sync()
+    assert cluster["representative"] == "ICN-A"
+    assert [(m["icn_id"], m["distance"]) for m in cluster["members"]] == [("ICN-A", 0), ("ICN-B", 1)]
+    assert index.stats()["unique"] == 1
+
+
+def _acquire(cls):
+    async def acquire():
+        return cls()
+
+    return acquire
+
+
+def test_duplicate_figures_reuse_vision_results(tmp_path, monkeypatch):
+    CountingVisionProvider.calls = 0
+    monkeypatch.setattr(ProviderFactory, "acquire_vision_provider", _acquire(CountingVisionProvider))
+    monkeypatch.setenv("VISION_PROVIDER", "openai")
+    service = DocumentService(upload_path=tmp_path)
+
+    paths = [tmp_path / "a.png", tmp_path / "a_copy.png", tmp_path / "other.png"]
+    _figure().save(paths[0])
+    _figure().save(paths[1])
+    _figure().transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(paths[2])
+    icns = [
+        ICN(filename=p.name, file_path=str(p), sha256_hash=str(i), mime_type="image/png")
+        for i, p in enumerate(paths)
+    ]
+
+    processed = asyncio.run(service.process_images_with_ai(icns))
+
+    assert CountingVisionProvider.calls == 2
+    assert processed[0].caption == processed[1].caption
+    assert processed[0].lcn == processed[1].lcn
+    assert processed[2].lcn != processed[0].lcn
+    [cluster] = asyncio.run(service.image_index.clusters())
+    assert {m["icn_id"] for m in cluster["members"]} == {processed[0].icn_id, processed[1].icn_id}
+
+
+class FailingVisionProvider(CountingVisionProvider):
+    async def analyze_image(self, image, context=None):
+        return VisionProcessingResponse(caption="Error generating caption: 429", confidence=0.0)
+
+
+def _icn(path):
+    return ICN(filename=path.name, file_path=str(path), sha256_hash=path.name, mime_type="image/png")
+
+
+def test_failures_and_other_models_are_not_reused(tmp_path, monkeypatch):
+    CountingVisionProvider.calls = 0
+    service = DocumentService(upload_path=tmp_path)
+    paths = [tmp_path / f"{i}.png" for i in range(3)]
+    for path in paths:
+        _figure().save(path)
+    monkeypatch.setenv("VISION_PROVIDER", "openai")
+    monkeypatch.setenv("VISION_MODEL", "model-a")
+
+    monkeypatch.setattr(ProviderFactory, "acquire_vision_provider", _acquire(FailingVisionProvider))
+    failed = asyncio.run(service.process_image_with_ai(_icn(paths[0])))
+    assert failed.caption.startswith("Error")
+    assert service.image_index.stats()["icns"] == 0
+
+    monkeypatch.setattr(ProviderFactory, "acquire_vision_provider", _acquire(CountingVisionProvider))
+    first = asyncio.run(service.process_image_with_ai(_icn(paths[1])))
+    assert first.caption == "figure 1"
+
+    monkeypatch.setenv("VISION_MODEL", "model-b")
+    second = asyncio.run(service.process_image_with_ai(_icn(paths[2])))
+    assert second.caption == "figure 2"
+    assert CountingVisionProvider.calls == 2
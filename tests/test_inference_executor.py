@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.ai_providers.inference_executor import (
+    InferenceExecutor,
+    InferenceQueueFullError,
+)
+
+
+def test_inference_runs_off_event_loop():
+    executor = InferenceExecutor(max_workers=1, max_queue=4)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        worker_thread = await executor.run(lambda: (time.sleep(0.2), threading.get_ident())[1])
+        beat.cancel()
+        return loop_thread, worker_thread, ticks
+
+    loop_thread, worker_thread, ticks = asyncio.run(main())
+    executor.shutdown()
+    assert worker_thread != loop_thread
+    assert ticks >= 5
+    assert executor.stats()["completed"] == 1
+
+
+def test_queue_bound_and_cancellation():
+    executor = InferenceExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+    ran = []
+
+    async def main():
+        first = asyncio.create_task(executor.run(release.wait))
+        second = asyncio.create_task(executor.run(ran.append, "second"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(InferenceQueueFullError):
+            await executor.run(ran.append, "third")
+        second.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await second
+
+    asyncio.run(main())
+    executor.shutdown()
+    assert ran == []
+    stats = executor.stats()
+    assert stats["rejected"] == 1 and stats["cancelled"] == 1 and stats["queued"] == 0
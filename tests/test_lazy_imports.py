@@ -0,0 +1,28 @@
+import pytest
+
+from backend.ai_providers.provider_factory import ProviderFactory, load_provider_class
+from backend.benchmark_startup import measure
+
+
+def test_server_import_skips_heavy_libraries():
+    report = measure("backend.server")
+    assert report["loaded"] == []
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError, match="Unknown text provider: nope"):
+        ProviderFactory.build_text_provider("nope")
+    assert load_provider_class("vision", "openai").__name__ == "OpenAIVisionProvider"
+
+
+def test_warm_up_leaves_local_providers_for_first_use(monkeypatch):
+    from backend.ai_providers.provider_pool import provider_pool
+
+    monkeypatch.setenv("TEXT_PROVIDER", "local")
+    monkeypatch.setenv("VISION_PROVIDER", "local")
+    load_provider_class.cache_clear()
+    before = provider_pool.keys()
+
+    assert ProviderFactory.warm_up() == {"text": None, "vision": None}
+    assert provider_pool.keys() == before
+    assert load_provider_class.cache_info().currsize == 0
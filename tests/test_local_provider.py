@@ -0,0 +1,86 @@
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast, pipeline
+
+from backend.ai_providers import local_provider
+
+WORDS = "the pump valve check pressure bleed hydraulic system open close inspect then and".split()
+
+
+def _tiny_generator():
+    vocab = {"<eos>": 0, "<unk>": 1, **{w: i + 2 for i, w in enumerate(WORDS)}}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=len(vocab), n_positions=64, n_embd=32, n_layer=2, n_head=2, bos_token_id=0, eos_token_id=0
+    )
+    model = GPT2LMHeadModel(config).eval()
+    return pipeline(
+        "text-generation",
+        model=model,
+        tokenizer=PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", unk_token="<unk>"),
+        device=-1,
+    )
+
+
+def test_batched_prompts_of_unequal_length_match_single_generation(monkeypatch):
+    generator = _tiny_generator()
+
+    def build(*args, **kwargs):
+        # Older transformers releases keep the tokenizer's own (right) padding
+        generator.tokenizer.padding_side = "right"
+        return generator
+
+    monkeypatch.setattr(local_provider, "pipeline", build)
+    provider = local_provider.LocalTextProvider(model="tiny")
+    assert generator.tokenizer.padding_side == "left"
+
+    short = "check the pump"
+    long = "open the hydraulic system and inspect the pressure valve then bleed the pump"
+    alone = [provider._generate_many([prompt], 8)[0] for prompt in (short, long)]
+    assert provider._generate_many([short, long], 8) == alone
+
+
+def test_corrupt_image_fails_only_itself_in_a_batch():
+    import asyncio
+    import io
+    import types
+
+    from PIL import Image
+
+    from backend.ai_providers.micro_batcher import MicroBatcher
+
+    provider = local_provider.LocalVisionProvider.__new__(local_provider.LocalVisionProvider)
+    provider.model_name = "tiny"
+    provider.weights = types.SimpleNamespace(meta={"categories": ["background", "panel"]})
+    provider.captioner = lambda images, batch_size: [[{"generated_text": f"{im.width}px"}] for im in images]
+    provider._predict = lambda images: [
+        {"labels": torch.tensor([1]), "boxes": torch.tensor([[0.0, 0.0, 2.0, 2.0]]), "scores": torch.tensor([0.8])}
+        for _ in images
+    ]
+    batches = []
+
+    def analyze_many(images):
+        batches.append(len(images))
+        return provider._analyze_many(images)
+
+    provider._analyze_batcher = MicroBatcher(analyze_many, max_batch_size=8, max_latency=0.05)
+
+    def png(width):
+        buf = io.BytesIO()
+        Image.new("RGB", (width, 4)).save(buf, format="PNG")
+        return buf.getvalue()
+
+    async def main():
+        return await asyncio.gather(
+            provider.analyze_image(png(3)),
+            provider.analyze_image(b"\x89PNG\r\n\x1a\nnot really"),
+            provider.analyze_image(png(5)),
+        )
+
+    good, bad, other = asyncio.run(main())
+    assert batches == [3]
+    assert (good.caption, other.caption) == ("3px", "5px")
+    assert good.objects == ["panel"] and good.confidence == 0.9
+    assert bad.caption.startswith("Error:") and bad.confidence == 0.0 and bad.objects == []
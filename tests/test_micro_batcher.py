@@ -0,0 +1,41 @@
+import asyncio
+
+from backend.ai_providers.inference_executor import InferenceExecutor
+from backend.ai_providers.micro_batcher import MicroBatcher
+
+
+def test_concurrent_submissions_share_a_batch():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    executor = InferenceExecutor(max_workers=1)
+    batcher = MicroBatcher(double, max_batch_size=4, max_latency=0.05, executor=executor)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    executor.shutdown()
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+    assert batcher.stats()["max_batch_seen"] == 4
+
+
+def test_batch_errors_reach_every_caller():
+    def broken(items):
+        raise ValueError("model failed")
+
+    executor = InferenceExecutor(max_workers=1)
+    batcher = MicroBatcher(broken, max_batch_size=8, max_latency=0.01, executor=executor)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    executor.shutdown()
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.stats()["batches"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+
+import pdf2image
+import pytesseract
+from PIL import Image
+
+from backend.models.document import UploadedDocument
+from backend.services.document_service import DocumentService
+from backend.services.extraction_pool import ocr_pdf_page
+
+
+def test_ocr_is_cached_by_page_pixels(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        pdf2image, "convert_from_path", lambda *args, **kwargs: [Image.new("L", (40, 40), 255)]
+    )
+
+    def fake_tesseract(image):
+        calls.append(image.size)
+        return "Scanned text\n"
+
+    monkeypatch.setattr(pytesseract, "image_to_string", fake_tesseract)
+
+    assert ocr_pdf_page("a.pdf", 1, 300, str(tmp_path)) == ("Scanned text\n", False)
+    # a different file rendering to the same pixels hits the cache
+    assert ocr_pdf_page("b.pdf", 7, 300, str(tmp_path)) == ("Scanned text\n", True)
+    assert calls == [(40, 40)]
+
+
+def test_only_pages_without_text_layer_are_ocred(tmp_path):
+    requested = []
+
+    class FakeExtraction:
+        async def extract(self, kind, path, on_progress=None):
+            return ["A page with a proper text layer\n", " \n", "Another page of real text\n"]
+
+        async def ocr_pdf_pages(self, path, numbers, dpi, cache_root):
+            requested.extend(numbers)
+            return {2: "  Text recognised from the scan \n"}
+
+    service = DocumentService(upload_path=tmp_path, extraction=FakeExtraction())
+    doc = UploadedDocument(
+        filename="scan.pdf",
+        file_path=str(tmp_path / "scan.pdf"),
+        mime_type="application/pdf",
+        file_size=1,
+        sha256_hash="56" * 32,
+    )
+
+    with asyncio.run(service.get_document_pages(doc)) as pages:
+        assert pages.page(1) == "Text recognised from the scan\n"
+        assert pages.page(2) == "Another page of real text\n"
+    assert requested == [2]
@@ -0,0 +1,204 @@
+import asyncio
+import io
+from pathlib import Path
+
+import pdf2image
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from backend.models.document import UploadedDocument
+from backend.services.document_service import DocumentService, pdf_render_settings
+from backend.services.extraction_pool import ExtractionPool, _image_bytes, pdf_figure_range
+
+
+def _fake_rasterizer(calls):
+    def rasterize(file_path, first, last, output_folder, settings):
+        calls.append((first, last))
+        paths = []
+        for page in range(first, last + 1):
+            path = Path(output_folder) / f"out-{page}.png"
+            Image.new("RGB", (10 * page, 20), "white").save(path)
+            paths.append(str(path))
+        return paths
+
+    return rasterize
+
+
+def test_render_settings_from_env(monkeypatch):
+    monkeypatch.setenv("PDF_RENDER_DPI", "96")
+    monkeypatch.setenv("PDF_RENDER_COLOR", "grayscale")
+    monkeypatch.setenv("PDF_RENDER_BATCH", "0")
+    settings = pdf_render_settings()
+    assert settings["dpi"] == 96 and settings["color"] == "gray" and settings["batch"] == 1
+
+
+def test_pages_are_rendered_in_batches_and_streamed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PDF_IMAGE_MODE", "pages")
+    monkeypatch.setenv("PDF_RENDER_BATCH", "2")
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", lambda path: {"Pages": 5})
+    service = DocumentService(upload_path=tmp_path)
+    calls = []
+
+    monkeypatch.setattr(service, "_rasterize_pages", _fake_rasterizer(calls))
+    doc = UploadedDocument(
+        filename="manual.pdf",
+        file_path=str(tmp_path / "manual.pdf"),
+        mime_type="application/pdf",
+        file_size=1,
+        sha256_hash="12" * 32,
+    )
+
+    async def first_icn():
+        images = service.iter_document_images(doc)
+        icn = await images.__anext__()
+        seen = list(calls)
+        rest = [i async for i in images]
+        return icn, seen, rest
+
+    icn, seen, rest = asyncio.run(first_icn())
+    assert seen == [(1, 2)]
+    assert calls == [(1, 2), (3, 4), (5, 5)]
+    icns = [icn] + rest
+    assert [i.filename for i in icns] == [f"manual_page{n}.png" for n in range(1, 6)]
+    assert [i.width for i in icns] == [10, 20, 30, 40, 50]
+    assert all(Path(i.file_path).exists() for i in icns)
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith("tmp")]
+
+    calls.clear()
+    cached = asyncio.run(service.extract_images_from_document(doc))
+    assert calls == []
+    assert [i.sha256_hash for i in cached] == [i.sha256_hash for i in icns]
+
+
+def test_embedded_images_are_extracted_and_deduplicated(tmp_path, monkeypatch):
+    figure = ImageReader(Image.new("RGB", (200, 120), "red"))
+    bullet = ImageReader(Image.new("RGB", (8, 8), "blue"))
+    photo = tmp_path / "photo.jpg"
+    Image.new("RGB", (90, 90), "green").save(photo)
+    pdf = tmp_path / "manual.pdf"
+    c = canvas.Canvas(str(pdf))
+    c.drawString(72, 720, "Text only page")
+    c.showPage()
+    for _ in range(2):  # same figure and a tiny bullet on two pages
+        c.drawImage(figure, 72, 400)
+        c.drawImage(bullet, 72, 300)
+        c.drawImage(str(photo), 300, 300)
+        c.showPage()
+    for i in range(300):  # vector-only drawing
+        c.line(72, 100 + i, 400, 100 + i)
+    c.showPage()
+    c.save()
+
+    pool = ExtractionPool(max_workers=1, pages_per_task=2)
+    service = DocumentService(upload_path=tmp_path / "service", extraction=pool)
+    calls = []
+    monkeypatch.setattr(service, "_rasterize_pages", _fake_rasterizer(calls))
+    doc = UploadedDocument(
+        filename="manual.pdf",
+        file_path=str(pdf),
+        mime_type="application/pdf",
+        file_size=1,
+        sha256_hash="34" * 32,
+    )
+    try:
+        icns = asyncio.run(service.extract_images_from_document(doc))
+    finally:
+        pool.shutdown()
+
+    names = [i.filename for i in icns]
+    assert names[-1] == "manual_page4.png"
+    assert {n.rsplit(".", 1)[1] for n in names[:-1]} == {"png", "jpg"}
+    assert all(n.startswith("manual_page2_img") for n in names[:-1])
+    figure_icn = next(i for i in icns if i.mime_type == "image/png")
+    assert (figure_icn.width, figure_icn.height) == (200, 120)
+    assert Image.open(figure_icn.file_path).size == (200, 120)
+    # JPEG streams are stored byte for byte
+    photo_icn = next(i for i in icns if i.mime_type == "image/jpeg")
+    assert Path(photo_icn.file_path).read_bytes() == photo.read_bytes()
+    assert calls == [(4, 4)]
+
+
+def test_figures_inside_form_xobjects_are_found(tmp_path):
+    pdf = tmp_path / "forms.pdf"
+    c = canvas.Canvas(str(pdf))
+    c.beginForm("figure")
+    c.drawImage(ImageReader(Image.new("RGB", (200, 120), "red")), 72, 400)
+    c.endForm()
+    c.doForm("figure")
+    c.showPage()
+    c.beginForm("drawing")
+    for i in range(300):
+        c.line(72, 100 + i, 400, 100 + i)
+    c.endForm()
+    c.doForm("drawing")
+    c.showPage()
+    c.save()
+
+    raster, vector = pdf_figure_range(str(pdf), 0, 2, min_size=64, vector_ops=200)
+
+    assert [(i["width"], i["height"]) for i in raster["images"]] == [(200, 120)]
+    assert raster["vector"] is False
+    assert vector == {"images": [], "vector": True}
+
+
+class _XObject(dict):
+    def __init__(self, data, **entries):
+        super().__init__(entries)
+        self.data = data
+
+    def get_data(self):
+        return self.data
+
+
+def test_only_jpeg_streams_pass_through(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, format="JPEG")
+    jpeg = _XObject(buffer.getvalue(), **{"/Filter": "/DCTDecode", "/Width": 8, "/Height": 8})
+    assert _image_bytes(jpeg) == (buffer.getvalue(), "image/jpeg")
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, format="JPEG2000")
+    jpx = _XObject(buffer.getvalue(), **{"/Filter": ["/JPXDecode"], "/Width": 8, "/Height": 8})
+    data, mime_type = _image_bytes(jpx)
+    assert mime_type == "image/png"
+    assert Image.open(io.BytesIO(data)).size == (8, 8)
+
+
+def test_rendered_pages_stay_referenced_until_stored(tmp_path, monkeypatch):
+    monkeypatch.setenv("PDF_IMAGE_MODE", "pages")
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", lambda path: {"Pages": 2})
+
+    class Icns:
+        def __init__(self):
+            self.docs = []
+
+        async def insert_one(self, data):
+            self.docs.append(data)
+
+    service = DocumentService(upload_path=tmp_path)
+    service.db = type("DB", (), {"icns": Icns()})()
+    monkeypatch.setattr(service, "_rasterize_pages", _fake_rasterizer([]))
+    doc = UploadedDocument(
+        filename="manual.pdf",
+        file_path=str(tmp_path / "manual.pdf"),
+        mime_type="application/pdf",
+        file_size=1,
+        sha256_hash="34" * 32,
+    )
+    store = service.blob_store
+
+    async def run():
+        images = service.iter_document_images(doc)
+        first = await images.__anext__()
+        # A GC while the document is still being rendered keeps the page
+        assert await store.collect_garbage(grace_seconds=0) == []
+        rest = [icn async for icn in images]
+        await service.store_icn(first)
+        return [first] + rest
+
+    icns = asyncio.run(run())
+    refcounts = [asyncio.run(store.index.get(i.sha256_hash))["refcount"] for i in icns]
+    # the derived record holds one reference, the stored ICN another
+    assert refcounts == [2, 1]
+    assert len(service.db.icns.docs) == 1
@@ -0,0 +1,116 @@
+import asyncio
+
+from backend.ai_providers.provider_pool import ProviderPool
+
+
+class DummyProvider:
+    def __init__(self, provider_type, model):
+        self.provider_type = provider_type
+        self.model = model
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_pool_reuses_instances():
+    pool = ProviderPool()
+    built = []
+
+    def builder(provider_type, model):
+        built.append((provider_type, model))
+        return DummyProvider(provider_type, model)
+
+    first = pool.get("text", "local", "m1", builder)
+    second = pool.get("text", "LOCAL", "m1", builder)
+    other = pool.get("text", "local", "m2", builder)
+
+    assert first is second
+    assert other is not first
+    assert built == [("local", "m1"), ("local", "m2")]
+
+
+def test_pool_invalidate_keeps_selection_and_closes_others():
+    pool = ProviderPool()
+    old = pool.get("text", "openai", "a", DummyProvider)
+    current = pool.get("text", "openai", "b", DummyProvider)
+    vision = pool.get("vision", "openai", "a", DummyProvider)
+
+    removed = asyncio.run(
+        pool.invalidate("text", keep=pool.make_key("text", "openai", "b"))
+    )
+
+    assert removed == 1
+    assert old.closed is True
+    assert current.closed is False
+    assert vision.closed is False
+    assert pool.get("text", "openai", "b", DummyProvider) is current
+
+    asyncio.run(pool.aclose())
+    assert current.closed and vision.closed
+    assert pool.keys() == []
+
+
+def test_pool_defers_closing_providers_in_use():
+    pool = ProviderPool()
+    held = asyncio.run(pool.acquire("text", "openai", "a", DummyProvider))
+    asyncio.run(pool.acquire("text", "openai", "a", DummyProvider))
+    idle = pool.get("text", "openai", "b", DummyProvider)
+
+    removed = asyncio.run(pool.invalidate("text", keep=pool.make_key("text", "openai", "c")))
+
+    assert removed == 2
+    assert idle.closed is True
+    assert held.closed is False
+    assert pool.stats()["retired"] == 1
+
+    asyncio.run(pool.release(held))
+    assert held.closed is False
+    asyncio.run(pool.release(held))
+    assert held.closed is True
+    assert pool.stats()["retired"] == 0
+
+
+def test_pool_aclose_closes_retired_providers():
+    pool = ProviderPool()
+    held = asyncio.run(pool.acquire("vision", "openai", "a", DummyProvider))
+    asyncio.run(pool.invalidate("vision"))
+    assert held.closed is False
+
+    asyncio.run(pool.aclose())
+    assert held.closed is True
+
+
+def test_pool_builds_off_the_event_loop_once_per_key():
+    import threading
+    import time
+
+    pool = ProviderPool()
+    built = []
+
+    def slow_builder(provider_type, model):
+        built.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.05)
+        return DummyProvider(provider_type, model)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        tick = asyncio.ensure_future(ticker())
+        first, second = await asyncio.gather(
+            pool.acquire("text", "local", "m", slow_builder),
+            pool.acquire("text", "local", "m", slow_builder),
+        )
+        tick.cancel()
+        return first, second, ticks
+
+    first, second, ticks = asyncio.run(main())
+    assert first is second
+    assert built == [False]
+    assert ticks > 3
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from backend.ai_providers.rate_limiter import (
+    ProviderGovernor,
+    RateLimiterRegistry,
+    TokenBucket,
+    estimate_tokens,
+)
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.delay(60) == 0.0
+    bucket.consume(60)
+    assert 0.9 < bucket.delay(1) <= 1.0
+    assert TokenBucket(None).delay(10 ** 9) == 0.0
+
+
+def test_governor_limits_concurrency_and_records_metrics():
+    governor = ProviderGovernor("openai:test", max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        await governor.acquire(10)
+        peak = max(peak, governor.in_flight)
+        await asyncio.sleep(0.01)
+        governor.release(10, 5)
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(main())
+    stats = governor.stats()
+    assert peak == 2
+    assert stats["total_requests"] == 6
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+    assert stats["max_wait"] > 0
+
+
+def test_governor_queues_on_request_rate():
+    governor = ProviderGovernor("anthropic:test", rpm=600)
+    governor.requests.tokens = 1
+
+    async def main():
+        start = time.monotonic()
+        for _ in range(2):
+            await governor.acquire()
+            governor.release()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_registry_uses_most_specific_limits():
+    registry = RateLimiterRegistry(
+        {"openai": {"rpm": 10, "max_concurrency": 3}, "openai:gpt-4o": {"rpm": 20}}
+    )
+    specific = registry.get("openai", "gpt-4o")
+    generic = registry.get("openai", "other")
+    assert specific.requests.per_minute == 20
+    assert specific.max_concurrency == 3
+    assert generic.requests.per_minute == 10
+    assert registry.get("openai", "gpt-4o") is specific
+
+
+def test_estimate_tokens_counts_text_and_images():
+    messages = [
+        {"role": "user", "content": "x" * 400},
+        {"role": "user", "content": [{"type": "text", "text": "y" * 40}, {"type": "image_url"}]},
+    ]
+    assert estimate_tokens(messages, max_tokens=50) == 100 + 10 + 1000 + 50
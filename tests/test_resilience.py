@@ -0,0 +1,182 @@
+import asyncio
+import types
+
+import pytest
+
+from backend.ai_providers.resilience import (
+    CircuitOpenError,
+    ResilienceRegistry,
+    RetryPolicy,
+    is_retryable,
+    retry_after,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+def fast_registry(**overrides):
+    policy = RetryPolicy(base_delay=0.001, max_delay=0.01, **overrides)
+    return ResilienceRegistry(policy)
+
+
+def test_error_classification():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("bad"))
+    assert retry_after(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(StatusError(429, {"retry-after-ms": "250"})) == 0.25
+
+
+def test_retries_transient_errors_then_succeeds():
+    registry = fast_registry(max_attempts=3)
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise StatusError(429, {"retry-after": "0"})
+        return "ok"
+
+    assert asyncio.run(registry.call("openai:m", flaky)) == "ok"
+    assert calls == 3
+    assert registry.breaker("openai:m").state == "closed"
+
+
+def test_fatal_errors_are_not_retried():
+    registry = fast_registry()
+    calls = 0
+
+    async def bad_request():
+        nonlocal calls
+        calls += 1
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        asyncio.run(registry.call("openai:m", bad_request))
+    assert calls == 1
+
+
+def test_circuit_opens_and_half_opens():
+    registry = fast_registry(max_attempts=1, failure_threshold=2, reset_timeout=0.05)
+
+    async def down():
+        raise StatusError(503)
+
+    async def up():
+        return "ok"
+
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            asyncio.run(registry.call("anthropic:m", down))
+    assert registry.breaker("anthropic:m").state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(registry.call("anthropic:m", up))
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert asyncio.run(registry.call("anthropic:m", up)) == "ok"
+    assert registry.breaker("anthropic:m").state == "closed"
+
+
+def test_sdk_clients_leave_retries_to_the_registry(monkeypatch):
+    from backend.ai_providers.anthropic_provider import AnthropicTextProvider, AnthropicVisionProvider
+    from backend.ai_providers.openai_provider import OpenAITextProvider, OpenAIVisionProvider
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    for cls in (OpenAITextProvider, OpenAIVisionProvider, AnthropicTextProvider, AnthropicVisionProvider):
+        client = cls().client
+        assert client.max_retries == 0
+        assert client.timeout == RetryPolicy().timeout
+
+
+def test_combined_analysis_falls_back_only_on_malformed_answers(monkeypatch):
+    from backend.ai_providers.anthropic_provider import AnthropicTextProvider
+    from backend.ai_providers.base import TextProcessingRequest, TextProcessingResponse
+    from backend.ai_providers.openai_provider import OpenAITextProvider
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    request = TextProcessingRequest(text="Remove the panel.", task_type="analyze")
+
+    for cls, send in ((OpenAITextProvider, "_chat"), (AnthropicTextProvider, "_messages")):
+        provider = cls()
+        separate = []
+
+        async def single(request, provider=provider):
+            separate.append(request.task_type)
+            return TextProcessingResponse(
+                result={}, confidence=0.5, processing_time=0.0, provider="test", model_used="m"
+            )
+
+        for task in ("classify_document", "extract_structured_data", "rewrite_to_ste"):
+            monkeypatch.setattr(provider, task, single)
+
+        async def rejected(**kwargs):
+            raise CircuitOpenError("open")
+
+        monkeypatch.setattr(provider, send, rejected)
+        response = asyncio.run(provider.analyze_document(request))
+        assert response.result == {"error": "open"}
+        assert response.confidence == 0.0
+        assert separate == []
+
+        async def malformed(**kwargs):
+            text = "not json"
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=text))],
+                content=[types.SimpleNamespace(text=text)],
+            )
+
+        monkeypatch.setattr(provider, send, malformed)
+        asyncio.run(provider.analyze_document(request))
+        assert sorted(separate) == ["classify", "extract", "rewrite"]
+
+
+def test_combined_image_analysis_falls_back_only_on_malformed_answers(monkeypatch):
+    from backend.ai_providers.anthropic_provider import AnthropicVisionProvider
+    from backend.ai_providers.base import VisionProcessingResponse
+    from backend.ai_providers.openai_provider import OpenAIVisionProvider
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    image = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+    for cls, send in ((OpenAIVisionProvider, "_chat"), (AnthropicVisionProvider, "_messages")):
+        provider = cls()
+        separate = []
+
+        async def single(request, provider=provider):
+            separate.append(request.task_type)
+            return VisionProcessingResponse(confidence=0.5, processing_time=0.0, provider="test", model_used="m")
+
+        for task in ("generate_caption", "detect_objects", "generate_hotspots"):
+            monkeypatch.setattr(provider, task, single)
+
+        async def rejected(**kwargs):
+            raise CircuitOpenError("open")
+
+        monkeypatch.setattr(provider, send, rejected)
+        response = asyncio.run(provider.analyze_image(image))
+        assert response.caption == "Error analyzing image: open"
+        assert response.confidence == 0.0
+        assert separate == []
+
+        async def malformed(**kwargs):
+            text = "not json"
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=text))],
+                content=[types.SimpleNamespace(text=text)],
+            )
+
+        monkeypatch.setattr(provider, send, malformed)
+        asyncio.run(provider.analyze_image(image))
+        assert sorted(separate) == ["caption", "hotspots", "objects"]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from backend.ai_providers.base import TextProcessingRequest, TextProcessingResponse
+from backend.ai_providers.cached_provider import CachedTextProvider
+from backend.ai_providers.response_cache import ResponseCache, make_cache_key
+
+
+class CountingProvider:
+    model = "m"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def classify_document(self, request):
+        self.calls += 1
+        if request.text == "fail":
+            return TextProcessingResponse(result={"error": "boom"})
+        if request.text == "unparsed":
+            return TextProcessingResponse(result={})
+        if request.text == "unsure":
+            return TextProcessingResponse(result={"dm_type": "GEN", "title": request.text}, confidence=0.0)
+        return TextProcessingResponse(result={"dm_type": "GEN", "title": request.text}, confidence=0.9)
+
+
+def test_cache_persists_across_instances(tmp_path):
+    db = tmp_path / "cache.sqlite3"
+    key = make_cache_key("openai", "m", "classify", "text")
+    cache = ResponseCache(db_path=db)
+    cache.set_sync(key, {"result": {"a": 1}})
+    cache.close()
+
+    reopened = ResponseCache(db_path=db)
+    assert reopened.get_sync(key) == {"result": {"a": 1}}
+    assert reopened.counters["disk_hits"] == 1
+    assert reopened.get_sync(key) == {"result": {"a": 1}}
+    assert reopened.counters["memory_hits"] == 1
+
+
+def test_cache_ttl_and_lru_eviction():
+    cache = ResponseCache(db_path=None, ttl=0.01, max_memory_entries=2)
+    cache.set_sync("a", {"v": 1})
+    time.sleep(0.02)
+    assert cache.get_sync("a") is None
+
+    cache.ttl = 60
+    for k in ("a", "b", "c"):
+        cache.set_sync(k, {"v": k})
+    assert cache.get_sync("a") is None
+    assert cache.get_sync("c") == {"v": "c"}
+
+
+def test_cached_provider_skips_errors():
+    inner = CountingProvider()
+    provider = CachedTextProvider(inner, "openai", ResponseCache(db_path=None))
+
+    for _ in range(2):
+        res = asyncio.run(provider.classify_document(TextProcessingRequest(text="doc", task_type="classify")))
+        assert res.result["title"] == "doc"
+    assert inner.calls == 1
+
+    for text in ("fail", "unparsed", "unsure"):
+        for _ in range(2):
+            asyncio.run(provider.classify_document(TextProcessingRequest(text=text, task_type="classify")))
+    assert inner.calls == 7
+
+
+def test_cached_responses_carry_their_cache_hashes():
+    inner = CountingProvider()
+    provider = CachedTextProvider(inner, "openai", ResponseCache(db_path=None))
+    request = TextProcessingRequest(text="doc", task_type="classify")
+
+    first = asyncio.run(provider.classify_document(request))
+    second = asyncio.run(provider.classify_document(request))
+    failed = asyncio.run(provider.classify_document(TextProcessingRequest(text="fail", task_type="classify")))
+
+    assert first.prompt_hash == make_cache_key("openai", "m", "classify", "doc")
+    assert second.prompt_hash == first.prompt_hash
+    assert first.response_hash and second.response_hash == first.response_hash
+    assert failed.prompt_hash and failed.response_hash == ""
@@ -0,0 +1,78 @@
+from backend.services.retrieval_index import RetrievalIndex, chunk_text
+
+
+def test_chunk_text_overlaps():
+    words = " ".join(f"w{i}" for i in range(10))
+    assert chunk_text(words, chunk_words=4, overlap=1) == [
+        "w0 w1 w2 w3",
+        "w3 w4 w5 w6",
+        "w6 w7 w8 w9",
+    ]
+    assert chunk_text("") == []
+
+
+def test_search_ranks_relevant_chunks_and_respects_budget(tmp_path):
+    index = RetrievalIndex(tmp_path / "idx.sqlite3", chunk_words=20, overlap=0)
+    index.add_sync("hydraulics", "Hydraulic pump pressure check. Bleed the hydraulic pump before the pressure test.")
+    index.add_sync("avionics", "Avionics rack cooling fan replacement and connector inspection.")
+    index.add_sync("cabin", "Cabin seat track lubrication schedule.")
+    assert index.add_sync("cabin", "ignored duplicate") == 0
+
+    hits = index.search_sync("Inspect the hydraulic pump pressure", top_k=2)
+    assert hits[0]["doc_key"] == "hydraulics"
+    assert all(h["doc_key"] != "cabin" for h in hits)
+
+    assert index.search_sync("hydraulic pump", exclude=["hydraulics"]) == []
+    assert index.context_sync("hydraulic pump", token_budget=1) == ""
+    assert "Bleed" in index.context_sync("hydraulic pump", token_budget=100)
+
+    index.remove_sync("hydraulics")
+    assert index.stats() == {"documents": 2, "chunks": 2}
+
+
+def test_documents_without_text_are_recorded(tmp_path):
+    index = RetrievalIndex(tmp_path / "idx.sqlite3")
+    assert index.add_sync("scan", "") == 0
+    assert index.add_sync("scan", "Late text is ignored") == 0
+    assert index.indexed_keys_sync() == {"scan"}
+    assert index.stats() == {"documents": 1, "chunks": 0}
+    index.remove_sync("scan")
+    assert index.indexed_keys_sync() == set()
+
+
+def test_backfill_indexes_each_missing_document_once(tmp_path, monkeypatch):
+    import asyncio
+
+    from backend.models.document import UploadedDocument
+    from backend.services.document_service import DocumentService
+
+    docs = [
+        UploadedDocument(
+            filename=f"{name}.txt", file_path=name, mime_type="text/plain", file_size=1, sha256_hash=name * 8
+        ).dict()
+        for name in ("aaaaaaaa", "bbbbbbbb")
+    ]
+
+    class Documents:
+        async def _iter(self):
+            for d in docs:
+                yield dict(d)
+
+        def find(self, query, projection=None):
+            return self._iter()
+
+    service = DocumentService(upload_path=tmp_path)
+    service.db = type("DB", (), {"documents": Documents()})()
+    extracted = []
+
+    async def extract(document, on_progress=None):
+        extracted.append(document.filename)
+        if document.filename.startswith("b"):
+            raise RuntimeError("unreadable")
+        return "Hydraulic pump pressure check"
+
+    monkeypatch.setattr(service, "extract_text_from_document", extract)
+    assert asyncio.run(service.backfill_retrieval_index()) == 2
+    assert asyncio.run(service.backfill_retrieval_index()) == 0
+    assert extracted == ["aaaaaaaa.txt", "bbbbbbbb.txt"]
+    assert service.retrieval_index.stats() == {"documents": 2, "chunks": 1}
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services.stage_scheduler import ConcurrencyLimits, StageScheduler
+
+
+def test_independent_stages_run_concurrently():
+    async def sleeper(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    async def combine(deps):
+        return deps["a"] + deps["b"]
+
+    scheduler = StageScheduler(limits=ConcurrencyLimits(default_limit=4))
+    scheduler.add("a", lambda _: sleeper(1), limit="text:test")
+    scheduler.add("b", lambda _: sleeper(2), limit="text:test")
+    scheduler.add("sum", combine, after=["a", "b"])
+
+    start = time.perf_counter()
+    results = asyncio.run(scheduler.run())
+    elapsed = time.perf_counter() - start
+
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    assert elapsed < 0.18
+
+
+def test_limit_bounds_concurrency():
+    limits = ConcurrencyLimits(default_limit=1)
+    running = 0
+    peak = 0
+
+    async def work(_):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    scheduler = StageScheduler(limits=limits)
+    for name in ("a", "b", "c"):
+        scheduler.add(name, work, limit="vision:test")
+    asyncio.run(scheduler.run())
+    assert peak == 1
+
+
+def test_stage_error_propagates():
+    async def boom(_):
+        raise RuntimeError("fail")
+
+    async def never(_):
+        return "unreachable"
+
+    scheduler = StageScheduler()
+    scheduler.add("boom", boom)
+    scheduler.add("after", never, after=["boom"])
+    with pytest.raises(RuntimeError):
+        asyncio.run(scheduler.run())
+
+    with pytest.raises(ValueError):
+        StageScheduler().add("x", never, after=["missing"])
@@ -0,0 +1,46 @@
+import asyncio
+
+from backend.models.document import UploadedDocument
+from backend.services.document_service import DocumentService
+from backend.services.text_store import TextStore
+
+
+def test_pages_round_trip(tmp_path):
+    store = TextStore(tmp_path)
+    assert store.load("ab" * 32) is None
+    store.save("ab" * 32, ["first page\n", "", "zweite Seite ü\n"])
+
+    with store.load("ab" * 32) as pages:
+        assert len(pages) == 3
+        assert pages.page(2) == "zweite Seite ü\n"
+        assert pages.text() == "first page\nzweite Seite ü\n"
+
+    store.save("cd" * 32, [])
+    assert store.load("cd" * 32).text() == ""
+    assert TextStore(tmp_path, version="0").load("ab" * 32) is None
+
+
+def test_document_text_is_extracted_once_per_hash(tmp_path):
+    calls = []
+
+    class FakeExtraction:
+        async def extract(self, kind, path, on_progress=None):
+            calls.append((kind, path))
+            return ["page one\n", "page two\n"]
+
+        async def ocr_pdf_pages(self, path, numbers, dpi, cache_root):
+            return {}
+
+    service = DocumentService(upload_path=tmp_path, extraction=FakeExtraction())
+    doc = UploadedDocument(
+        filename="m.pdf",
+        file_path=str(tmp_path / "m.pdf"),
+        mime_type="application/pdf",
+        file_size=1,
+        sha256_hash="ef" * 32,
+    )
+
+    assert asyncio.run(service.extract_text_from_document(doc)) == "page one\npage two\n"
+    copy = doc.copy(update={"id": "other", "file_path": "elsewhere.pdf"})
+    assert asyncio.run(service.extract_text_from_document(copy)) == "page one\npage two\n"
+    assert calls == [("pdf", str(tmp_path / "m.pdf"))]
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from backend.services.uploads import (
+    UploadTooLargeError,
+    iter_bytes,
+    sniff_mime_type,
+    stream_to_file,
+)
+
+
+def test_sniff_mime_type():
+    assert sniff_mime_type(b"%PDF-1.7\n", "x.bin", "application/octet-stream") == "application/pdf"
+    assert sniff_mime_type(b"\x89PNG\r\n\x1a\n....", "x.pdf", "application/pdf") == "image/png"
+    assert sniff_mime_type(b"PK\x03\x04rest", "Manual.DOCX", None).endswith("wordprocessingml.document")
+    assert sniff_mime_type(b"plain words", "notes", "application/octet-stream") == "text/plain"
+    assert sniff_mime_type(b"# Title", "notes.md", "text/markdown") == "text/markdown"
+    assert sniff_mime_type(b"\x00\x01\x02", "blob", None) == "application/octet-stream"
+
+
+def test_stream_to_file_hashes_incrementally(tmp_path):
+    data = b"%PDF-" + bytes(range(256)) * 100
+    stored = asyncio.run(stream_to_file(iter_bytes(data, 1000), tmp_path, "a.pdf", "text/plain"))
+
+    assert stored.size == len(data)
+    assert stored.sha256_hash == hashlib.sha256(data).hexdigest()
+    assert stored.mime_type == "application/pdf"
+    assert stored.path.read_bytes() == data
+    assert stored.path.suffix == ".pdf"
+
+
+def test_stream_to_file_aborts_over_limit(tmp_path):
+    consumed = []
+
+    async def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield b"x" * 10
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(stream_to_file(chunks(), tmp_path, "big.txt", max_size=25))
+
+    assert len(consumed) == 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def _limited_app(received):
+    from fastapi import FastAPI, File, UploadFile
+
+    from backend.services.uploads import UploadSizeLimitMiddleware
+
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, paths=["/upload"], overhead=1024)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        data = await file.read()
+        received.append(len(data))
+        return {"size": len(data)}
+
+    return app
+
+
+def test_upload_limit_rejects_before_the_body_is_spooled(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setenv("MAX_UPLOAD_MB", str(8 / 1024))  # 8 KiB
+    received = []
+    client = TestClient(_limited_app(received))
+
+    ok = client.post("/upload", files={"file": ("a.bin", b"x" * 4096)})
+    assert ok.status_code == 200 and ok.json() == {"size": 4096}
+
+    too_big = client.post("/upload", files={"file": ("b.bin", b"x" * 64 * 1024)})
+    assert too_big.status_code == 413
+
+    def chunked():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"c.bin\"\r\n\r\n"
+        for _ in range(64):
+            yield b"x" * 1024
+        yield b"\r\n--b--\r\n"
+
+    streamed = client.post(
+        "/upload", content=chunked(), headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert streamed.status_code == 413
+    assert received == [4096]
@@ -0,0 +1,104 @@
+from backend.brex_rules import BrexEngine
+from backend.models.base import ValidationStatus
+from backend.services.validation import SCHEMA_PATH, validate_module
+from backend.services.validation_artifacts import ArtifactRegistry
+from backend.server import DEFAULT_BREX_RULES
+
+VALID_MODULE = {
+    "dmc": "DMC-TEST-00-000-00-00-00-00-00-000-A-A-00-00-00",
+    "title": "Valid Module",
+    "dm_type": "GEN",
+    "info_variant": "00",
+    "content": "Valid content for testing",
+    "source_document_id": "doc1",
+    "ste_score": 0.95,
+    "security_level": "UNCLASSIFIED",
+}
+
+
+def test_field_errors_are_structured():
+    module = dict(VALID_MODULE, title="")
+    result = validate_module(module, DEFAULT_BREX_RULES, BrexEngine([]))
+    assert result.status == ValidationStatus.RED
+    assert result.brex_valid is False
+    diagnostic = result.diagnostics[0]
+    assert (diagnostic.rule_id, diagnostic.source, diagnostic.severity) == ("title.required", "field", "error")
+    assert result.to_dict()["diagnostics"][0]["message"] == "Title is required"
+
+
+def test_xsd_errors_carry_line_numbers(tmp_path):
+    schema = tmp_path / "strict.xsd"
+    schema.write_text(
+        SCHEMA_PATH.read_text().replace('name="title"', 'name="heading"', 1)
+    )
+    result = validate_module(VALID_MODULE, {}, BrexEngine([]), ArtifactRegistry(), schema_path=schema)
+    assert result.xsd_valid is False
+    assert result.brex_valid is True
+    xsd = [d for d in result.diagnostics if d.source == "xsd"]
+    assert xsd and all(d.line for d in xsd)
+    assert result.errors()[0].startswith("XSD: ")
+
+
+def test_brex_runs_on_the_shared_tree():
+    rules = [
+        {"id": "R-ERR", "xpath": "//title", "message": "No titles"},
+        {"id": "R-NARR", "contextXPath": "//content", "constraint": "not allowed",
+         "ruleType": "narrative", "message": "Avoid content"},
+    ]
+    result = validate_module(VALID_MODULE, {}, BrexEngine(rules))
+    by_id = {d.rule_id: d for d in result.diagnostics}
+    assert by_id["R-ERR"].severity == "error"
+    assert by_id["R-NARR"].severity == "warning"
+    assert set(result.brex_timings) == {"R-ERR", "R-NARR"}
+    assert result.xsd_valid is True
+
+
+def test_narrative_only_violations_are_amber():
+    rules = [{"id": "R-NARR", "xpath": "//title", "ruleType": "narrative", "message": "Prefer short titles"}]
+    result = validate_module(VALID_MODULE, {}, BrexEngine(rules))
+    assert result.status == ValidationStatus.AMBER
+    assert result.brex_valid is True
+    assert result.errors() == ["R-NARR: Prefer short titles"]
+
+
+def _stored(module, result):
+    return dict(
+        module,
+        validation_fingerprint=result.fingerprint,
+        validation_rules=result.rules_version,
+        validation_diagnostics=result.to_dict()["diagnostics"],
+        xsd_valid=result.xsd_valid,
+    )
+
+
+def test_unchanged_module_reuses_stored_result():
+    engine = BrexEngine([{"id": "R-NARR", "xpath": "//title", "ruleType": "narrative", "message": "Check"}])
+    first = validate_module(VALID_MODULE, DEFAULT_BREX_RULES, engine)
+    assert first.fingerprint and not first.cached
+    stored = _stored(VALID_MODULE, first)
+    stored["validation_diagnostics"].append(
+        {"rule_id": "references.dm", "source": "reference", "severity": "error", "message": "Broken", "line": None}
+    )
+
+    again = validate_module(stored, DEFAULT_BREX_RULES, engine, reuse=True)
+    assert again.cached
+    assert again.status == ValidationStatus.AMBER
+    # References are checked again on every run
+    assert again.errors() == first.errors()
+
+    assert not validate_module(stored, DEFAULT_BREX_RULES, engine).cached
+
+
+def test_fingerprint_covers_content_and_rules():
+    engine = BrexEngine([])
+    stored = _stored(VALID_MODULE, validate_module(VALID_MODULE, DEFAULT_BREX_RULES, engine))
+
+    edited = dict(stored, content="Edited content for testing")
+    assert not validate_module(edited, DEFAULT_BREX_RULES, engine, reuse=True).cached
+    lower_score = dict(stored, ste_score=0.5)
+    assert not validate_module(lower_score, DEFAULT_BREX_RULES, engine, reuse=True).cached
+
+    new_brex = BrexEngine([{"id": "R1", "xpath": "//dmc", "message": "No DMC"}])
+    assert not validate_module(stored, DEFAULT_BREX_RULES, new_brex, reuse=True).cached
+    stricter = dict(DEFAULT_BREX_RULES, title={"required": True, "maxLength": 5})
+    assert not validate_module(stored, stricter, engine, reuse=True).cached
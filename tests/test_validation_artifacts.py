@@ -0,0 +1,38 @@
+import os
+
+from lxml import etree
+
+from backend.services.validation_artifacts import ArtifactRegistry
+
+
+def test_file_artifacts_recompile_only_when_changed(tmp_path):
+    registry = ArtifactRegistry()
+    source = tmp_path / "rules.txt"
+    source.write_text("one")
+    compiles = []
+
+    def compile_file(path):
+        compiles.append(path.read_text())
+        return path.read_text().upper()
+
+    assert registry.load(source, compile_file) == "ONE"
+    assert registry.load(source, compile_file) == "ONE"
+    source.write_text("two!")
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert registry.load(source, compile_file) == "TWO!"
+    assert compiles == ["one", "two!"]
+
+
+def test_templates_and_xpaths_are_reused(tmp_path):
+    registry = ArtifactRegistry(max_xpaths=1)
+    (tmp_path / "t.xml.j2").write_text("<a>{{ value }}</a>")
+    first = registry.template(tmp_path, "t.xml.j2", autoescape=True)
+    assert first is registry.template(tmp_path, "t.xml.j2", autoescape=True)
+    assert first.render(value="x") == "<a>x</a>"
+
+    xpath = registry.xpath("//a")
+    assert xpath is registry.xpath("//a")
+    assert len(xpath(etree.fromstring(b"<a/>"))) == 1
+    registry.xpath("//b")
+    assert registry.stats()["xpaths"] == 1
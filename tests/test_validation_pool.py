@@ -0,0 +1,50 @@
+import asyncio
+
+from backend.models.base import ValidationStatus
+from backend.server import DEFAULT_BREX_RULES
+from backend.services.validation_pool import ValidationPool
+
+
+def _module(i, **overrides):
+    module = {
+        "_id": object(),
+        "dmc": f"DMC-TEST-00-000-00-00-00-00-00-{i:03d}-A-A-00-00-00",
+        "title": f"Module {i}",
+        "dm_type": "GEN",
+        "info_variant": "00",
+        "content": "Valid content for testing",
+        "source_document_id": "doc1",
+        "ste_score": 0.95,
+        "security_level": "UNCLASSIFIED",
+    }
+    module.update(overrides)
+    return module
+
+
+async def _stream(modules):
+    for module in modules:
+        yield module
+
+
+def test_batches_are_validated_in_workers():
+    modules = [_module(i) for i in range(5)] + [_module(5, title="")]
+    brex = [{"id": "R-NARR", "xpath": "//title", "ruleType": "narrative", "message": "Check titles"}]
+    pool = ValidationPool(max_workers=2, batch_size=2)
+
+    async def run():
+        return [entry async for entry in pool.validate(_stream(modules), DEFAULT_BREX_RULES, brex)]
+
+    try:
+        batches = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert sorted(len(batch) for batch, _ in batches) == [2, 2, 2]
+    statuses = {m["dmc"]: r.status for batch, results in batches for m, r in zip(batch, results)}
+    assert len(statuses) == 6
+    assert statuses[modules[5]["dmc"]] == ValidationStatus.RED
+    assert {statuses[m["dmc"]] for m in modules[:5]} == {ValidationStatus.AMBER}
+    # Mongo ids are not sent to the workers
+    assert all("_id" not in m for batch, _ in batches for m in batch)
+    assert pool.stats()["modules"] == 6
+    assert pool.stats()["batches"] == 3
@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from backend.ai_providers.base import (
+    VisionProcessingResponse,
+    VisionProvider,
+    image_media_type,
+    image_to_base64,
+    image_to_pil,
+)
+
+
+def _png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class DummyVisionProvider(VisionProvider):
+    def __init__(self):
+        self.seen = []
+
+    async def generate_caption(self, request):
+        self.seen.append(request.image_data)
+        return VisionProcessingResponse(caption="pump", confidence=0.9, provider="dummy")
+
+    async def detect_objects(self, request):
+        self.seen.append(request.image_data)
+        return VisionProcessingResponse(objects=["valve"], confidence=0.5)
+
+    async def generate_hotspots(self, request):
+        self.seen.append(request.image_data)
+        return VisionProcessingResponse(hotspots=[{"x": 1}], confidence=0.4)
+
+
+def test_image_inputs_round_trip():
+    data = _png_bytes()
+    encoded = image_to_base64(data)
+    assert base64.b64decode(encoded) == data
+    assert image_to_pil(encoded).size == (4, 4)
+    assert image_to_pil(Image.new("L", (2, 3))).mode == "RGB"
+
+
+def test_default_analyze_image_merges_and_encodes_once():
+    provider = DummyVisionProvider()
+    result = asyncio.run(provider.analyze_image(_png_bytes()))
+
+    assert result.caption == "pump"
+    assert result.objects == ["valve"]
+    assert result.hotspots == [{"x": 1}]
+    assert result.confidence == 0.9
+    assert result.provider == "dummy"
+    assert len(provider.seen) == 3 and len(set(provider.seen)) == 1
+
+
+def test_image_media_type_is_sniffed():
+    png = _png_bytes()
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "white").save(buffer, format="JPEG")
+    assert image_media_type(png) == "image/png"
+    assert image_media_type(image_to_base64(png)) == "image/png"
+    assert image_media_type(image_to_base64(buffer.getvalue())) == "image/jpeg"
+    assert image_media_type(Image.new("RGB", (2, 2))) == "image/png"